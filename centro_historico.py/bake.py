@@ -0,0 +1,291 @@
+import os
+import sys
+import json
+import time
+import queue
+import hashlib
+import importlib
+import multiprocessing
+import numpy as np
+from geometry import Mesh, Batch, compile_geometry
+from instancing import InstanceBatch
+from optimize import OptimizeStats, optimize_mesh
+
+#  CENA PRÉ-COMPILADA EM DISCO
+# As malhas compiladas (vértices, lotes, tabelas de instâncias, caixas dos
+# objetos e grupos de LOD, quads texturizados) e as AABBs de colisão são gravadas num arquivo
+# binário versionado: cabeçalho JSON + arrays crus alinhados. Na partida os
+# arrays são abertos com numpy.memmap, sem rodar as funções draw_*. A luz
+# pré-calculada (lighting.py) já vem multiplicada nas cores. O arquivo
+# guarda o hash dos fontes que definem a cena e é refeito quando eles mudam.
+#
+#   python bake.py            # refaz scene.bake
+
+BAKE_MAGIC = b'CHSCENE\0'
+BAKE_VERSION = 3
+BAKE_ALIGN = 64
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BAKE_PATH = os.path.join(HERE, 'scene.bake')
+# Fontes cujo conteúdo define a geometria; qualquer mudança invalida o arquivo
+BAKE_SOURCES = ('centro.py', 'geometry.py', 'instancing.py', 'primitives.py', 'lod.py', 'textures.py', 'lighting.py', 'optimize.py', 'navigation.py', 'bake.py')
+
+
+def source_hash(sources=BAKE_SOURCES):
+    h = hashlib.sha256(str(BAKE_VERSION).encode())
+    for name in sources:
+        with open(os.path.join(HERE, name), 'rb') as f: h.update(f.read())
+    return h.hexdigest()
+
+
+def scene_key(name, args):
+    # Mesmo nome com argumentos diferentes (ex.: porta aberta/fechada) = variantes distintas
+    return name + repr(tuple(a.item() if isinstance(a, np.generic) else a for a in args))
+
+
+#  FORMATO: magic, versão (u32), tamanho do cabeçalho (u32), cabeçalho JSON, arrays
+def write_arrays(path, meta, arrays):
+    header, offset = {'meta': meta, 'arrays': {}}, 0
+    for name, a in arrays.items():
+        header['arrays'][name] = {'dtype': a.dtype.str, 'shape': list(a.shape), 'offset': offset}
+        offset += -(-a.nbytes // BAKE_ALIGN) * BAKE_ALIGN
+    raw = json.dumps(header).encode()
+    start = -(-(len(BAKE_MAGIC) + 8 + len(raw)) // BAKE_ALIGN) * BAKE_ALIGN
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(BAKE_MAGIC)
+        f.write(np.array([BAKE_VERSION, len(raw)], dtype='<u4').tobytes())
+        f.write(raw)
+        for name, a in arrays.items():
+            f.seek(start + header['arrays'][name]['offset'])
+            f.write(np.ascontiguousarray(a).tobytes())
+        f.truncate(start + offset)
+    # Troca atômica: uma execução paralela nunca lê um arquivo pela metade
+    os.replace(tmp, path)
+
+
+def read_arrays(path):
+    with open(path, 'rb') as f:
+        if f.read(len(BAKE_MAGIC)) != BAKE_MAGIC: return None
+        version, size = np.frombuffer(f.read(8), dtype='<u4')
+        if version != BAKE_VERSION: return None
+        header = json.loads(f.read(int(size)))
+    start = -(-(len(BAKE_MAGIC) + 8 + int(size)) // BAKE_ALIGN) * BAKE_ALIGN
+    arrays = {}
+    for name, info in header['arrays'].items():
+        dtype, shape = np.dtype(info['dtype']), tuple(info['shape'])
+        if int(np.prod(shape)) == 0: arrays[name] = np.zeros(shape, dtype=dtype)
+        else: arrays[name] = np.memmap(path, dtype=dtype, mode='r', offset=start + info['offset'], shape=shape)
+    return header['meta'], arrays
+
+
+#  MALHAS <-> ARRAYS
+def encode_key(key):
+    prim, cull, offset, size = key
+    return [int(prim), bool(cull), list(offset) if offset is not None else None, float(size)]
+
+
+def decode_key(key):
+    prim, cull, offset, size = key
+    return (prim, cull, tuple(offset) if offset is not None else None, size)
+
+
+def mesh_to_arrays(prefix, mesh, arrays):
+    arrays[prefix + 'vertices'] = mesh.vertices
+    arrays[prefix + 'object_bounds'] = mesh.object_bounds
+    arrays[prefix + 'object_lods'] = mesh.object_lods
+    arrays[prefix + 'object_groups'] = mesh.object_groups
+    arrays[prefix + 'group_bounds'] = mesh.group_bounds
+    arrays[prefix + 'textured_vertices'] = mesh.textured_vertices
+    if mesh.indices is not None: arrays[prefix + 'indices'] = mesh.indices
+    batches = []
+    for i, b in enumerate(mesh.batches):
+        for field in ('object_ids', 'firsts', 'counts'): arrays[f'{prefix}batch{i}/{field}'] = getattr(b, field)
+        batches.append({'key': encode_key(b.key), 'first': int(b.first), 'count': int(b.count)})
+    # Só a chave de cada textura: a imagem é gerada de novo na carga (textures.py)
+    textured = []
+    for i, b in enumerate(mesh.textured):
+        for field in ('object_ids', 'firsts', 'counts'): arrays[f'{prefix}textured{i}/{field}'] = getattr(b, field)
+        textured.append({'key': list(b.key), 'first': int(b.first), 'count': int(b.count)})
+    instances = []
+    for i, b in enumerate(mesh.instances):
+        for field in ('transforms', 'colors', 'lean', 'bounds'): arrays[f'{prefix}instance{i}/{field}'] = getattr(b, field)
+        instances.append({'name': b.name, 'key': encode_key(b.key), 'first': int(b.first), 'count': int(b.count)})
+    return {'object_names': mesh.object_names, 'batches': batches, 'instances': instances, 'textured': textured,
+            'indexed': mesh.indices is not None}
+
+
+def mesh_from_arrays(prefix, meta, arrays):
+    vertices = arrays[prefix + 'vertices']
+    indices = arrays[prefix + 'indices'] if meta.get('indexed') else None
+    # Instâncias: a faixa de cada lote no buffer de índices, ou nos vértices sem índices
+    ranges = indices if indices is not None else vertices
+    batches = []
+    for i, info in enumerate(meta['batches']):
+        b = Batch(decode_key(info['key']), info['first'], info['count'])
+        for field in ('object_ids', 'firsts', 'counts'): setattr(b, field, arrays[f'{prefix}batch{i}/{field}'])
+        batches.append(b)
+    textured = []
+    for i, info in enumerate(meta['textured']):
+        b = Batch(tuple(info['key']), info['first'], info['count'])
+        for field in ('object_ids', 'firsts', 'counts'): setattr(b, field, arrays[f'{prefix}textured{i}/{field}'])
+        textured.append(b)
+    instances = []
+    for i, info in enumerate(meta['instances']):
+        p = f'{prefix}instance{i}/'
+        first, count = info['first'], info['count']
+        instances.append(InstanceBatch.from_arrays(info['name'], decode_key(info['key']), first,
+                                                   arrays[p + 'transforms'], arrays[p + 'colors'], arrays[p + 'lean'],
+                                                   ranges[first:first + count], arrays[p + 'bounds']))
+    return Mesh(vertices, batches, instances, meta['object_names'], arrays[prefix + 'object_bounds'],
+                arrays[prefix + 'object_lods'], arrays[prefix + 'object_groups'], arrays[prefix + 'group_bounds'],
+                arrays[prefix + 'textured_vertices'], textured, indices=indices)
+
+
+class BakedScene:
+    def __init__(self, meshes, colliders, source, optimization=None, ground=None, navmesh=None):
+        self.meshes = meshes
+        self.colliders = colliders
+        self.source = source
+        # navigation.HeightGrid e NavGraph, se o bake recebeu navigation
+        self.ground, self.navmesh = ground, navmesh
+        # Números do optimize.py por cena (chave de scene_key): triângulos, vértices, bytes, ACMR
+        self.optimization = optimization or {}
+
+    def get(self, name, args):
+        return self.meshes.get(scene_key(name, args))
+
+    def texture_keys(self):
+        # Texturas procedurais usadas pelas malhas (para gerar antes do primeiro quadro)
+        return sorted({b.key for mesh in self.meshes.values() for b in mesh.textured}, key=repr)
+
+
+def bake(path, namespace, scenes, colliders, props=None, objects=(), lod_objects=(), lighting=None, navigation=None,
+         progress=None):
+    # scenes: (nome, função, argumentos) de cada variante a compilar
+    # lighting: argumentos de lighting.Lighting, que multiplica AO e sol nas cores antes de gravar
+    # Depois da luz as malhas passam pelo optimize.py (faces escondidas, solda, índices)
+    # navigation: draw/surfaces/radius de navigation.build_navigation (grade de alturas e navmesh)
+    # progress(fração, fase): opcional, para a tela de carga
+    report = progress or (lambda fraction, phase: None)
+    arrays, meta = {}, {'source': source_hash(), 'scenes': {}}
+    meshes = []
+    # A compilação é rápida perto da luz: fica com os primeiros 20% da barra
+    share = 0.2 if lighting is not None else 1.0
+    for i, (name, draw_fn, args) in enumerate(scenes):
+        report(share * i / len(scenes), f'compilando {name}')
+        p = props(namespace) if props is not None else None
+        meshes.append(compile_geometry(namespace, draw_fn, *args, props=p, objects=objects, lod_objects=lod_objects))
+    if lighting is not None:
+        from lighting import Lighting
+        meshes = Lighting(**lighting).apply([(name, mesh) for (name, _, _), mesh in zip(scenes, meshes)],
+                                            progress=lambda f: report(share + (1 - share) * f, 'calculando a luz'))
+    for i, ((name, _, args), mesh) in enumerate(zip(scenes, meshes)):
+        stats = OptimizeStats()
+        mesh = optimize_mesh(mesh, stats)
+        meta['scenes'][scene_key(name, args)] = {'prefix': f'scene{i}/', 'optimization': stats.as_dict(),
+                                                 **mesh_to_arrays(f'scene{i}/', mesh, arrays)}
+    arrays['colliders'] = np.asarray(colliders, dtype=float).reshape(-1, 6)
+    if navigation is not None:
+        from navigation import build_navigation
+        report(1.0, 'montando a navmesh')
+        grid, graph = build_navigation(namespace, navigation['draw'], navigation['surfaces'], arrays['colliders'],
+                                       navigation['radius'])
+        meta['navigation'] = {'grid': grid.to_arrays('navigation/grid/', arrays), **graph.to_arrays('navigation/graph/', arrays)}
+    write_arrays(path, meta, arrays)
+
+
+def load_baked(path):
+    # None se o arquivo não existe, é de outra versão ou foi gerado de fontes diferentes
+    if not os.path.exists(path): return None
+    loaded = read_arrays(path)
+    if loaded is None: return None
+    meta, arrays = loaded
+    if meta['source'] != source_hash(): return None
+    meshes = {key: mesh_from_arrays(info['prefix'], info, arrays) for key, info in meta['scenes'].items()}
+    optimization = {key: info['optimization'] for key, info in meta['scenes'].items() if 'optimization' in info}
+    ground = navmesh = None
+    if 'navigation' in meta:
+        from navigation import HeightGrid, NavGraph
+        ground = HeightGrid.from_arrays('navigation/grid/', meta['navigation']['grid'], arrays)
+        navmesh = NavGraph.from_arrays(ground, 'navigation/graph/', arrays)
+    return BakedScene(meshes, arrays['colliders'], meta['source'], optimization, ground, navmesh)
+
+
+def load_or_bake(namespace, scenes, colliders, path=DEFAULT_BAKE_PATH, rebuild=False, **compile_args):
+    baked = None if rebuild else load_baked(path)
+    if baked is None:
+        bake(path, namespace, scenes, colliders, **compile_args)
+        baked = load_baked(path)
+    return baked
+
+
+#  BAKE NUM PROCESSO À PARTE
+# Na partida a cena é refeita fora do processo da janela: a compilação troca as
+# funções GL do módulo da cena (geometry.capture) e não pode rodar ao lado do
+# setup_gl nem da tela de carga.
+def bake_module(module, path=DEFAULT_BAKE_PATH, messages=None):
+    # module define BAKED_SCENES, INTERIOR_WALLS, COMPILE_ARGS, SCENE_LIGHTING e SCENE_NAVIGATION
+    ns = vars(importlib.import_module(module))
+    progress = (lambda fraction, phase: messages.put((fraction, phase))) if messages is not None else None
+    bake(path, ns, ns['BAKED_SCENES'], ns['INTERIOR_WALLS'], lighting=ns.get('SCENE_LIGHTING'),
+         navigation=ns.get('SCENE_NAVIGATION'), progress=progress, **ns['COMPILE_ARGS'])
+
+
+def bake_in_process(module, path=DEFAULT_BAKE_PATH, progress=None):
+    ctx = multiprocessing.get_context('spawn')
+    messages = ctx.Queue()
+    process = ctx.Process(target=bake_module, args=(module, path, messages))
+    process.start()
+    while process.is_alive() or not messages.empty():
+        try:
+            fraction, phase = messages.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        if progress is not None: progress(fraction, phase)
+    process.join()
+    if process.exitcode != 0: raise RuntimeError(f"bake de {module} falhou (código {process.exitcode})")
+
+
+def load_or_bake_in_process(module, path=DEFAULT_BAKE_PATH, rebuild=False, progress=None):
+    baked = None if rebuild else load_baked(path)
+    if baked is None:
+        bake_in_process(module, path, progress)
+        baked = load_baked(path)
+    return baked
+
+
+#  MALHAS AVULSAS (chunks do streaming.py): mesmo formato, uma malha por arquivo
+def bake_mesh(path, mesh, source):
+    arrays = {}
+    write_arrays(path, {'source': source, **mesh_to_arrays('', mesh, arrays)}, arrays)
+
+
+def load_mesh(path, source):
+    if not os.path.exists(path): return None
+    loaded = read_arrays(path)
+    if loaded is None or loaded[0]['source'] != source: return None
+    return mesh_from_arrays('', *loaded)
+
+
+def main(argv):
+    path = argv[0] if argv else DEFAULT_BAKE_PATH
+    t0 = time.perf_counter()
+    bake_module('centro', path)
+    t1 = time.perf_counter()
+    baked = load_baked(path)
+    t2 = time.perf_counter()
+    vertices = sum(m.vertex_count for m in baked.meshes.values())
+    print(f"{path}: {len(baked.meshes)} cenas, {vertices} vértices, {os.path.getsize(path)/1024:.0f} KiB")
+    print(f"compilação {1000*(t1-t0):.0f} ms, carga {1000*(t2-t1):.1f} ms")
+    for key, numbers in baked.optimization.items():
+        stats = OptimizeStats()
+        vars(stats).update(numbers)
+        print(f"  {key}: {stats.report()}")
+    if baked.navmesh is not None:
+        grid, nav = baked.ground, baked.navmesh
+        print(f"navmesh: grade {grid.shape[1]}x{grid.shape[0]} de {grid.cell} m, {int(grid.walkable.sum())} células andáveis, "
+              f"{len(nav)} nós, {len(nav.neighbors)} ligações")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,162 @@
+import gc
+import os
+import sys
+import json
+import time
+import argparse
+from collections import defaultdict
+import pygame
+import centro
+import textures
+import render_queue
+from contextlib import ExitStack
+from recording import CommandRecorder, recording
+from render_queue import RenderQueue, queued
+
+#  MICRO-BENCHMARKS
+# Funções da câmera, da colisão e de desenho medidas sem janela: as draw_*
+# rodam contra o backend de gravação (recording.py). Para cada caso sai o
+# tempo por chamada (µs, melhor de ROUNDS rodadas) e, nas de desenho, as
+# chamadas GL, draw calls, vértices e mudanças de estado por chamada (os
+# casos queued: passam pela fila ordenada de render_queue.py). Os
+# números são comparados com BASELINE_PATH: contagens maiores são regressão.
+# O tempo depende da máquina e só entra com --check-time (regressão quando
+# passa de TIME_TOLERANCE acima da base); refaça a base com --update, de uma
+# vez e na mesma máquina, antes de comparar tempos.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(HERE, 'bench_baseline.json')
+ROUNDS = 7
+# Cada rodada repete o caso até passar deste tempo
+ROUND_SECONDS = 0.05
+TIME_TOLERANCE = 0.25
+COUNTED = ('calls', 'draw_calls', 'vertices', 'state_changes', 'redundant_state')
+
+
+def camera_case(method):
+    # Passo da câmera andando para a frente (W), sempre a partir da mesma posição
+    camera = centro.Camera()
+    start = camera.position.copy()
+    keys = defaultdict(bool, {pygame.K_w: True})
+    def run():
+        camera.position[:] = start
+        if method == 'update': camera.update(keys)
+        else: camera.update_vectors()
+    return run
+
+
+def collision_case():
+    walls, position = centro.INTERIOR_WALLS, (0.0, 1.8, 4.0)
+    return lambda: centro.check_collision(position, walls, centro.PLAYER_RADIUS)
+
+
+def queued_case(draw):
+    # Envio à fila e flush; texturas numa biblioteca própria, criadas contra o gravador
+    queue = RenderQueue(textures=textures.TextureLibrary())
+    def run():
+        with queued(vars(centro), queue): draw()
+        queue.flush()
+    return run
+
+
+# nome -> (fábrica do caso, desenha?)
+BENCHMARKS = {
+    'check_collision': (collision_case, False),
+    'Camera.update': (lambda: camera_case('update'), False),
+    'Camera.update_vectors': (lambda: camera_case('update_vectors'), False),
+    'draw_bookshelf': (lambda: lambda: centro.draw_bookshelf((0.0, 0.0, 0.0)), True),
+    'draw_building_facade': (lambda: centro.draw_building_facade, True),
+    'draw_interior_scene': (lambda: centro.draw_interior_scene, True),
+    'draw_exterior_scene': (lambda: centro.draw_exterior_scene, True),
+    'queued:draw_bookshelf': (lambda: queued_case(lambda: centro.draw_bookshelf((0.0, 0.0, 0.0))), True),
+    'queued:draw_interior_scene': (lambda: queued_case(centro.draw_interior_scene), True),
+    'queued:draw_exterior_scene': (lambda: queued_case(centro.draw_exterior_scene), True),
+}
+
+
+def time_us(fn):
+    # Sem o coletor de lixo durante a medida, como o timeit
+    fn()
+    best = float('inf')
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(ROUNDS):
+            n, t0 = 0, time.perf_counter()
+            while True:
+                fn(); n += 1
+                elapsed = time.perf_counter() - t0
+                if elapsed >= ROUND_SECONDS: break
+            best = min(best, elapsed / n)
+    finally:
+        if enabled: gc.enable()
+    return best * 1e6
+
+
+def run_case(name):
+    factory, draws = BENCHMARKS[name]
+    fn = factory()
+    if not draws: return {'us': round(time_us(fn), 1)}
+    recorder = CommandRecorder()
+    # A fila e as texturas chamam o GL pelos nomes dos seus módulos
+    with ExitStack() as stack:
+        for module in (centro, render_queue, textures): stack.enter_context(recording(vars(module), recorder))
+        fn()
+        result = {key: value for key, value in recorder.summary().items() if key in COUNTED}
+        result['us'] = round(time_us(fn), 1)
+    return result
+
+
+def compare(results, baseline, tolerance=TIME_TOLERANCE, check_time=False):
+    # Regressões: (caso, medida, base, agora); o tempo só com check_time
+    regressions = []
+    for name, now in results.items():
+        base = baseline.get(name)
+        if base is None: continue
+        for key in COUNTED:
+            if key in base and now.get(key, 0) > base[key]: regressions.append((name, key, base[key], now[key]))
+        if check_time and now['us'] > base['us'] * (1 + tolerance): regressions.append((name, 'us', base['us'], now['us']))
+    return regressions
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Micro-benchmarks sem janela, comparados com a base guardada")
+    parser.add_argument('names', nargs='*', help=f"casos a rodar (padrão: todos): {', '.join(BENCHMARKS)}")
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--check-time', action='store_true', help="também acusa regressão de tempo (a base precisa ser desta máquina)")
+    parser.add_argument('--tolerance', type=float, default=TIME_TOLERANCE, help="folga do tempo sobre a base com --check-time (0.25 = 25%%)")
+    parser.add_argument('--update', action='store_true', help="grava os resultados como a nova base")
+    parser.add_argument('--out', help="grava os resultados em JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    args = parse_args(argv)
+    unknown = [n for n in args.names if n not in BENCHMARKS]
+    if unknown: raise SystemExit(f"casos desconhecidos: {', '.join(unknown)}")
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f: baseline = json.load(f)
+    results = {}
+    print(f"{'caso':<24}{'µs':>10}{'base µs':>10}{'chamadas':>10}{'draws':>8}{'vértices':>10}{'estado':>8}{'repetido':>9}")
+    for name in args.names or BENCHMARKS:
+        r = results[name] = run_case(name)
+        base = baseline.get(name, {}).get('us')
+        base = f"{base:>10.1f}" if base is not None else f"{'-':>10}"
+        counts = ''.join(f"{r[k]:>{w}}" if k in r else f"{'-':>{w}}"
+                         for k, w in zip(COUNTED, (10, 8, 10, 8, 9)))
+        print(f"{name:<24}{r['us']:>10.1f}{base}{counts}")
+    if args.out:
+        with open(args.out, 'w') as f: json.dump(results, f, indent=2)
+    if args.update:
+        with open(args.baseline, 'w') as f: json.dump({**baseline, **results}, f, indent=2, sort_keys=True)
+        print(f"base gravada em {args.baseline}")
+        return 0
+    regressions = compare(results, baseline, args.tolerance, args.check_time)
+    for name, key, base, now in regressions:
+        print(f"REGRESSÃO {name}: {key} {base:.6g} -> {now:.6g}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,55 @@
+import time
+import numpy as np
+from collision import CollisionWorld
+from centro import check_collision, INTERIOR_WALLS, PLAYER_RADIUS
+
+#  BENCHMARK DE COLISÃO
+# Mede o custo de consulta do CollisionWorld com 5 a 100k colisores (densidade
+# constante, como quarteirões vizinhos) e compara com o laço de check_collision.
+
+COUNTS = [5, 100, 1000, 10000, 100000]
+BATCH = 1024
+# Laço Python fica lento demais acima disso
+NAIVE_LIMIT = 10000
+
+
+def random_world(n, rng):
+    # ~1 caixa a cada 16 m² no plano, paredes e móveis de tamanhos variados
+    if n <= len(INTERIOR_WALLS): return np.array(INTERIOR_WALLS[:n], dtype=float)
+    side = 4.0 * np.sqrt(n)
+    lo = rng.uniform(-side/2, side/2, (n, 3)); lo[:, 1] = 0
+    size = rng.uniform(0.2, 3.0, (n, 3)); size[:, 1] = rng.uniform(0.5, 9.5, n)
+    hi = lo + size
+    return np.stack([lo[:, 0], hi[:, 0], lo[:, 1], hi[:, 1], lo[:, 2], hi[:, 2]], axis=1)
+
+
+def timeit(fn, repeat):
+    fn()
+    t0 = time.perf_counter()
+    for _ in range(repeat): fn()
+    return (time.perf_counter() - t0) / repeat
+
+
+def main():
+    rng = np.random.default_rng(7)
+    print(f"{'colisores':>10} {'build ms':>10} {'1 esfera us':>12} {'lote us/esfera':>15} {'laço us':>10}")
+    for n in COUNTS:
+        boxes = random_world(n, rng)
+        t0 = time.perf_counter()
+        world = CollisionWorld(boxes)
+        build_ms = (time.perf_counter() - t0) * 1000
+        extent = max(np.abs(boxes[:, [0, 1, 4, 5]]).max(), 1.0)
+        points = rng.uniform(-extent, extent, (BATCH, 3)); points[:, 1] = 1.8
+        single = timeit(lambda: world.query_sphere(points[0], PLAYER_RADIUS), 200) * 1e6
+        batch = timeit(lambda: world.query_spheres(points, PLAYER_RADIUS), 20) * 1e6 / BATCH
+        walls = [tuple(b) for b in boxes]
+        naive = '-'
+        if n <= NAIVE_LIMIT:
+            naive = f"{timeit(lambda: check_collision(points[0], walls, PLAYER_RADIUS), 20) * 1e6:10.1f}"
+            expected = np.array([check_collision(p, walls, PLAYER_RADIUS) for p in points[:256]])
+            assert (world.query_spheres(points[:256], PLAYER_RADIUS) == expected).all()
+        print(f"{n:>10} {build_ms:>10.1f} {single:>12.1f} {batch:>15.2f} {naive:>10}")
+
+
+if __name__ == "__main__":
+    main()
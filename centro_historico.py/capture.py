@@ -0,0 +1,204 @@
+import os
+import time
+import queue
+import ctypes
+import threading
+import multiprocessing
+from collections import deque
+from OpenGL.GL import *
+import numpy as np
+
+#  CAPTURA DE QUADROS SEM TRAVAR (PBO)
+# glReadPixels para a memória do processo espera a GPU terminar o quadro. Aqui
+# cada leitura vai para um pixel buffer object de um anel de CAPTURE_RING: a
+# cópia fica na fila da GPU e o buffer só é mapeado quadros depois, quando o
+# fence daquele quadro já passou. Uma thread copia a memória mapeada
+# (ctypes.memmove solta o GIL) e entrega o quadro ao destino: PNGs codificados
+# em processos à parte ou um arquivo de vídeo cru (BGRA, de baixo para cima)
+# gravado pela própria thread. Sem buffer livre o quadro é descartado e
+# contado; o laço principal nunca espera pela captura.
+
+CAPTURE_RING = 4
+CAPTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'captures')
+CAPTURE_FPS = 30.0
+# Quadros esperando codificação em PNG; cheio, a thread de cópia segura os buffers
+CAPTURE_QUEUE = 8
+CAPTURE_ENCODERS = max(1, (os.cpu_count() or 1) // 2)
+
+
+def encode_png(frames):
+    # Processo codificador: (caminho, largura, altura, bytes BGRA de baixo para cima)
+    import pygame
+    while True:
+        item = frames.get()
+        if item is None: return
+        path, width, height, data = item
+        image = pygame.image.frombuffer(data, (width, height), 'BGRA')
+        pygame.image.save(pygame.transform.flip(image, False, True), path)
+
+
+class Slot:
+    __slots__ = ('pbo', 'state', 'fence', 'job', 'pointer', 'copied')
+
+    def __init__(self, pbo):
+        self.pbo = pbo
+        # 'free' -> 'reading' (glReadPixels + fence) -> 'mapped' (na thread de cópia) -> 'free'
+        self.state, self.fence, self.job, self.pointer = 'free', None, None, None
+        self.copied = threading.Event()
+
+
+class FrameCapture:
+    # Precisa do contexto GL atual; grab() vai entre o desenho da cena e o flip
+    def __init__(self, width, height, out_dir=CAPTURE_DIR, fmt='png', fps=CAPTURE_FPS, ring=CAPTURE_RING):
+        self.width, self.height = width, height
+        self.nbytes = width * height * 4
+        self.out_dir, self.fmt, self.fps, self.ring = out_dir, fmt, fps, ring
+        self.slots, self.inflight = [], deque()
+        self.recording, self.session, self.video = False, None, None
+        # Sessões encerradas esperando os últimos quadros saírem da GPU
+        self.ending = deque()
+        self.next_time, self.index = None, 0
+        self.pending_shot = None
+        self.captured, self.dropped = 0, 0
+        self.copies = queue.Queue()
+        self.frames, self.encoders = None, []
+        self.thread = threading.Thread(target=self.copier, name='frame-capture', daemon=True)
+        self.thread.start()
+
+    #  GRAVAÇÃO
+    def start(self):
+        os.makedirs(self.out_dir, exist_ok=True)
+        self.session = os.path.join(self.out_dir, time.strftime('walk_%Y%m%d_%H%M%S'))
+        if self.fmt == 'raw':
+            self.video = open(self.session + '.bgra', 'wb')
+        else:
+            os.makedirs(self.session, exist_ok=True)
+        self.recording, self.next_time, self.index = True, None, 0
+
+    def stop(self):
+        # O arquivo de vídeo fecha na thread de cópia, depois do último quadro desta sessão
+        if not self.recording: return
+        self.recording = False
+        self.ending.append((self.session, self.video))
+        self.video = None
+
+    def toggle(self):
+        self.stop() if self.recording else self.start()
+
+    def screenshot(self):
+        os.makedirs(self.out_dir, exist_ok=True)
+        self.pending_shot = os.path.join(self.out_dir, time.strftime('screenshot_%Y%m%d_%H%M%S.png'))
+
+    #  THREAD PRINCIPAL
+    def grab(self, now):
+        self.poll()
+        if self.pending_shot is not None:
+            job = ('shot', self.pending_shot, None, None)
+        elif self.recording and (self.next_time is None or now >= self.next_time):
+            # Sem rajadas depois de uma pausa longa: o relógio da captura não fica para trás
+            step = 1.0 / self.fps if self.fps else 0.0
+            self.next_time = max((self.next_time or now) + step, now)
+            job = ('video', self.index, self.session, self.video)
+            self.index += 1
+        else:
+            return
+        if not self.slots: self.allocate()
+        slot = next((s for s in self.slots if s.state == 'free'), None)
+        if slot is None:
+            # Screenshot tenta de novo no próximo quadro; quadro de vídeo se perde
+            if job[0] == 'video': self.dropped += 1
+            return
+        if job[0] == 'shot': self.pending_shot = None
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, slot.pbo)
+        glPixelStorei(GL_PACK_ALIGNMENT, 4)
+        glReadPixels(0, 0, self.width, self.height, GL_BGRA, GL_UNSIGNED_BYTE, ctypes.c_void_p(0))
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        slot.fence = glFenceSync(GL_SYNC_GPU_COMMANDS_COMPLETE, 0)
+        slot.state, slot.job = 'reading', job
+        self.inflight.append(slot)
+        self.captured += 1
+
+    def allocate(self):
+        for pbo in np.atleast_1d(glGenBuffers(self.ring)):
+            glBindBuffer(GL_PIXEL_PACK_BUFFER, int(pbo))
+            glBufferData(GL_PIXEL_PACK_BUFFER, self.nbytes, None, GL_STREAM_READ)
+            self.slots.append(Slot(int(pbo)))
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+
+    def poll(self, timeout=0):
+        # Desmapeia os buffers já copiados e mapeia, em ordem, os quadros que a GPU terminou
+        for slot in self.slots:
+            if slot.state == 'mapped' and slot.copied.is_set():
+                glBindBuffer(GL_PIXEL_PACK_BUFFER, slot.pbo)
+                glUnmapBuffer(GL_PIXEL_PACK_BUFFER)
+                slot.state, slot.pointer = 'free', None
+        while self.inflight:
+            slot = self.inflight[0]
+            if glClientWaitSync(slot.fence, 0, timeout) not in (GL_ALREADY_SIGNALED, GL_CONDITION_SATISFIED): break
+            glDeleteSync(slot.fence)
+            glBindBuffer(GL_PIXEL_PACK_BUFFER, slot.pbo)
+            slot.pointer = glMapBufferRange(GL_PIXEL_PACK_BUFFER, 0, self.nbytes, GL_MAP_READ_BIT)
+            slot.state, slot.fence = 'mapped', None
+            slot.copied.clear()
+            self.inflight.popleft()
+            self.copies.put(('copy', slot))
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        while self.ending and not any(s.job[2] == self.ending[0][0] for s in self.inflight):
+            self.copies.put(('stop', self.ending.popleft()))
+
+    def close(self):
+        # Espera os quadros em voo, fecha a sessão e encerra thread e codificadores
+        self.stop()
+        self.poll()
+        while self.inflight or self.ending or any(s.state == 'mapped' for s in self.slots):
+            self.poll(timeout=10**7)
+            time.sleep(0.001)
+        self.copies.put(None)
+        self.thread.join()
+        for _ in self.encoders: self.frames.put(None)
+        for encoder in self.encoders: encoder.join()
+        if self.slots: glDeleteBuffers(len(self.slots), [s.pbo for s in self.slots])
+        self.slots = []
+
+    #  THREAD DE CÓPIA
+    def copier(self):
+        while True:
+            item = self.copies.get()
+            if item is None: return
+            kind, value = item
+            if kind == 'stop':
+                self.finish(*value)
+                continue
+            slot = value
+            frame = bytearray(self.nbytes)
+            ctypes.memmove((ctypes.c_char * self.nbytes).from_buffer(frame), slot.pointer, self.nbytes)
+            job = slot.job
+            slot.copied.set()
+            try:
+                self.deliver(job, frame)
+            except Exception as e:
+                print(f"Captura falhou: {e}")
+
+    def deliver(self, job, frame):
+        kind, value, session, video = job
+        if video is not None:
+            video.write(frame)
+            return
+        path = value if kind == 'shot' else os.path.join(session, 'frame_%06d.png' % value)
+        if not self.encoders: self.start_encoders()
+        self.frames.put((path, self.width, self.height, bytes(frame)))
+
+    def start_encoders(self):
+        # spawn: os codificadores não herdam o contexto GL nem as threads deste processo
+        ctx = multiprocessing.get_context('spawn')
+        self.frames = ctx.Queue(CAPTURE_QUEUE)
+        self.encoders = [ctx.Process(target=encode_png, args=(self.frames,), daemon=True) for _ in range(CAPTURE_ENCODERS)]
+        for encoder in self.encoders: encoder.start()
+
+    def finish(self, session, video):
+        if video is not None:
+            video.close()
+            print(f"Vídeo em {session}.bgra; para converter:\n  ffmpeg -f rawvideo -pix_fmt bgra -s {self.width}x{self.height} "
+                  f"-r {self.fps or 30:g} -i {session}.bgra -vf vflip {session}.mp4")
+        else:
+            print(f"Quadros em {session}/")
@@ -1,9 +1,25 @@
+from startup import STARTUP, BackgroundTask, wait_with_loading_screen
 import pygame
-from pygame.locals import *
 from OpenGL.GL import *
-from OpenGL.GLU import *
+from OpenGL.GLU import gluLookAt, gluPerspective
 import numpy as np
 import math
+import time
+import argparse
+import multiprocessing
+from geometry import SceneCache, RENDER_STATS, translation_matrix, rotation_matrix
+from instancing import PropInstances
+from collision import CollisionWorld
+from simulation import (FixedStepSimulation, InputRecorder, step_body,
+                        PLAYER_SPEED, PLAYER_GRAVITY, PLAYER_JUMP_SPEED, PLAYER_HEIGHT)
+from culling import Frustum
+from portals import Portal, CellGraph
+from lod import lod_slices
+from bake import load_or_bake, load_or_bake_in_process
+from profiler import PROFILER, count_immediate_calls
+from textures import TEXTURES, texture_image, procedural_texture, texture_key, draw_textured_quad, canvas, coverage, segment_distance, paint, vertical_gradient, to_bytes
+from render_queue import RenderQueue, queued
+from primitives import draw_primitive, circle_table, disk_fan, annulus_strip, arch_fan, cylinder_mesh
 
 # CORES 
 COLOR_WALL = (0.98, 0.82, 0.76)
@@ -21,6 +37,11 @@ COLOR_TABLE_GRAY_D = (0.50, 0.50, 0.50)
 COLOR_INTERIOR_WALL = (0.92, 0.88, 0.82)
 COLOR_WOOD_FLOOR_BASE = (0.32, 0.22, 0.12)
 COLOR_WOOD_FLOOR_SEAM = (0.16, 0.11, 0.07)
+# Texturas procedurais (textures.py): resolução e largura dos traços em metros
+FLOOR_TEXTURE_SIZE = (2048, 1024)
+FLOOR_SEAM_WIDTH = 0.012
+PAINTING_TEXTURE_WIDTH = 512
+CLOCK_TEXTURE_SIZE = 512
 FLOOR_Y = 0.03
 COLOR_BLACK = (0.0, 0.0, 0.0)
 COLOR_WHITE = (0.97, 0.97, 0.97)
@@ -29,10 +50,27 @@ COLOR_FRAME = (0.40, 0.26, 0.12)
 COLOR_BUTTON_BLUE = (0.2, 0.4, 0.8)
 COLOR_BUTTON_BASE = (0.1, 0.2, 0.4)
 BUTTON_POS = np.array([-1.8, 1.4, 4.1])
-BUTTON_INTERACTION_RADIUS = 2.0
+# Lombadas dos livros das estantes, em ordem (ver make_interactions)
+BOOK_TITLES = ('Vidas Secas', 'São Bernardo', 'Angústia', 'Caetés', 'Invenção de Orfeu', 'Poemas Negros',
+               'Ninho de Cobras', 'Calabar', 'A Bagaceira', 'Memórias do Cárcere', 'Infância', 'O Mundo do Menino Impossível')
+# Cena estática compilada em VBOs (False volta ao modo imediato)
+USE_VBO = True
+# Pipeline com shaders GLSL 3.30 (shaders.py); precisa de USE_VBO e cai no pipeline fixo se o driver recusar
+USE_SHADERS = False
+PIPELINE = None
+# No modo imediato as draw_* passam pela fila ordenada por estado (render_queue.py); False chama o GL direto
+USE_RENDER_QUEUE = True
+RENDER_QUEUE = RenderQueue()
+# Nível de detalhe da tesselação (0 = total); trocado pelo compilador ao gravar LOD_OBJECTS
+LOD_LEVEL = 0
 
 #  NOVAS CONSTANTES E AJUSTE DE COLISÃO 
 PLAYER_RADIUS = 0.4 
+# Projeção (gluPerspective)
+FOV_Y, Z_NEAR, Z_FAR = 45, 0.1, 100.0
+VIEW_ASPECT = 16/9
+# Altura do viewport em pixels (LOD por tamanho na tela, lod.py)
+VIEW_HEIGHT = 720
 # Definir a abertura da porta para quebrar a parede frontal
 DOOR_OPENING_X_MIN = -2.2  
 DOOR_OPENING_X_MAX = 2.2  
@@ -49,6 +87,18 @@ INTERIOR_WALLS = [
     
     (DOOR_OPENING_X_MAX, 10.0, 0, 9.5, 3.9, 4.0),
 ]
+# Pontos (x, z) entre os quais os visitantes andam: balcão, estantes, mesas
+VISITOR_WAYPOINTS = [
+    (0, -2.0), (-7.6, -1.6), (7.6, -1.6), (-7.6, 1.8), (7.6, 1.8),
+    (-2, -0.3), (-0.3, 1.5), (5, 0.0), (-5, 0.2), (3, 2.5),
+]
+# Células da cena ligadas pelo vão da porta dupla (já com o deslocamento de 0.5 do prédio).
+# A caixa é mais grossa que a parede para o portal continuar visível com a câmera no vão.
+# Os arcos e janelas da fachada são fechados (vidro/pintura) e não servem de portal.
+DOOR_PORTAL_BOUNDS = (-1.1, 0.5, 3.5, 1.1, 3.3, 4.5)
+CELLS = CellGraph([Portal('door', ('exterior', 'interior'), DOOR_PORTAL_BOUNDS)])
+# Paredes indexadas em grade para as consultas de colisão da câmera
+COLLISION_WORLD = CollisionWorld(INTERIOR_WALLS)
 #  CÂMERA 
 def check_collision(position, walls, radius):
  
@@ -69,16 +119,19 @@ def check_collision(position, walls, radius):
     return False
 #  CÂMERA (VERSÃO ATUALIZADA COM COLISÃO) 
 class Camera:
-    def __init__(self, position=(0, 1.8, 15), yaw=-90.0, pitch=0.0):
+    def __init__(self, position=(0, 1.8, 15), yaw=-90.0, pitch=0.0, world=None, ground=None):
         self.position = np.array(position, dtype=float)
         self.yaw, self.pitch = yaw, pitch
-        self.speed, self.sensitivity = 0.15, 0.12
-        self.player_height = 1.8
-        self.gravity, self.jump_speed = -0.015, 0.25
+        self.speed, self.sensitivity = PLAYER_SPEED, 0.12
+        self.player_height = PLAYER_HEIGHT
+        self.gravity, self.jump_speed = PLAYER_GRAVITY, PLAYER_JUMP_SPEED
         self.y_velocity, self.on_ground = 0, True
         
         # O raio do jogador é usado para colisões
         self.player_radius = PLAYER_RADIUS 
+        self.world = world if world is not None else COLLISION_WORLD
+        # Grade de alturas do chão (navigation.HeightGrid); None = chão plano em y = 0
+        self.ground = ground
         
         self.update_vectors()
 
@@ -100,6 +153,8 @@ class Camera:
         self.pitch = max(-89.0, min(89.0, self.pitch))
         self.update_vectors()
 
+    # Um passo de simulação: speed/gravity/jump_speed valem por passo de 1/60 s
+    # (ver simulation.py), independente da taxa de quadros
     def update(self, keys):
         #  LÓGICA DE MOVIMENTO ATUALIZADA 
         move_vec = np.array([0.0, 0.0, 0.0])
@@ -117,36 +172,26 @@ class Camera:
 
         if np.linalg.norm(move_vec) > 0:
             move_vec /= np.linalg.norm(move_vec)
-            
-           
-            potential_pos_x = self.position + np.array([move_vec[0] * self.speed, 0, 0])
-            if not check_collision(potential_pos_x, INTERIOR_WALLS, self.player_radius):
-                self.position[0] = potential_pos_x[0]
-
-           
-            potential_pos_z = self.position + np.array([0, 0, move_vec[2] * self.speed])
-            if not check_collision(potential_pos_z, INTERIOR_WALLS, self.player_radius):
-                self.position[2] = potential_pos_z[2]
-
-        #  LÓGICA DE GRAVIDADE E PULO (PERMANECE A MESMA) 
-        self.y_velocity += self.gravity
-        self.position[1] += self.y_velocity
-        
-        if keys[pygame.K_SPACE] and self.on_ground:
-            self.y_velocity = self.jump_speed
-            self.on_ground = False
-            
-        if self.position[1] < self.player_height:
-            self.position[1] = self.player_height
-            self.y_velocity = 0
-            self.on_ground = True
-
-    def look(self):
-        look_at_point = self.position + self.front
-        gluLookAt(self.position[0], self.position[1], self.position[2],
+
+        #  COLISÃO, GRAVIDADE E PULO: mesma física dos visitantes, no caminho de um corpo só (simulation.step_body)
+        self.y_velocity, self.on_ground = step_body(
+            self.world, self.position, float(self.y_velocity), self.on_ground, move_vec, bool(keys[pygame.K_SPACE]),
+            self.player_radius, self.speed, self.gravity, self.jump_speed, self.player_height, self.ground)
+
+    def look(self, position=None):
+        # position: posição interpolada entre passos de simulação
+        if position is None: position = self.position
+        look_at_point = position + self.front
+        gluLookAt(position[0], position[1], position[2],
                   look_at_point[0], look_at_point[1], look_at_point[2],
                   self.up[0], self.up[1], self.up[2])
 
+    def view_matrix(self, position=None):
+        # Mesma matriz de look(), para o pipeline com shaders
+        from shaders import look_at
+        if position is None: position = self.position
+        return look_at(position, position + self.front, self.up)
+
 #  FUNÇÕES DE DESENHO PRIMITIVAS 
 def draw_cube(center, size, color):
     x, y, z = center
@@ -172,60 +217,42 @@ def draw_arched_opening(center, size, color, arch_ratio=0.8):
     glEnd()
     acy = y-sy/2+rh
     if arch_ratio > 0.01:
-        glBegin(GL_TRIANGLE_FAN)
-        glVertex3f(x, acy, z)
-        for i in range(19):
-            a = math.radians(i*10)
-            glVertex3f(x + math.cos(a)*r, acy + math.sin(a)*r*arch_ratio, z)
-        glEnd()
+        glPushMatrix(); glTranslatef(x, acy, z); glScalef(r, r*arch_ratio, 1)
+        draw_primitive(GL_TRIANGLE_FAN, arch_fan(lod_slices(18, LOD_LEVEL)))
+        glPopMatrix()
 
 def draw_cylinder(base_center, radius, height, color, slices=32):
     x, y, z = base_center
     glDisable(GL_CULL_FACE)
     glColor3fv(color)
-    quadric = gluNewQuadric()
     glPushMatrix()
-    glTranslatef(x, y, z)
-    gluCylinder(quadric, radius, radius, height, slices, 1)
-    gluDisk(quadric, 0, radius, slices, 1)
-    glTranslatef(0, 0, height)
-    gluDisk(quadric, 0, radius, slices, 1)
+    glTranslatef(x, y, z); glScalef(radius, radius, height)
+    draw_primitive(GL_TRIANGLES, cylinder_mesh(lod_slices(slices, LOD_LEVEL)))
     glPopMatrix()
-    gluDeleteQuadric(quadric)
     glEnable(GL_CULL_FACE)
 
 def draw_disk_xy(radius, z, color, slices=64):
     glDisable(GL_CULL_FACE)
     glColor3fv(color)
-    glBegin(GL_TRIANGLE_FAN)
-    glVertex3f(0, 0, z)
-    for i in range(slices + 1):
-        a = 2.0 * math.pi * i / slices
-        glVertex3f(radius*math.cos(a), radius*math.sin(a), z)
-    glEnd()
+    glPushMatrix(); glTranslatef(0, 0, z); glScalef(radius, radius, 1)
+    draw_primitive(GL_TRIANGLE_FAN, disk_fan(lod_slices(slices, LOD_LEVEL)))
+    glPopMatrix()
     glEnable(GL_CULL_FACE)
 
 def draw_annulus_xy(outer_r, inner_r, z, color, slices=64):
     glDisable(GL_CULL_FACE)
     glColor3fv(color)
-    glBegin(GL_TRIANGLE_STRIP)
-    for i in range(slices + 1):
-        a = 2.0 * math.pi * i / slices
-        co, si = math.cos(a), math.sin(a)
-        glVertex3f(outer_r*co, outer_r*si, z)
-        glVertex3f(inner_r*co, inner_r*si, z)
-    glEnd()
+    glPushMatrix(); glTranslatef(0, 0, z); glScalef(outer_r, outer_r, 1)
+    draw_primitive(GL_TRIANGLE_STRIP, annulus_strip(inner_r/outer_r, lod_slices(slices, LOD_LEVEL)))
+    glPopMatrix()
     glEnable(GL_CULL_FACE)
 
 def draw_disk_yz(radius, x, cy, cz, color, slices=64):
     glDisable(GL_CULL_FACE)
     glColor3fv(color)
-    glBegin(GL_TRIANGLE_FAN)
-    glVertex3f(x, cy, cz)
-    for i in range(slices + 1):
-        a = 2.0 * math.pi * i / slices
-        glVertex3f(x, cy + radius*math.cos(a), cz + radius*math.sin(a))
-    glEnd()
+    glPushMatrix(); glTranslatef(x, cy, cz); glScalef(1, radius, radius)
+    draw_primitive(GL_TRIANGLE_FAN, disk_fan(lod_slices(slices, LOD_LEVEL), 'yz'))
+    glPopMatrix()
     glEnable(GL_CULL_FACE)
 
 
@@ -308,6 +335,13 @@ def draw_chair(center, rotation=0):
     draw_cube((0, back_y, back_z), (seat_w*0.95, back_h, back_th), COLOR_CHAIR_BLUE)
     glPopMatrix()
 
+def draw_visitor(center):
+    # Visitante (visitors.py): pés em center, olhando para +Z; a cor é multiplicada pelo tom de cada um
+    x, y, z = center
+    draw_cube((x, y+0.31, z), (0.34, 0.62, 0.20), (0.35, 0.35, 0.40))
+    draw_cube((x, y+0.895, z), (0.42, 0.55, 0.24), (1.0, 1.0, 1.0))
+    draw_cube((x, y+1.28, z+0.02), (0.20, 0.22, 0.20), (0.87, 0.70, 0.55))
+
 def draw_counter(center):
     draw_cube(center, (3.0, 1.0, 0.6), COLOR_WOOD_DARK)
 
@@ -357,22 +391,33 @@ def draw_round_table_with_chairs(center, table_radius=0.8):
     draw_chair((cx - distance_from_center, cy, cz), 90)
 
 def draw_wall_clock(center, radius=0.5, orientation='x'):
+    # Aro, mostrador, marcas e ponteiros numa textura só (clock_face_texture)
     x, y, z = center
     glPushMatrix(); glTranslatef(x, y, z)
     if orientation == 'x': glRotatef(90, 0, 1, 0)
-    draw_annulus_xy(radius, radius-0.035, 0, (0.15,0.15,0.15), 96)
+    r = radius
+    draw_textured_quad(texture_key('clock_face_texture', radius), ((-r,-r,0.0008), (r,-r,0.0008), (r,r,0.0008), (-r,r,0.0008)))
+    glPopMatrix()
+
+@procedural_texture
+def clock_face_texture(radius):
+    size = CLOCK_TEXTURE_SIZE
+    image, x, y, px = canvas(size, size, 2*radius, 2*radius, COLOR_BLACK, alpha=0.0)
+    x, y = x - radius, y - radius
+    r = np.hypot(x, y)
     face_r = radius-0.038
-    draw_disk_xy(face_r, 0.0008, COLOR_WHITE, 96)
-    glLineWidth(2.5); glColor3fv(COLOR_BLACK); glBegin(GL_LINES)
-    for i in range(12):
-        a = 2.0*math.pi*i/12.0; r0, r1 = face_r*0.82, face_r*0.95
-        glVertex3f(r0*math.cos(a), r0*math.sin(a), 0.0012); glVertex3f(r1*math.cos(a), r1*math.sin(a), 0.0012)
-    glEnd()
+    paint(image, (0.15,0.15,0.15), coverage(r - radius, px))
+    paint(image, COLOR_WHITE, coverage(r - face_r, px))
+    # Marcas, ponteiros e pino: traços pretos (início, fim, meia largura) num único campo de distância
+    r0, r1 = face_r*0.82, face_r*0.95
+    strokes = [((r0*co, r0*si), (r1*co, r1*si), face_r*0.012) for co, si in circle_table(12)[:12]]
     min_a, h_a = math.radians(-60), math.radians(-(300+5))
-    glLineWidth(3.0); glBegin(GL_LINES); glVertex3f(0,0,0.0016); glVertex3f(0.55*face_r*math.cos(h_a), 0.55*face_r*math.sin(h_a), 0.0016); glEnd()
-    glLineWidth(2.5); glBegin(GL_LINES); glVertex3f(0,0,0.0016); glVertex3f(0.88*face_r*math.cos(min_a), 0.88*face_r*math.sin(min_a), 0.0016); glEnd()
-    glPointSize(6); glBegin(GL_POINTS); glVertex3f(0,0,0.0016); glEnd()
-    glPopMatrix()
+    for length, angle, width in ((0.55, h_a, 0.022), (0.88, min_a, 0.016)):
+        strokes.append(((0, 0), (length*face_r*math.cos(angle), length*face_r*math.sin(angle)), face_r*width))
+    ink = r - face_r*0.03
+    for a, b, half in strokes: ink = np.minimum(ink, segment_distance(x, y, a, b) - half)
+    paint(image, COLOR_BLACK, coverage(ink, px))
+    return to_bytes(image)
 
 def draw_painting(center, width=2.2, height=1.3, orientation='z'):
     x, y, z = center; thickness=0.03; frame=0.1
@@ -383,17 +428,30 @@ def draw_painting(center, width=2.2, height=1.3, orientation='z'):
     else:
         draw_cube((x,y,z), (thickness,height,width), COLOR_FRAME); plane = x+thickness/2+eps
         L,R = z-hw+margin, z+hw-margin; B,T = y-hh+margin, y+hh-margin
-    sky_top,sky_h,sea_t,sea_b,sand,sun = (0.66,0.82,0.95),(0.86,0.92,0.98),(0.07,0.4,0.65),(0.12,0.6,0.7),(0.93,0.86,0.65),(1,0.93,0.55)
-    inner_h = T-B; horizon, sand_h = B+inner_h*0.6, inner_h*0.16; sea_top_y, sea_bot_y = horizon-inner_h*0.02, B+sand_h
-    glDisable(GL_CULL_FACE)
     if orientation=='z':
-        glBegin(GL_QUADS); glColor3fv(sky_top); glVertex3f(L,T,plane); glVertex3f(R,T,plane); glColor3fv(sky_h); glVertex3f(R,horizon,plane); glVertex3f(L,horizon,plane); glEnd()
-        glBegin(GL_QUADS); glColor3fv(sea_t); glVertex3f(L,sea_top_y,plane); glVertex3f(R,sea_top_y,plane); glColor3fv(sea_b); glVertex3f(R,sea_bot_y,plane); glVertex3f(L,sea_bot_y,plane); glEnd()
-        glBegin(GL_QUADS); glColor3fv(sand); glVertex3f(L,B,plane); glVertex3f(R,B,plane); glVertex3f(R,B+sand_h,plane); glVertex3f(L,B+sand_h,plane); glEnd()
-        glPushMatrix(); glTranslatef(R-inner_h*0.3, T-inner_h*0.2, 0); draw_disk_xy(inner_h*0.12, plane+0.0015, sun, 72); glPopMatrix()
-    glEnable(GL_CULL_FACE)
+        draw_textured_quad(texture_key('painting_texture', R-L, T-B), ((L,B,plane), (R,B,plane), (R,T,plane), (L,T,plane)))
+
+@procedural_texture
+def painting_texture(width, height):
+    # Marinha: céu, mar e areia em degradê, com o sol; a faixa do horizonte mostra a moldura
+    w = PAINTING_TEXTURE_WIDTH; h = max(1, round(w*height/width))
+    image, x, y, px = canvas(w, h, width, height, COLOR_FRAME)
+    sky_top,sky_h,sea_t,sea_b,sand,sun = (0.66,0.82,0.95),(0.86,0.92,0.98),(0.07,0.4,0.65),(0.12,0.6,0.7),(0.93,0.86,0.65),(1,0.93,0.55)
+    horizon, sand_h = height*0.6, height*0.16; sea_top_y = horizon-height*0.02
+    vertical_gradient(image, y, horizon, height, sky_h, sky_top)
+    vertical_gradient(image, y, sand_h, sea_top_y, sea_b, sea_t)
+    vertical_gradient(image, y, 0.0, sand_h, sand, sand)
+    paint(image, sun, coverage(np.hypot(x-(width-height*0.3), y-height*0.8) - height*0.12, px))
+    return to_bytes(image)
 
 # FACHADA / EXTERIOR
+# Peças repetidas: na cena compilada viram instâncias (instancing.py)
+def draw_balcony_post(center, size, color):
+    draw_cube(center, size, color)
+
+def draw_window_mullion(center, size, color):
+    draw_cube(center, size, color)
+
 def draw_balcony(center, size):
     x,y,z = center
     sx,sz = size
@@ -404,7 +462,7 @@ def draw_balcony(center, size):
     draw_cube((x+sx/2, y+balcony_height, z+sz/2), (0.08, 0.08, sz), COLOR_BALCONY_GRILL)
     for i in range(13):
         post_x = (x-sx/2) + (sx/12)*i
-        draw_cube((post_x, y+balcony_height/2, z+sz), (0.04, balcony_height, 0.04), COLOR_BALCONY_GRILL)
+        draw_balcony_post((post_x, y+balcony_height/2, z+sz), (0.04, balcony_height, 0.04), COLOR_BALCONY_GRILL)
 
 # <--- FUNÇÃO MODIFICADA ---
 def draw_ornate_window(center, size):
@@ -416,9 +474,9 @@ def draw_ornate_window(center, size):
     glEnable(GL_POLYGON_OFFSET_FILL)
     glPolygonOffset(-1.0, -1.0)
     
-    draw_cube((x, y, z+0.01), (sx*0.9, 0.05, 0.02), COLOR_MOLDING)
+    draw_window_mullion((x, y, z+0.01), (sx*0.9, 0.05, 0.02), COLOR_MOLDING)
     for offset in [-0.4, 0.0, 0.4]:
-        draw_cube((x+offset, y, z+0.01), (0.05, sy*0.9, 0.02), COLOR_MOLDING)
+        draw_window_mullion((x+offset, y, z+0.01), (0.05, sy*0.9, 0.02), COLOR_MOLDING)
         
     glDisable(GL_POLYGON_OFFSET_FILL)
 
@@ -452,6 +510,15 @@ def draw_interactive_double_door(is_open):
     glPushMatrix(); glTranslatef(1.1,0,4.0+dt/2); glRotatef(-angle,0,1,0); glTranslatef(-dw/2,dh/2,0)
     draw_cube((0,0,0), (dw,dh,dt), COLOR_DOOR_WINDOW); glPopMatrix()
 
+def door_leaf_boxes(is_open):
+    # Caixas das duas folhas no mundo (deslocamento de 0.5 do prédio), com as mesmas transformações do desenho
+    from interaction import box_from_matrix
+    angle = 90 if is_open else 0
+    dw, dh, dt = 1.1, 2.8, 0.1
+    left = translation_matrix(-1.1,0.5,4.0+dt/2) @ rotation_matrix(angle,0,1,0) @ translation_matrix(dw/2,dh/2,0)
+    right = translation_matrix(1.1,0.5,4.0+dt/2) @ rotation_matrix(-angle,0,1,0) @ translation_matrix(-dw/2,dh/2,0)
+    return [box_from_matrix(m, (0,0,0), (dw,dh,dt)) for m in (left, right)]
+
 def draw_door_button():
     base_size = (0.25, 0.25, 0.02)
     button_size = (0.2, 0.2, 0.05)
@@ -460,10 +527,8 @@ def draw_door_button():
     draw_cube(button_center, button_size, COLOR_BUTTON_BLUE)
 
 def draw_ramp():
-    ramp_color, handrail_color = (0.7,0.7,0.7), (0.4,0.4,0.4)
-    glBegin(GL_QUADS); glColor3fv(ramp_color)
-    glVertex3f(-2.5,0.5,4.1); glVertex3f(2.5,0.5,4.1); glVertex3f(2.5,0,8); glVertex3f(-2.5,0,8)
-    glEnd()
+    handrail_color = (0.4,0.4,0.4)
+    draw_ramp_surface()
     for side in [-1, 1]:
         x = 2.4*side
         for i in range(5):
@@ -472,6 +537,11 @@ def draw_ramp():
         glColor3fv(handrail_color); glLineWidth(5.0)
         glBegin(GL_LINES); glVertex3f(x,1.5,4.1); glVertex3f(x,1,8); glEnd()
 
+def draw_ramp_surface():
+    glBegin(GL_QUADS); glColor3fv((0.7,0.7,0.7))
+    glVertex3f(-2.5,0.5,4.1); glVertex3f(2.5,0.5,4.1); glVertex3f(2.5,0,8); glVertex3f(-2.5,0,8)
+    glEnd()
+
 def draw_ground():
     glColor3fv(COLOR_GROUND)
     glBegin(GL_QUADS)
@@ -480,24 +550,28 @@ def draw_ground():
 
 # --- INTERIOR ---
 def draw_wood_floor(center, size, plank_width=0.45):
+    # Tábuas e juntas numa textura só (wood_floor_texture), u ao longo de X e v ao longo de Z
     cx,cy,cz=center; sx,_,sz=size
     x_min,x_max=cx-sx/2.0,cx+sx/2.0; z_min,z_max=cz-sz/2.0,cz+sz/2.0
-    y_top,y_line = cy,cy+0.0007
     n_planks = max(1, int(math.ceil((x_max-x_min)/plank_width)))
-    real_w = (x_max-x_min)/n_planks
-    for i in range(n_planks):
-        x0,x1 = x_min+i*real_w, x_min+(i+1)*real_w
-        f = 0.9 + 0.12 * (0.5+0.5*math.sin(i*2.1)*math.cos(i*0.7))
-        plank_color = tuple(min(1.0, c*f) for c in COLOR_WOOD_FLOOR_BASE)
-        glColor3fv(plank_color); glBegin(GL_QUADS)
-        glVertex3f(x0,y_top,z_min); glVertex3f(x0,y_top,z_max); glVertex3f(x1,y_top,z_max); glVertex3f(x1,y_top,z_min)
-        glEnd()
-        glLineWidth(1.5); glColor3fv(COLOR_WOOD_FLOOR_SEAM); glBegin(GL_LINES)
-        glVertex3f(x0,y_line,z_min); glVertex3f(x0,y_line,z_max); glEnd()
-    glLineWidth(1.5); glColor3fv(COLOR_WOOD_FLOOR_SEAM); glBegin(GL_LINES)
-    glVertex3f(x_max,y_line,z_min); glVertex3f(x_max,y_line,z_max); glEnd()
-
-def draw_interior(hide_exterior=False):
+    draw_textured_quad(texture_key('wood_floor_texture', n_planks, sx),
+                       ((x_min,cy,z_min), (x_max,cy,z_min), (x_max,cy,z_max), (x_min,cy,z_max)))
+
+@procedural_texture
+def wood_floor_texture(n_planks, size_x):
+    # Mesma variação de tom por tábua do desenho original; juntas nas bordas de cada tábua.
+    # As tábuas correm ao longo de Z: uma linha calculada e repetida
+    width, height = FLOOR_TEXTURE_SIZE
+    image, x, _, px = canvas(width, 1, size_x, size_x/width)
+    real_w = size_x/n_planks
+    i = np.minimum((x // real_w).astype(int), n_planks-1)
+    f = 0.9 + 0.12 * (0.5+0.5*np.sin(i*2.1)*np.cos(i*0.7))
+    image[..., :3] = np.minimum(1.0, np.asarray(COLOR_WOOD_FLOOR_BASE) * f[..., None])
+    seam = np.abs(x - np.round(x/real_w)*real_w)
+    paint(image, COLOR_WOOD_FLOOR_SEAM, coverage(seam - FLOOR_SEAM_WIDTH/2, px))
+    return np.repeat(to_bytes(image), height, axis=0)
+
+def draw_interior():
     draw_cube((-10.25,4.75,0), (0.5,9.5,8), COLOR_INTERIOR_WALL)
     draw_cube((10.25,4.75,0), (0.5,9.5,8), COLOR_INTERIOR_WALL)
     draw_cube((0,4.75,-4.25), (20.5,9.5,0.5), COLOR_INTERIOR_WALL)
@@ -509,46 +583,341 @@ def draw_interior(hide_exterior=False):
     draw_round_table_with_chairs(center=(-2,0,1.5), table_radius=0.8)
     draw_wall_clock(center=(-9.95,3.2,-0.6), radius=0.5, orientation='x')
     draw_painting(center=(0,2.2,-3.95), width=2.2, height=1.3, orientation='z')
-    if hide_exterior:
+
+def draw_interior_front_wall(door_gap=False):
+    # Face interna da fachada; com door_gap o vão da porta fica livre para ver o exterior
+    if not door_gap:
         draw_cube((0,4.75,3.95), (20,9.5,0.1), COLOR_INTERIOR_WALL)
+        return
+    draw_cube((0,6.15,3.95), (20,6.7,0.1), COLOR_INTERIOR_WALL)
+    draw_cube((-5.55,1.4,3.95), (8.9,2.8,0.1), COLOR_INTERIOR_WALL)
+    draw_cube((5.55,1.4,3.95), (8.9,2.8,0.1), COLOR_INTERIOR_WALL)
+
+# --- CENAS ---
+# Cada chamada mais externa destas funções vira um objeto com caixa própria no culling
+SCENE_OBJECTS = (
+    'draw_ground', 'draw_ramp', 'draw_cube', 'draw_arched_opening', 'draw_balcony', 'draw_ornate_window',
+    'draw_wood_floor', 'draw_interior_front_wall', 'place_bookshelf', 'draw_table', 'draw_chair', 'draw_counter', 'draw_plant',
+    'draw_round_table_with_chairs', 'draw_wall_clock', 'draw_painting',
+    'draw_interactive_double_door', 'draw_door_button',
+)
+# Funções com escopo próprio no profiler (--profile / F3); as demais entram no tempo de quem as chama
+PROFILED_FUNCTIONS = (
+    'draw_ground', 'draw_ramp', 'draw_building_facade', 'draw_interior', 'draw_bookshelf',
+    'draw_round_table_with_chairs', 'draw_wall_clock', 'draw_painting', 'draw_interactive_double_door',
+)
+# Objetos tesselados compilados em LOD_LEVELS níveis; o desenho escolhe um pela distância
+# (relógio e quadro são texturas: os mipmaps fazem esse papel)
+LOD_OBJECTS = ('draw_arched_opening', 'draw_ornate_window', 'draw_round_table_with_chairs')
+
+# Quarteirões do distrito em volta da biblioteca (streaming.py); o chunk (0, 0) é a cena principal
+DISTRICT_RADIUS = 3
+# Posições x dos lotes num quarteirão e chance de um lote ficar vazio (praça)
+DISTRICT_LOTS = (-26.0, 0.0, 26.0)
+DISTRICT_EMPTY_LOT = 0.25
+
+def draw_district_chunk(i, j):
+    # Sorteio fixo por chunk: o mesmo quarteirão toda vez que é recompilado
+    from streaming import CHUNK_SIZE
+    rng = np.random.default_rng([i + 1000, j + 1000])
+    glPushMatrix(); glTranslatef(i*CHUNK_SIZE, 0, j*CHUNK_SIZE)
+    draw_ground()
+    for x in DISTRICT_LOTS:
+        if rng.random() < DISTRICT_EMPTY_LOT: continue
+        # Fileiras alternadas de frente uma para a outra
+        glPushMatrix(); glTranslatef(x, 0, 0); glRotatef(180 if j % 2 else 0, 0, 1, 0)
+        draw_district_building()
+        glPopMatrix()
+    glPopMatrix()
+
+def draw_district_building():
+    # Só o exterior, com a porta fechada: o interior dos vizinhos nunca fica à vista
+    glPushMatrix(); glTranslatef(0,0.5,0)
+    draw_building_facade()
+    draw_interactive_double_door(False)
+    glPopMatrix()
+    draw_ramp()
+
+def draw_exterior_scene():
+    draw_ground()
+    glPushMatrix(); glTranslatef(0,0.5,0)
+    draw_building_facade()
+    glPopMatrix()
+    draw_ramp()
+
+def draw_interior_scene():
+    glPushMatrix(); glTranslatef(0,0.5,0)
+    draw_interior()
+    glPopMatrix()
+
+def draw_interior_wall_scene(door_gap):
+    glPushMatrix(); glTranslatef(0,0.5,0)
+    draw_interior_front_wall(door_gap)
+    glPopMatrix()
+
+def draw_door_scene(is_door_open):
+    glPushMatrix(); glTranslatef(0,0.5,0)
+    draw_interactive_double_door(is_door_open)
+    draw_door_button()
+    glPopMatrix()
+
+# Uma cena por célula (ver CELLS); o interior só aparece de fora pelo portal da porta
+# Variantes gravadas em scene.bake (bake.py): (nome, função, argumentos)
+BAKED_SCENES = (
+    ('exterior', draw_exterior_scene, ()),
+    ('interior', draw_interior_scene, ()),
+    ('interior_wall', draw_interior_wall_scene, (False,)),
+    ('interior_wall', draw_interior_wall_scene, (True,)),
+    ('door', draw_door_scene, (False,)),
+    ('door', draw_door_scene, (True,)),
+)
+
+COMPILE_ARGS = dict(props=PropInstances, objects=SCENE_OBJECTS, lod_objects=LOD_OBJECTS)
+
+# Onde se anda (navigation.py): grade de alturas e navmesh gravadas em scene.bake a partir destas funções
+WALKABLE_SURFACES = ('draw_ground', 'draw_ramp_surface', 'draw_wood_floor')
+
+def draw_walkable_scene():
+    draw_exterior_scene()
+    draw_interior_scene()
+
+SCENE_NAVIGATION = dict(draw=draw_walkable_scene, surfaces=WALKABLE_SURFACES, radius=PLAYER_RADIUS)
+
+# Luz gravada em scene.bake (lighting.py): sol de fim de manhã na fachada; as cenas
+# internas só recebem oclusão ambiente
+SUN_DIRECTION = (0.45, 0.8, 0.55)
+SCENE_LIGHTING = dict(sun_direction=SUN_DIRECTION, sunlit=('exterior', 'door'))
+
+def load_scene(rebuild=False):
+    # Lê scene.bake (refeito automaticamente se os fontes mudaram) e monta o cache de cenas
+    baked = load_or_bake(globals(), BAKED_SCENES, INTERIOR_WALLS, rebuild=rebuild, lighting=SCENE_LIGHTING,
+                         navigation=SCENE_NAVIGATION, **COMPILE_ARGS)
+    return SceneCache(globals(), baked=baked, **COMPILE_ARGS), baked
+
+def prepare_scene(progress, rebuild=False):
+    # Thread de carga da partida: scene.bake (refeito num processo à parte se preciso) e as
+    # imagens das texturas procedurais; nada aqui usa o contexto GL
+    progress(0.0, 'lendo scene.bake')
+    baked = load_or_bake_in_process('centro', rebuild=rebuild, progress=progress)
+    keys = baked.texture_keys()
+    for i, key in enumerate(keys):
+        progress(i / len(keys), f'gerando textura {key[0]}')
+        texture_image(key)
+    return baked
+
+def upload_scene(scene, baked):
+    # VBOs de todas as variantes das cenas e as texturas, antes do primeiro quadro
+    if USE_VBO:
+        for name, draw_fn, args in BAKED_SCENES: scene.prepare(name, draw_fn, *args)
+    for key in baked.texture_keys(): TEXTURES.get(key)
+
+def make_district(radius=DISTRICT_RADIUS):
+    # Chunks carregados até o plano distante da projeção
+    from streaming import ChunkStreamer
+    keys = [(i, j) for i in range(-radius, radius+1) for j in range(-radius, radius+1) if (i, j) != (0, 0)]
+    return ChunkStreamer('centro', 'draw_district_chunk', keys, COMPILE_ARGS, load_radius=Z_FAR)
 
 # --- LÓGICA PRINCIPAL ---
 def is_inside_building(cam_pos):
     x,_,z = cam_pos
     return (-10 < x < 10) and (-4 < z < 4)
 
+def make_interactions(interior, world, door):
+    # interior: malha da cena 'interior' (livros e cadeiras vêm das instâncias, relógio e quadro dos objetos);
+    # door(target): alterna a porta. As paredes do CollisionWorld da câmera bloqueiam a mira
+    from interaction import InteractionRegistry, box_from_bounds
+    registry = InteractionRegistry(blockers=world)
+    registry.add('door', door_leaf_boxes(False), ['abrir a porta'] * 2, door)
+    button = BUTTON_POS + (0, 0.5, 0)
+    registry.add('button', [(button[0]-0.125, button[0]+0.125, button[1]-0.125, button[1]+0.125, button[2]-0.01, button[2]+0.045)],
+                 ['botão da porta'], door)
+    for kind in ('book', 'chair'):
+        bounds = [b.bounds for b in interior.instances if b.name == kind]
+        if not bounds: continue
+        bounds = np.concatenate(bounds)
+        labels = [f'livro: {BOOK_TITLES[i % len(BOOK_TITLES)]}' for i in range(len(bounds))] if kind == 'book' else ['cadeira'] * len(bounds)
+        registry.add(kind, box_from_bounds(bounds), labels)
+    named = {'draw_wall_clock': ('clock', 'relógio'), 'draw_painting': ('painting', 'quadro')}
+    for name, bounds in zip(interior.object_names, interior.object_bounds):
+        if name in named: registry.add(named[name][0], box_from_bounds(bounds), [named[name][1]])
+    registry.actions['clock'] = lambda target: print(time.strftime('São %H:%M.'))
+    return registry
+
+def set_door_interactions(registry, is_open):
+    registry.move(registry.indices('door'), door_leaf_boxes(is_open), ['fechar a porta' if is_open else 'abrir a porta'] * 2)
+
+def make_visitors(count, world, seed=0, ground=None, navmesh=None):
+    # Sem a grade de alturas, o piso do interior fica 0.5 (prédio) + FLOOR_Y acima do chão da física
+    from visitors import Visitors
+    return Visitors(count, VISITOR_WAYPOINTS, world, globals(), seed=seed,
+                    foot_offset=0.0 if ground is not None else 0.5 + FLOOR_Y, ground=ground, navmesh=navmesh)
+
+def setup_gl(width, height):
+    global VIEW_ASPECT, VIEW_HEIGHT, PIPELINE
+    VIEW_ASPECT, VIEW_HEIGHT = width/height, height
+    glEnable(GL_DEPTH_TEST); glEnable(GL_CULL_FACE); glCullFace(GL_BACK)
+    gluPerspective(FOV_Y, VIEW_ASPECT, Z_NEAR, Z_FAR)
+    PIPELINE = None
+    if USE_SHADERS and USE_VBO:
+        try:
+            from shaders import ShaderPipeline
+            PIPELINE = ShaderPipeline()
+        except Exception as e:
+            print(f"Shaders indisponíveis, usando o pipeline fixo: {e}")
+
+def render_frame(scene, camera, eye, is_door_open, visitors=None, district=None, view_height=None):
+    # eye: posição da câmera usada neste quadro (interpolada pela simulação)
+    # view_height: altura em pixels do que é desenhado (a resolução interna com a resolução dinâmica)
+    inside = is_inside_building(eye)
+    if district is not None:
+        with PROFILER.scope('district.update'): district.update(eye)
+    
+    glClearColor(*(COLOR_INTERIOR_WALL if inside else (0.5,0.8,1.0)), 1.0)
+    glClear(GL_COLOR_BUFFER_BIT|GL_DEPTH_BUFFER_BIT)
+    
+    if PIPELINE is not None:
+        from shaders import perspective
+        PIPELINE.begin_frame(perspective(FOV_Y, VIEW_ASPECT, Z_NEAR, Z_FAR) @ camera.view_matrix(eye))
+    else:
+        glPushMatrix(); camera.look(eye)
+    
+    frustum = Frustum.from_camera(eye, camera.front, camera.up, FOV_Y, VIEW_ASPECT, Z_NEAR, Z_FAR, view_height or VIEW_HEIGHT)
+    # A célula vizinha só é desenhada com a porta aberta e o vão dentro do frustum
+    cells = CELLS.visible_cells('interior' if inside else 'exterior', frustum, {'door': is_door_open})
+    RENDER_STATS.cells_drawn += len(cells)
+    see_outside = inside and 'exterior' in cells
+    # Só a porta e a parede interna são recompiladas, e apenas quando mudam de estado
+    if 'exterior' in cells:
+        draw_scene(scene, 'exterior', draw_exterior_scene, frustum=frustum)
+        if district is not None:
+            with PROFILER.scope('district', gpu=True): district.draw(frustum, PIPELINE)
+    if 'interior' in cells: draw_scene(scene, 'interior', draw_interior_scene, frustum=frustum)
+    if inside: draw_scene(scene, 'interior_wall', draw_interior_wall_scene, see_outside, frustum=frustum)
+    draw_scene(scene, 'door', draw_door_scene, is_door_open, frustum=frustum)
+    if len(RENDER_QUEUE):
+        with PROFILER.scope('render_queue.flush', gpu=True): RENDER_QUEUE.flush()
+    if visitors is not None and 'interior' in cells:
+        with PROFILER.scope('visitors', gpu=True): visitors.draw(frustum, PIPELINE)
+    
+    if PIPELINE is not None: PIPELINE.end_frame()
+    else: glPopMatrix()
+
+def draw_scene(scene, name, draw_fn, *args, frustum=None):
+    # Um escopo de perfil por cena, com tempo de GPU
+    with PROFILER.scope('scene.' + name, gpu=True):
+        if USE_VBO: scene.draw(name, draw_fn, *args, frustum=frustum, pipeline=PIPELINE)
+        elif USE_RENDER_QUEUE:
+            with queued(globals(), RENDER_QUEUE): draw_fn(*args)
+        else: draw_fn(*args)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Biblioteca Pública Estadual de Alagoas - Maceió")
+    parser.add_argument('--record-input', metavar='ARQUIVO', help="grava a entrada por passo de simulação em JSON (ver simulation.py)")
+    parser.add_argument('--rebake', action='store_true', help="refaz scene.bake mesmo que esteja atualizado (ver bake.py)")
+    parser.add_argument('--visitors', type=int, default=0, metavar='N', help="número de visitantes simulados no interior")
+    parser.add_argument('--profile', action='store_true', help="liga o profiler desde o início, com o HUD visível (F3 alterna)")
+    parser.add_argument('--profile-trace', metavar='ARQUIVO', help="exporta os escopos do profiler em formato Chrome trace ao sair")
+    parser.add_argument('--district', action='store_true', help="carrega os quarteirões vizinhos em segundo plano (ver streaming.py)")
+    parser.add_argument('--shaders', action='store_true', help="desenha com o pipeline de shaders GLSL 3.30 em vez do pipeline fixo")
+    parser.add_argument('--record-video', action='store_true', help="começa gravando o passeio (F9 alterna; ver capture.py)")
+    parser.add_argument('--capture-format', choices=['png', 'raw'], default='png', help="gravação em PNGs numerados ou vídeo BGRA cru")
+    parser.add_argument('--capture-fps', type=float, help="quadros por segundo da gravação (padrão: capture.CAPTURE_FPS)")
+    parser.add_argument('--dynamic-resolution', action='store_true', help="desenha num framebuffer com resolução e MSAA ajustados ao tempo de quadro (ver resolution.py)")
+    parser.add_argument('--frame-budget', type=float, metavar='MS', help="orçamento de tempo de quadro da resolução dinâmica (padrão: 1000/60)")
+    parser.add_argument('--capture-dir', metavar='PASTA', help="pasta das gravações e screenshots (F12; padrão: captures/)")
+    return parser.parse_args()
+
+def make_capture(width, height, args):
+    # capture.py só é importado quando a gravação ou um screenshot são pedidos
+    from capture import FrameCapture
+    options = dict(out_dir=args.capture_dir, fps=args.capture_fps)
+    return FrameCapture(width, height, fmt=args.capture_format, **{k: v for k, v in options.items() if v is not None})
+
+def make_hud():
+    # O HUD só é importado ao ser mostrado (--profile ou F3)
+    from profiler import Hud
+    return Hud(PROFILER)
+
+def make_prompt():
+    # O rótulo da mira só é importado quando algo entra na mira
+    from interaction import InteractionPrompt
+    return InteractionPrompt()
+
+def make_resolution(width, height, args):
+    # resolution.py só é importado com --dynamic-resolution
+    from resolution import DynamicResolution
+    return DynamicResolution(width, height, **({'budget_ms': args.frame_budget} if args.frame_budget else {}))
+
 def main():
+    global USE_SHADERS
+    args = parse_args()
+    STARTUP.mark('imports')
+    USE_SHADERS = USE_SHADERS or args.shaders
+    # scene.bake e as texturas ficam prontos numa thread enquanto a janela e o contexto GL sobem
+    loader = BackgroundTask(prepare_scene, args.rebake)
     pygame.init()
    
 
    
-    pygame.display.gl_set_attribute(pygame.GL_MULTISAMPLEBUFFERS, 1)
-    pygame.display.gl_set_attribute(pygame.GL_MULTISAMPLESAMPLES, 4)
+    # Com resolução dinâmica o MSAA fica no framebuffer interno: a janela recebe a imagem por glBlitFramebuffer
+    if not args.dynamic_resolution:
+        pygame.display.gl_set_attribute(pygame.GL_MULTISAMPLEBUFFERS, 1)
+        pygame.display.gl_set_attribute(pygame.GL_MULTISAMPLESAMPLES, 4)
     
    
-    screen = pygame.display.set_mode((0, 0), DOUBLEBUF|OPENGL|FULLSCREEN)
+    screen = pygame.display.set_mode((0, 0), pygame.DOUBLEBUF|pygame.OPENGL|pygame.FULLSCREEN)
    
     pygame.display.set_caption("Biblioteca Pública Estadual de Alagoas - Maceió")
-    
+    STARTUP.mark('janela')
    
     glEnable(GL_MULTISAMPLE)
    
-    glEnable(GL_DEPTH_TEST); glEnable(GL_CULL_FACE); glCullFace(GL_BACK)
-    
-  
     width, height = screen.get_size()
-    gluPerspective(45, (width/height), 0.1, 100.0)
-  
+    setup_gl(width, height)
+    resolution = make_resolution(width, height, args) if args.dynamic_resolution else None
+    STARTUP.mark('contexto GL')
     
-    camera = Camera(position=[0,1.8,15], yaw=-90) 
+    baked = wait_with_loading_screen(loader, width, height)
+    if baked is None:
+        # Janela fechada durante a carga: interrompe um bake em andamento
+        for child in multiprocessing.active_children(): child.terminate()
+        pygame.quit()
+        return
+    STARTUP.mark('cena carregada')
+    scene = SceneCache(globals(), baked=baked, **COMPILE_ARGS)
+    upload_scene(scene, baked)
+    STARTUP.mark('envio à GPU')
+    camera = Camera(position=[0,1.8,15], yaw=-90, world=CollisionWorld(baked.colliders), ground=baked.ground)
+    recorder = InputRecorder(camera) if args.record_input else None
+    visitors = make_visitors(args.visitors, camera.world, ground=baked.ground, navmesh=baked.navmesh) if args.visitors else None
+    district = make_district() if args.district and USE_VBO else None
+    hud = None
+    capture = make_capture(width, height, args) if args.record_video else None
+    if capture is not None: capture.start()
+    if args.profile or args.profile_trace:
+        PROFILER.enable(trace=bool(args.profile_trace))
+        if args.profile:
+            hud = make_hud(); hud.visible = True
+    PROFILER.instrument(globals(), PROFILED_FUNCTIONS)
+    if not USE_VBO: count_immediate_calls(globals())
+    sim = FixedStepSimulation(camera, recorder=recorder, visitors=visitors)
     is_door_open = False
+    def toggle_door(target=None):
+        nonlocal is_door_open
+        is_door_open = not is_door_open
+        set_door_interactions(interactions, is_door_open)
+    interactions = make_interactions(scene.get('interior', draw_interior_scene).mesh, camera.world, toggle_door)
+    prompt, target = None, None
     pygame.mouse.set_visible(False); pygame.event.set_grab(True)
     clock = pygame.time.Clock()
     running = True
-    print("\n--- CONTROLES ---\nW,A,S,D: Mover\nMouse: Olhar\nEspaço: Pular\nF: Abrir/Fechar Porta (Geral)\nE: Interagir com Botão (Perto)\nESC: Sair\n-----------------")
+    first_frame_shown = False
+    last_time = time.perf_counter()
+    print("\n--- CONTROLES ---\nW,A,S,D: Mover\nMouse: Olhar\nEspaço: Pular\nF: Abrir/Fechar Porta (Geral)\nE: Interagir (porta, botão, livros, relógio...)\nF3: Perfil (HUD)\nF9: Gravar passeio\nF12: Screenshot\nESC: Sair\n-----------------")
     
     
     while running:
+        frame_start = time.perf_counter()
         keys = pygame.key.get_pressed()
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
@@ -557,43 +926,60 @@ def main():
                 if event.key == pygame.K_ESCAPE:
                     running = False
                 if event.key == pygame.K_f:
-                    is_door_open = not is_door_open
+                    toggle_door()
+                if event.key == pygame.K_F3:
+                    if hud is None: hud = make_hud()
+                    hud.toggle()
+                if event.key in (pygame.K_F9, pygame.K_F12) and capture is None:
+                    capture = make_capture(width, height, args)
+                if event.key == pygame.K_F9:
+                    capture.toggle()
+                if event.key == pygame.K_F12:
+                    capture.screenshot()
                 if event.key == pygame.K_e:
-                    button_world_pos = BUTTON_POS + np.array([0, 0.5, 0])
-                    distance = np.linalg.norm(camera.position - button_world_pos)
-                    if distance < BUTTON_INTERACTION_RADIUS:
-                        is_door_open = not is_door_open
+                    interactions.interact(target)
 
         mouse_rel = pygame.mouse.get_rel()
-        camera.process_mouse(mouse_rel[0], mouse_rel[1]); camera.update(keys)
-        inside = is_inside_building(camera.position)
-        
-        glClearColor(*(COLOR_INTERIOR_WALL if inside else (0.5,0.8,1.0)), 1.0)
-        glClear(GL_COLOR_BUFFER_BIT|GL_DEPTH_BUFFER_BIT)
-        
-        glPushMatrix(); camera.look()
-        
-        if not inside:
-            draw_ground()
-            glPushMatrix(); glTranslatef(0,0.5,0)
-            draw_building_facade()
-            draw_interior(hide_exterior=False)
-            glPopMatrix()
-            draw_ramp()
-        else:
-            glPushMatrix(); glTranslatef(0,0.5,0)
-            draw_interior(hide_exterior=True)
-            glPopMatrix()
-        
-        glPushMatrix(); glTranslatef(0,0.5,0)
-        draw_interactive_double_door(is_door_open)
-        draw_door_button()
-        glPopMatrix()
-        
-        glPopMatrix()
-        pygame.display.flip()
-        clock.tick(60)
+        camera.process_mouse(mouse_rel[0], mouse_rel[1])
+        now = time.perf_counter()
+        RENDER_STATS.reset()
+        with PROFILER.scope('simulation'):
+            sim.advance(now - last_time, keys); last_time = now
+        eye = sim.render_position()
+        # A mira é resolvida uma vez por quadro; E age sobre o alvo do último quadro
+        with PROFILER.scope('interaction'):
+            target = interactions.pick(eye, camera.front)
+        if resolution is not None: resolution.begin_frame()
+        with PROFILER.scope('render'):
+            render_frame(scene, camera, eye, is_door_open, visitors, district,
+                         resolution.size[1] if resolution is not None else None)
+        if resolution is not None:
+            with PROFILER.scope('upscale', gpu=True): resolution.end_frame()
+        # Antes do HUD: a gravação mostra só a cena
+        if capture is not None:
+            with PROFILER.scope('capture'): capture.grab(now)
+        if target is not None and prompt is None: prompt = make_prompt()
+        if prompt is not None: prompt.draw(target, width, height)
+        if hud is not None: hud.draw(width, height)
+        work_ms = (time.perf_counter() - frame_start) * 1000
+        with PROFILER.scope('flip'):
+            pygame.display.flip()
+        PROFILER.end_frame()
+        if resolution is not None:
+            decision = resolution.record(work_ms)
+            if decision: print(f"Resolução: {decision['to']} a {decision['fps']} fps (p90 {decision['p90_ms']:.1f} ms)")
+        if not first_frame_shown:
+            STARTUP.mark('primeiro quadro')
+            print(STARTUP.report())
+            first_frame_shown = True
+        clock.tick(resolution.fps if resolution is not None else 60)
         
+    if capture is not None: capture.close()
+    if resolution is not None: resolution.delete()
+    scene.clear()
+    if district is not None: district.close()
+    if args.profile_trace: PROFILER.export_chrome_trace(args.profile_trace)
+    if recorder is not None: recorder.save(args.record_input)
     pygame.quit()
 
 if __name__ == "__main__":
@@ -0,0 +1,143 @@
+import math
+import numpy as np
+
+#  MUNDO DE COLISÃO
+# AABBs empacotadas em um array NumPy (x_min, x_max, y_min, y_max, z_min, z_max),
+# mesmo layout de INTERIOR_WALLS, indexadas por uma grade uniforme no plano XZ.
+# As consultas esfera-vs-AABB são feitas em lote: várias esferas por chamada.
+# Mundos pequenos (as paredes da biblioteca) são testados direto, sem a grade,
+# e uma esfera sozinha acha suas poucas células com inteiros do Python: a
+# grade vetorizada só compensa com muitas caixas e muitas esferas.
+
+GRID_OFFSET = 1 << 20
+# Caixas que cobrem mais células que isso ficam fora da grade e são sempre testadas
+MAX_CELLS_PER_BOX = 4096
+# Até tantos pares (esfera, caixa) o teste é direto contra todas as caixas
+DIRECT_PAIRS = 256
+# Com até tantas caixas, query_sphere (uma esfera) é um laço em floats do Python
+LOOP_BOXES = 16
+
+
+def cell_keys(ix, iz):
+    return ((ix + GRID_OFFSET).astype(np.int64) << 32) | (iz + GRID_OFFSET).astype(np.int64)
+
+
+class CollisionWorld:
+    def __init__(self, boxes=(), cell_size=2.0):
+        self.cell_size = float(cell_size)
+        self.boxes = np.asarray(boxes, dtype=float).reshape(-1, 6)
+        self.build()
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def add(self, boxes):
+        first = len(self.boxes)
+        self.boxes = np.concatenate([self.boxes, np.asarray(boxes, dtype=float).reshape(-1, 6)])
+        self.build()
+        return np.arange(first, len(self.boxes))
+
+    def remove(self, indices):
+        keep = np.ones(len(self.boxes), dtype=bool)
+        keep[np.asarray(indices, dtype=int)] = False
+        self.boxes = self.boxes[keep]
+        self.build()
+
+    def cell_range(self, lo_x, hi_x, lo_z, hi_z):
+        cs = self.cell_size
+        return (np.floor(lo_x / cs).astype(np.int64), np.floor(hi_x / cs).astype(np.int64),
+                np.floor(lo_z / cs).astype(np.int64), np.floor(hi_z / cs).astype(np.int64))
+
+    def build(self):
+        # Grade em formato CSR: chaves de célula ordenadas -> fatia de índices de caixas
+        b = self.boxes
+        self.lo, self.hi = b[:, [0, 2, 4]], b[:, [1, 3, 5]]
+        self.rows = b.tolist() if len(b) <= LOOP_BOXES else None
+        ix0, ix1, iz0, iz1 = self.cell_range(b[:, 0], b[:, 1], b[:, 4], b[:, 5])
+        nx, nz = ix1 - ix0 + 1, iz1 - iz0 + 1
+        ncells = nx * nz
+        large = ncells > MAX_CELLS_PER_BOX
+        self.large = np.nonzero(large)[0]
+        ncells = np.where(large, 0, ncells)
+        box_idx = np.repeat(np.arange(len(b)), ncells)
+        local = np.arange(ncells.sum()) - np.repeat(np.cumsum(ncells) - ncells, ncells)
+        keys = cell_keys(ix0[box_idx] + local % nx[box_idx], iz0[box_idx] + local // nx[box_idx])
+        order = np.argsort(keys, kind='stable')
+        keys, self.cell_items = keys[order], box_idx[order]
+        self.cell_keys, self.cell_starts = np.unique(keys, return_index=True)
+        self.cell_ends = np.append(self.cell_starts[1:], len(keys))
+
+    def candidates(self, centers, radii):
+        # Pares (esfera, caixa) vindos das células tocadas por cada esfera
+        n = len(centers)
+        if n * len(self.boxes) <= DIRECT_PAIRS:
+            return np.repeat(np.arange(n), len(self.boxes)), np.tile(np.arange(len(self.boxes)), n)
+        if n == 1:
+            boxes = self.sphere_candidates(centers[0], float(radii[0]))
+            return np.zeros(len(boxes), dtype=np.int64), boxes
+        ix0, ix1, iz0, iz1 = self.cell_range(centers[:, 0] - radii, centers[:, 0] + radii,
+                                             centers[:, 2] - radii, centers[:, 2] + radii)
+        sphere_parts, box_parts = [], []
+        if len(self.cell_keys):
+            # Todas as combinações (esfera, célula) de uma vez
+            span_x, span_z = int((ix1 - ix0).max()) + 1, int((iz1 - iz0).max()) + 1
+            dx, dz = np.divmod(np.arange(span_x * span_z), span_z)
+            cx, cz = ix0[:, None] + dx, iz0[:, None] + dz
+            valid = (cx <= ix1[:, None]) & (cz <= iz1[:, None])
+            sphere = np.nonzero(valid)[0]
+            keys = cell_keys(cx[valid], cz[valid])
+            slot = np.minimum(np.searchsorted(self.cell_keys, keys), len(self.cell_keys) - 1)
+            hit = self.cell_keys[slot] == keys
+            sphere, slot = sphere[hit], slot[hit]
+            counts = self.cell_ends[slot] - self.cell_starts[slot]
+            offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            sphere_parts.append(np.repeat(sphere, counts))
+            box_parts.append(self.cell_items[np.repeat(self.cell_starts[slot], counts) + offsets])
+        if len(self.large):
+            n = len(centers)
+            sphere_parts.append(np.repeat(np.arange(n), len(self.large)))
+            box_parts.append(np.tile(self.large, n))
+        if not sphere_parts:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty
+        return np.concatenate(sphere_parts), np.concatenate(box_parts)
+
+    def sphere_candidates(self, center, radius):
+        # Caixas das células tocadas por uma esfera, sem montar os pares em lote
+        cs = self.cell_size
+        x0, x1 = math.floor((center[0] - radius) / cs), math.floor((center[0] + radius) / cs)
+        z0, z1 = math.floor((center[2] - radius) / cs), math.floor((center[2] + radius) / cs)
+        parts = [self.large]
+        if len(self.cell_keys):
+            keys = [((ix + GRID_OFFSET) << 32) | (iz + GRID_OFFSET) for ix in range(x0, x1 + 1) for iz in range(z0, z1 + 1)]
+            slots = np.searchsorted(self.cell_keys, keys)
+            parts += [self.cell_items[self.cell_starts[i]:self.cell_ends[i]]
+                      for i, key in zip(slots.tolist(), keys) if i < len(self.cell_keys) and self.cell_keys[i] == key]
+        return np.concatenate(parts) if len(parts) > 1 else parts[0]
+
+    def query_spheres(self, centers, radii):
+        # Para cada esfera: True se ela penetra alguma AABB
+        centers = np.asarray(centers, dtype=float).reshape(-1, 3)
+        radii = np.broadcast_to(np.asarray(radii, dtype=float), (len(centers),))
+        hits = np.zeros(len(centers), dtype=bool)
+        if len(self.boxes) == 0 or len(centers) == 0: return hits
+        if len(centers) * len(self.boxes) <= DIRECT_PAIRS:
+            c = centers[:, None]
+            d2 = ((c - np.clip(c, self.lo, self.hi))**2).sum(axis=2)
+            return (d2 < radii[:, None]**2).any(axis=1)
+        si, bi = self.candidates(centers, radii)
+        if len(si) == 0: return hits
+        c, b = centers[si], self.boxes[bi]
+        closest = np.clip(c, b[:, [0, 2, 4]], b[:, [1, 3, 5]])
+        d2 = ((c - closest)**2).sum(axis=1)
+        hits[si[d2 < radii[si]**2]] = True
+        return hits
+
+    def query_sphere(self, center, radius):
+        if self.rows is None: return bool(self.query_spheres(center, radius)[0])
+        x, y, z = (float(v) for v in center)
+        r2 = float(radius)**2
+        for x0, x1, y0, y1, z0, z1 in self.rows:
+            dx, dy, dz = x - max(x0, min(x, x1)), y - max(y0, min(y, y1)), z - max(z0, min(z, z1))
+            if dx*dx + dy*dy + dz*dz < r2: return True
+        return False
@@ -0,0 +1,60 @@
+import math
+import numpy as np
+
+#  CULLING POR FRUSTUM
+# Frustum montado a partir de Camera.position/front/up e dos parâmetros de
+# gluPerspective. As caixas (AABB) dos objetos compilados são testadas contra
+# os 6 planos de uma vez; só os objetos visíveis são enviados à GPU.
+
+
+def normalize(v):
+    n = np.linalg.norm(v)
+    return v / n if n > 0 else v
+
+
+class Frustum:
+    def __init__(self, normals, offsets, eye=None, tan_half_fov=None, view_height=None):
+        # Plano i: normals[i] . p + offsets[i] >= 0 para pontos dentro
+        self.normals = np.asarray(normals, dtype=float)
+        self.offsets = np.asarray(offsets, dtype=float)
+        # Ponto de vista, abertura vertical e altura do viewport (pixels), para o tamanho projetado do LOD (lod.py)
+        self.eye, self.tan_half_fov, self.view_height = eye, tan_half_fov, view_height
+
+    @classmethod
+    def from_camera(cls, eye, front, up, fov_y, aspect, near, far, view_height=None):
+        eye, front = np.asarray(eye, dtype=float), normalize(np.asarray(front, dtype=float))
+        right = normalize(np.cross(front, up))
+        up = np.cross(right, front)
+        hv = math.tan(math.radians(fov_y) / 2.0)
+        hh = hv * aspect
+        # Direções das quatro arestas laterais do frustum
+        tl, tr = front + up*hv - right*hh, front + up*hv + right*hh
+        bl, br = front - up*hv - right*hh, front - up*hv + right*hh
+        normals = [front, -front]
+        for a, b in ((bl, tl), (tl, tr), (tr, br), (br, bl)):
+            n = normalize(np.cross(a, b))
+            if np.dot(n, front) < 0: n = -n
+            normals.append(n)
+        offsets = [-np.dot(front, eye + front*near), np.dot(front, eye + front*far)]
+        offsets += [-np.dot(n, eye) for n in normals[2:]]
+        return cls(normals, offsets, eye, hv, view_height)
+
+    def test_boxes(self, bounds):
+        # bounds: (N, 6) = (x_min, y_min, z_min, x_max, y_max, z_max); True = visível
+        bounds = np.asarray(bounds, dtype=float).reshape(-1, 6)
+        lo, hi = bounds[:, :3], bounds[:, 3:]
+        visible = np.ones(len(bounds), dtype=bool)
+        for n, d in zip(self.normals, self.offsets):
+            # Vértice da caixa mais à frente na direção da normal
+            p = np.where(n >= 0, hi, lo)
+            visible &= p @ n + d >= 0
+        return visible
+
+    def classify_boxes(self, bounds):
+        # (visível, inteira dentro) de cada caixa, com os 6 planos de uma vez: distância do centro
+        # a cada plano e o alcance da meia caixa na direção da normal
+        bounds = np.asarray(bounds, dtype=float).reshape(-1, 6)
+        center, half = (bounds[:, :3] + bounds[:, 3:]) / 2.0, (bounds[:, 3:] - bounds[:, :3]) / 2.0
+        dist = center @ self.normals.T + self.offsets
+        reach = half @ np.abs(self.normals).T
+        return (dist + reach >= 0).all(axis=1), (dist - reach >= 0).all(axis=1)
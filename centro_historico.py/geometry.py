@@ -0,0 +1,662 @@
+from OpenGL.GL import *
+from OpenGL.GLU import *
+import numpy as np
+import math
+import ctypes
+from contextlib import contextmanager
+from lod import (LOD_LEVELS, LOD_THRESHOLDS, LOD_HIDE_BELOW, LOD_HYSTERESIS, projected_sizes, projected_size_range,
+                 select_levels)
+from textures import TEXTURE_FLOATS, TEXTURE_STRIDE, TEXTURES, QUAD_UVS, begin_textured, end_textured
+
+#  COMPILADOR DE GEOMETRIA
+# Executa as funções draw_* uma única vez, capturando as chamadas de modo
+# imediato (glBegin/glVertex/glColor e a pilha de matrizes), e gera arrays
+# NumPy intercalados (x, y, z, r, g, b) que vão para a GPU como VBO. Quads
+# texturizados (textures.py) vão num segundo VBO (x, y, z, u, v), um lote por textura.
+
+VERTEX_FLOATS = 6
+VERTEX_STRIDE = VERTEX_FLOATS * 4
+
+# Chamadas GL substituídas pelo gravador durante a compilação
+RECORDED_CALLS = (
+    'glBegin', 'glEnd', 'glVertex3f', 'glVertex3fv', 'glColor3f', 'glColor3fv',
+    'glPushMatrix', 'glPopMatrix', 'glTranslatef', 'glRotatef', 'glScalef', 'glLoadIdentity',
+    'glEnable', 'glDisable', 'glPushAttrib', 'glPopAttrib', 'glPolygonOffset',
+    'glLineWidth', 'glPointSize',
+    'gluNewQuadric', 'gluDeleteQuadric', 'gluCylinder', 'gluDisk',
+    'draw_primitive', 'draw_textured_quad',
+)
+
+
+def translation_matrix(x, y, z):
+    m = np.identity(4)
+    m[:3, 3] = (x, y, z)
+    return m
+
+
+def rotation_matrix(angle_deg, x, y, z):
+    axis = np.array([x, y, z], dtype=float)
+    n = np.linalg.norm(axis)
+    if n == 0: return np.identity(4)
+    x, y, z = axis / n
+    a = math.radians(angle_deg)
+    c, s, t = math.cos(a), math.sin(a), 1 - math.cos(a)
+    m = np.identity(4)
+    m[:3, :3] = [[t*x*x + c,   t*x*y - s*z, t*x*z + s*y],
+                 [t*x*y + s*z, t*y*y + c,   t*y*z - s*x],
+                 [t*x*z - s*y, t*y*z + s*x, t*z*z + c]]
+    return m
+
+
+def scale_matrix(x, y, z):
+    return np.diag([x, y, z, 1.0])
+
+
+class RenderStats:
+    # Contadores do quadro atual (zerados pelo chamador a cada quadro)
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.draw_calls, self.vertices = 0, 0
+        self.objects_drawn, self.objects_culled = 0, 0
+        self.instances_drawn, self.instances_culled = 0, 0
+        self.cells_drawn, self.chunks_drawn = 0, 0
+        # Objetos com LOD desenhados em cada nível; props pequenos escondidos pela distância
+        self.lod_counts = np.zeros(LOD_LEVELS, dtype=int)
+        self.instances_hidden = 0
+        # Fila do modo imediato (render_queue.py): estado e cores pedidos pelas draw_* e enviados ao GL
+        self.state_requested, self.state_issued = 0, 0
+        self.colors_requested, self.colors_issued = 0, 0
+
+
+RENDER_STATS = RenderStats()
+
+
+# Chave de estado de um lote: (primitiva, cull ligado, polygon offset, largura/tamanho)
+def batch_key(prim, cull, offset, size):
+    return (prim, cull, offset, size)
+
+
+class Batch:
+    def __init__(self, key, first, count):
+        self.key, self.first, self.count = key, first, count
+        # Faixas contíguas por objeto dentro do lote (para o culling)
+        self.object_ids = np.zeros(0, dtype=np.int32)
+        self.firsts = np.zeros(0, dtype=np.int32)
+        self.counts = np.zeros(0, dtype=np.int32)
+
+
+class Mesh:
+    def __init__(self, vertices, batches, instances=(), object_names=(), object_bounds=None,
+                 object_lods=None, object_groups=None, group_bounds=None, textured_vertices=None, textured=(),
+                 indices=None, solids=None, solid_objects=None):
+        self.vertices = vertices
+        self.batches = batches
+        # Com índices (optimize.py), first/count/firsts/counts de lotes e instâncias contam índices, não vértices
+        self.indices = indices
+        # Caixas fechadas alinhadas aos eixos (x_min, y_min, z_min, x_max, y_max, z_max) e seus objetos:
+        # os draw_cube reconhecidos na gravação, usados pela remoção de faces escondidas
+        self.solids = solids if solids is not None else np.zeros((0, 6), dtype=np.float32)
+        self.solid_objects = solid_objects if solid_objects is not None else np.zeros(0, dtype=np.int32)
+        # Quads texturizados: (K, 5) vértices e um lote por textura (Batch com a chave da textura)
+        self.textured_vertices = textured_vertices if textured_vertices is not None else np.zeros((0, TEXTURE_FLOATS), dtype=np.float32)
+        self.textured = list(textured)
+        # Lotes de props instanciados (ver instancing.py), um por tipo de prop
+        self.instances = list(instances)
+        # Caixas dos objetos: (M, 6) = (x_min, y_min, z_min, x_max, y_max, z_max)
+        self.object_names = list(object_names)
+        self.object_bounds = object_bounds if object_bounds is not None else np.zeros((0, 6), dtype=np.float32)
+        # Nível de detalhe de cada objeto (-1 = sem LOD) e o grupo de níveis a que pertence
+        n = len(self.object_names)
+        self.object_lods = object_lods if object_lods is not None else np.full(n, -1, dtype=np.int8)
+        self.object_groups = object_groups if object_groups is not None else np.full(n, -1, dtype=np.int32)
+        self.group_bounds = group_bounds if group_bounds is not None else np.zeros((0, 6), dtype=np.float32)
+
+    @property
+    def vertex_count(self):
+        return len(self.vertices)
+
+
+class GeometryRecorder:
+    def __init__(self):
+        self.matrix = np.identity(4)
+        self.matrix_stack = []
+        self.color = (1.0, 1.0, 1.0)
+        self.cull = True
+        self.offset = None
+        self.polygon_offset = (0.0, 0.0)
+        self.line_width, self.point_size = 1.0, 1.0
+        self.attrib_stack = []
+        self.mode, self.current = None, []
+        self.chunks = {}
+        self.textured = {}
+        # (objeto, caixa no mundo) de cada glBegin(GL_QUADS) que forma uma caixa fechada alinhada aos eixos
+        self.solids = []
+        # Funções draw_* substituídas durante a captura (ex.: props instanciados)
+        self.props = None
+        self.overrides = {}
+        self.object_functions = ()
+        # Objetos da cena: a chamada mais externa de uma função listada vira um objeto
+        self.object_names = []
+        self.object_id, self.object_depth = -1, 0
+        self.static_id = None
+        # Funções com LOD: a chamada mais externa é gravada uma vez por nível (ver lod.py)
+        self.namespace = None
+        self.lod_functions, self.lod_level = (), 0
+        self.object_lods, self.object_groups = [], []
+        self.group_count = 0
+
+    #  MATRIZES
+    def glPushMatrix(self): self.matrix_stack.append(self.matrix.copy())
+    def glPopMatrix(self): self.matrix = self.matrix_stack.pop()
+    def glLoadIdentity(self): self.matrix = np.identity(4)
+    def glTranslatef(self, x, y, z): self.matrix = self.matrix @ translation_matrix(x, y, z)
+    def glRotatef(self, angle, x, y, z): self.matrix = self.matrix @ rotation_matrix(angle, x, y, z)
+    def glScalef(self, x, y, z): self.matrix = self.matrix @ scale_matrix(x, y, z)
+
+    #  ESTADO
+    def glEnable(self, cap):
+        if cap == GL_CULL_FACE: self.cull = True
+        elif cap == GL_POLYGON_OFFSET_FILL: self.offset = self.polygon_offset
+
+    def glDisable(self, cap):
+        if cap == GL_CULL_FACE: self.cull = False
+        elif cap == GL_POLYGON_OFFSET_FILL: self.offset = None
+
+    def glPolygonOffset(self, factor, units):
+        self.polygon_offset = (factor, units)
+        if self.offset is not None: self.offset = self.polygon_offset
+
+    def glPushAttrib(self, mask): self.attrib_stack.append((self.cull, self.offset, self.line_width, self.point_size))
+    def glPopAttrib(self): self.cull, self.offset, self.line_width, self.point_size = self.attrib_stack.pop()
+    def glLineWidth(self, w): self.line_width = float(w)
+    def glPointSize(self, s): self.point_size = float(s)
+
+    #  VÉRTICES
+    def glColor3f(self, r, g, b): self.color = (r, g, b)
+    def glColor3fv(self, c): self.color = tuple(c[:3])
+
+    def glBegin(self, mode):
+        self.mode, self.current = mode, []
+
+    def glVertex3f(self, x, y, z): self.current.append((x, y, z) + self.color)
+    def glVertex3fv(self, v): self.current.append(tuple(v[:3]) + self.color)
+
+    def glEnd(self):
+        verts, mode = self.current, self.mode
+        self.mode, self.current = None, []
+        if not verts: return
+        local = np.array(verts, dtype=float)
+        self.emit_primitive(mode, local)
+        if mode == GL_QUADS and len(local) == 24: self.record_solid(local)
+
+    def record_solid(self, local):
+        # As 6 faces de draw_cube: só vira sólido se, no mundo, os 24 cantos caem nos 8 da caixa
+        world = local[:, :3] @ self.matrix[:3, :3].T + self.matrix[:3, 3]
+        lo, hi = world.min(axis=0), world.max(axis=0)
+        tol = 1e-6 * max(1.0, float(np.abs(world).max()))
+        on_box = (np.abs(world - lo) <= tol) | (np.abs(world - hi) <= tol)
+        if on_box.all() and (hi - lo > tol).all():
+            self.solids.append((self.current_object(), np.concatenate([lo, hi])))
+
+    def draw_primitive(self, mode, positions):
+        # Malha do cache de primitives.py: o array inteiro de uma vez, com a cor atual
+        local = np.empty((len(positions), VERTEX_FLOATS))
+        local[:, :3] = positions
+        local[:, 3:] = self.color
+        self.emit_primitive(mode, local)
+
+    def draw_textured_quad(self, key, corners):
+        # Dois triângulos no espaço do mundo, com (u, v) em vez de cor
+        local = np.asarray(corners, dtype=float)[[0, 1, 2, 0, 2, 3]]
+        world = np.empty((6, TEXTURE_FLOATS))
+        world[:, :3] = local @ self.matrix[:3, :3].T + self.matrix[:3, 3]
+        world[:, 3:] = np.asarray(QUAD_UVS)[[0, 1, 2, 0, 2, 3]]
+        self.textured.setdefault(key, []).append((self.current_object(), world))
+
+    def emit_primitive(self, mode, local):
+        idx = primitive_indices(mode, len(local))
+        if idx is None or len(idx) == 0: return
+        prim = GL_TRIANGLES if mode in (GL_TRIANGLES, GL_QUADS, GL_TRIANGLE_FAN, GL_TRIANGLE_STRIP, GL_QUAD_STRIP, GL_POLYGON) else mode
+        self.emit(prim, local[idx])
+
+    def emit(self, prim, local):
+        # local: (N, 6) posição no espaço do objeto + cor
+        world = local.copy()
+        world[:, :3] = local[:, :3] @ self.matrix[:3, :3].T + self.matrix[:3, 3]
+        if prim == GL_TRIANGLES: key = batch_key(prim, self.cull, self.offset, 0.0)
+        elif prim == GL_LINES: key = batch_key(prim, True, None, self.line_width)
+        else: key = batch_key(prim, True, None, self.point_size)
+        self.chunks.setdefault(key, []).append((self.current_object(), world))
+
+    #  OBJETOS
+    def current_object(self):
+        # Vértices fora de qualquer objeto listado ficam num objeto 'static' único
+        if self.object_id >= 0: return self.object_id
+        if self.static_id is None:
+            self.static_id = len(self.object_names)
+            self.object_names.append('static')
+            self.object_lods.append(-1); self.object_groups.append(-1)
+        return self.static_id
+
+    def begin_object(self, name, level=-1, group=-1):
+        if self.object_depth == 0:
+            self.object_id = len(self.object_names)
+            self.object_names.append(name)
+            self.object_lods.append(level); self.object_groups.append(group)
+        self.object_depth += 1
+
+    def end_object(self):
+        self.object_depth -= 1
+        if self.object_depth == 0: self.object_id = -1
+
+    def object_function(self, name, fn):
+        def wrapped(*args, **kwargs):
+            if name in self.lod_functions and self.object_depth == 0:
+                return self.record_lods(name, fn, args, kwargs)
+            self.begin_object(name)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.end_object()
+        return wrapped
+
+    def record_lods(self, name, fn, args, kwargs):
+        # Um objeto por nível, todos no mesmo grupo; as funções de desenho leem LOD_LEVEL
+        group = self.group_count
+        self.group_count += 1
+        saved = self.namespace.get('LOD_LEVEL', 0)
+        try:
+            for level in range(LOD_LEVELS):
+                self.lod_level = self.namespace['LOD_LEVEL'] = level
+                self.begin_object(name, level, group)
+                try:
+                    fn(*args, **kwargs)
+                finally:
+                    self.end_object()
+        finally:
+            self.lod_level, self.namespace['LOD_LEVEL'] = 0, saved
+
+    #  QUÁDRICAS (mesma tesselação do GLU: eixo +Z, base em z=0)
+    def gluNewQuadric(self): return object()
+    def gluDeleteQuadric(self, quadric): pass
+
+    def gluCylinder(self, quadric, base, top, height, slices, stacks):
+        a = np.linspace(0.0, 2.0*math.pi, slices + 1)
+        co, si = np.cos(a), np.sin(a)
+        verts = []
+        for j in range(stacks):
+            z0, z1 = height*j/stacks, height*(j+1)/stacks
+            r0 = base + (top - base)*j/stacks
+            r1 = base + (top - base)*(j+1)/stacks
+            for i in range(slices):
+                p00 = (r0*co[i], r0*si[i], z0); p10 = (r0*co[i+1], r0*si[i+1], z0)
+                p01 = (r1*co[i], r1*si[i], z1); p11 = (r1*co[i+1], r1*si[i+1], z1)
+                verts += [p00, p10, p11, p00, p11, p01]
+        self.emit_triangles(verts)
+
+    def gluDisk(self, quadric, inner, outer, slices, loops):
+        a = np.linspace(0.0, 2.0*math.pi, slices + 1)
+        co, si = np.cos(a), np.sin(a)
+        verts = []
+        for j in range(loops):
+            r0 = inner + (outer - inner)*j/loops
+            r1 = inner + (outer - inner)*(j+1)/loops
+            for i in range(slices):
+                p00 = (r0*co[i], r0*si[i], 0.0); p10 = (r0*co[i+1], r0*si[i+1], 0.0)
+                p01 = (r1*co[i], r1*si[i], 0.0); p11 = (r1*co[i+1], r1*si[i+1], 0.0)
+                if r0 == 0: verts += [p00, p01, p11]
+                else: verts += [p00, p01, p11, p00, p11, p10]
+        self.emit_triangles(verts)
+
+    def emit_triangles(self, positions):
+        local = np.empty((len(positions), VERTEX_FLOATS))
+        local[:, :3] = positions
+        local[:, 3:] = self.color
+        self.emit(GL_TRIANGLES, local)
+
+    #  RESULTADO
+    def build_batches(self, chunks_by_key, keys, lo, hi):
+        parts, batches, first = [], [], 0
+        for key in keys:
+            # Agrupa os vértices do lote por objeto (ordem estável)
+            chunks = sorted(chunks_by_key[key], key=lambda c: c[0])
+            data = np.concatenate([w for _, w in chunks])
+            ids = np.concatenate([np.full(len(w), oid) for oid, w in chunks])
+            batch = Batch(key, first, len(data))
+            batch.object_ids, starts, counts = np.unique(ids, return_index=True, return_counts=True)
+            batch.firsts = (first + starts).astype(np.int32)
+            batch.counts = counts.astype(np.int32)
+            np.minimum.at(lo, batch.object_ids, np.minimum.reduceat(data[:, :3], starts))
+            np.maximum.at(hi, batch.object_ids, np.maximum.reduceat(data[:, :3], starts))
+            parts.append(data)
+            batches.append(batch)
+            first += len(data)
+        return parts, batches, first
+
+    def build(self):
+        lo = np.full((len(self.object_names), 3), np.inf)
+        hi = np.full((len(self.object_names), 3), -np.inf)
+        parts, batches, first = self.build_batches(self.chunks, sorted(self.chunks, key=sort_key), lo, hi)
+        textured_parts, textured, _ = self.build_batches(self.textured, sorted(self.textured, key=repr), lo, hi)
+        if textured_parts: textured_vertices = np.ascontiguousarray(np.concatenate(textured_parts), dtype=np.float32)
+        else: textured_vertices = None
+        instances = []
+        if self.props is not None:
+            for batch in self.props.build(first):
+                parts.append(batch.vertices)
+                instances.append(batch)
+                first += batch.count
+        if parts: vertices = np.ascontiguousarray(np.concatenate(parts), dtype=np.float32)
+        else: vertices = np.zeros((0, VERTEX_FLOATS), dtype=np.float32)
+        # Descarta objetos sem vértices (ex.: props que viraram instâncias)
+        used = np.isfinite(lo).all(axis=1)
+        remap = np.cumsum(used) - 1
+        for batch in batches + textured: batch.object_ids = remap[batch.object_ids].astype(np.int32)
+        names = [n for n, u in zip(self.object_names, used) if u]
+        bounds = np.concatenate([lo[used], hi[used]], axis=1).astype(np.float32)
+        lods = np.array(self.object_lods, dtype=np.int8)[used]
+        groups = np.array(self.object_groups, dtype=np.int32)[used]
+        # Caixa de cada grupo = caixa do nível 0
+        group_bounds = np.zeros((self.group_count, 6), dtype=np.float32)
+        group_bounds[groups[lods == 0]] = bounds[lods == 0]
+        solids = np.array([b for _, b in self.solids], dtype=np.float32).reshape(-1, 6)
+        solid_objects = remap[np.array([o for o, _ in self.solids], dtype=np.int64)].astype(np.int32)
+        return Mesh(vertices, batches, instances, names, bounds, lods, groups, group_bounds, textured_vertices, textured,
+                    solids=solids, solid_objects=solid_objects)
+
+
+def sort_key(key):
+    prim, cull, offset, size = key
+    return (prim, not cull, offset is not None, offset or (0.0, 0.0), size)
+
+
+def primitive_indices(mode, n):
+    # Converte a primitiva imediata em lista de triângulos/linhas/pontos
+    if mode == GL_TRIANGLES: return list(range(n - n % 3))
+    if mode == GL_QUADS:
+        idx = []
+        for q in range(0, n - n % 4, 4): idx += [q, q+1, q+2, q, q+2, q+3]
+        return idx
+    if mode in (GL_TRIANGLE_FAN, GL_POLYGON):
+        idx = []
+        for i in range(1, n - 1): idx += [0, i, i+1]
+        return idx
+    if mode == GL_TRIANGLE_STRIP:
+        idx = []
+        for i in range(n - 2): idx += [i, i+1, i+2] if i % 2 == 0 else [i+1, i, i+2]
+        return idx
+    if mode == GL_QUAD_STRIP:
+        idx = []
+        for i in range(0, n - 3, 2): idx += [i, i+1, i+3, i, i+3, i+2]
+        return idx
+    if mode == GL_LINES: return list(range(n - n % 2))
+    if mode == GL_LINE_STRIP:
+        idx = []
+        for i in range(n - 1): idx += [i, i+1]
+        return idx
+    if mode == GL_POINTS: return list(range(n))
+    return None
+
+
+@contextmanager
+def capture(namespace, recorder):
+    # Troca as funções GL do módulo das funções draw_* pelas do gravador
+    recorder.namespace = namespace
+    saved = {}
+    for name in RECORDED_CALLS:
+        if name in namespace:
+            saved[name] = namespace[name]
+            namespace[name] = getattr(recorder, name)
+    for name, fn in recorder.overrides.items():
+        if name in namespace:
+            saved[name] = namespace[name]
+            namespace[name] = fn
+    for name in recorder.object_functions:
+        if name in namespace:
+            saved.setdefault(name, namespace[name])
+            namespace[name] = recorder.object_function(name, namespace[name])
+    try:
+        yield recorder
+    finally:
+        namespace.update(saved)
+
+
+def compile_geometry(namespace, draw_fn, *args, props=None, objects=(), lod_objects=()):
+    recorder = GeometryRecorder()
+    recorder.object_functions = objects
+    recorder.lod_functions = lod_objects
+    if props is not None:
+        recorder.props = props
+        recorder.overrides = props.overrides(recorder)
+    with capture(namespace, recorder):
+        draw_fn(*args)
+    return recorder.build()
+
+
+#  BUFFERS NA GPU
+class MeshBuffer:
+    def __init__(self, mesh):
+        self.mesh = mesh
+        self.vbo, self.ibo = None, None
+        # VAOs do pipeline com shaders (shaders.ShaderPipeline.bind_mesh/bind_textured)
+        self.vao = None
+        self.textured_vbo, self.textured_vao = None, None
+        # Nível atual de cada grupo de LOD e de cada instância de prop pequeno (histerese entre quadros)
+        self.lod_levels = np.zeros(len(mesh.group_bounds), dtype=int)
+        self.instance_levels = [np.zeros(len(b), dtype=int) for b in mesh.instances]
+
+    def upload(self):
+        self.vbo = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        glBufferData(GL_ARRAY_BUFFER, self.mesh.vertices.nbytes, self.mesh.vertices, GL_STATIC_DRAW)
+        if self.mesh.indices is not None:
+            self.ibo = glGenBuffers(1)
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.ibo)
+            glBufferData(GL_ELEMENT_ARRAY_BUFFER, self.mesh.indices.nbytes, self.mesh.indices, GL_STATIC_DRAW)
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+        if self.mesh.textured:
+            self.textured_vbo = glGenBuffers(1)
+            glBindBuffer(GL_ARRAY_BUFFER, self.textured_vbo)
+            glBufferData(GL_ARRAY_BUFFER, self.mesh.textured_vertices.nbytes, self.mesh.textured_vertices, GL_STATIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def delete(self):
+        if self.vbo is not None:
+            buffers = [b for b in (self.vbo, self.ibo, self.textured_vbo) if b is not None]
+            glDeleteBuffers(len(buffers), buffers)
+            self.vbo = self.ibo = self.textured_vbo = None
+        vaos = [a for a in (self.vao, self.textured_vao) if a is not None]
+        if vaos: glDeleteVertexArrays(len(vaos), vaos)
+        self.vao = self.textured_vao = None
+
+    def draw(self, frustum=None, pipeline=None):
+        # pipeline: shaders.ShaderPipeline; None = arrays do pipeline fixo
+        if self.vbo is None: self.upload()
+        mesh = self.mesh
+        if pipeline is not None:
+            pipeline.bind_mesh(self)
+        else:
+            glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+            if self.ibo is not None: glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.ibo)
+            glEnableClientState(GL_VERTEX_ARRAY); glEnableClientState(GL_COLOR_ARRAY)
+            glVertexPointer(3, GL_FLOAT, VERTEX_STRIDE, ctypes_offset(0))
+            glColorPointer(3, GL_FLOAT, VERTEX_STRIDE, ctypes_offset(12))
+        # Só contam os objetos no nível de detalhe escolhido
+        current = self.current_lods(frustum)
+        visible = frustum.test_boxes(mesh.object_bounds) & current if frustum is not None else current
+        RENDER_STATS.objects_drawn += int(visible.sum())
+        RENDER_STATS.objects_culled += int(current.sum() - visible.sum())
+        RENDER_STATS.lod_counts += np.bincount(mesh.object_lods[visible & (mesh.object_lods >= 0)], minlength=LOD_LEVELS)
+        indexed = mesh.indices is not None
+        for batch in mesh.batches:
+            if visible is None or visible[batch.object_ids].all():
+                draw_ranges(batch.key, None, None, batch.first, batch.count, indexed)
+            else:
+                vis = visible[batch.object_ids]
+                draw_ranges(batch.key, batch.firsts[vis], batch.counts[vis], indexed=indexed)
+        for i, batch in enumerate(mesh.instances):
+            vis = self.visible_instances(i, batch, frustum) if frustum is not None else None
+            if vis is None or vis.all():
+                RENDER_STATS.instances_drawn += len(batch)
+                draw_ranges(batch.key, None, None, batch.first, batch.count, indexed)
+            else:
+                idx = np.nonzero(vis)[0]
+                RENDER_STATS.instances_drawn += len(idx)
+                RENDER_STATS.instances_culled += len(vis) - len(idx)
+                vpi = batch.vertices_per_instance
+                draw_ranges(batch.key, (batch.first + idx*vpi).astype(np.int32), np.full(len(idx), vpi, dtype=np.int32), indexed=indexed)
+        if mesh.textured: self.draw_textured(visible, pipeline)
+        reset_batch_state()
+        if pipeline is not None:
+            pipeline.unbind_mesh()
+        else:
+            glDisableClientState(GL_COLOR_ARRAY); glDisableClientState(GL_VERTEX_ARRAY)
+            glBindBuffer(GL_ARRAY_BUFFER, 0)
+            if self.ibo is not None: glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+
+    def draw_textured(self, visible, pipeline):
+        # Um draw call por textura visível, depois dos lotes de cor
+        if pipeline is not None:
+            pipeline.bind_textured(self)
+        else:
+            glBindBuffer(GL_ARRAY_BUFFER, self.textured_vbo)
+            glDisableClientState(GL_COLOR_ARRAY); glEnableClientState(GL_TEXTURE_COORD_ARRAY)
+            glVertexPointer(3, GL_FLOAT, TEXTURE_STRIDE, ctypes_offset(0))
+            glTexCoordPointer(2, GL_FLOAT, TEXTURE_STRIDE, ctypes_offset(12))
+            begin_textured()
+        for batch in self.mesh.textured:
+            vis = visible[batch.object_ids]
+            if not vis.any(): continue
+            glBindTexture(GL_TEXTURE_2D, TEXTURES.get(batch.key))
+            if vis.all(): draw_ranges(TEXTURED_KEY, None, None, batch.first, batch.count)
+            else: draw_ranges(TEXTURED_KEY, batch.firsts[vis], batch.counts[vis])
+        if pipeline is not None:
+            pipeline.unbind_textured()
+        else:
+            end_textured()
+            glDisableClientState(GL_TEXTURE_COORD_ARRAY); glEnableClientState(GL_COLOR_ARRAY)
+
+    def current_lods(self, frustum):
+        # True para objetos sem LOD e para o nível escolhido de cada grupo
+        mesh = self.mesh
+        if frustum is None or len(mesh.group_bounds) == 0: return mesh.object_lods <= 0
+        sizes = projected_sizes(mesh.group_bounds, frustum.eye, frustum.tan_half_fov, frustum.view_height)
+        self.lod_levels = select_levels(self.lod_levels, sizes, LOD_THRESHOLDS)
+        return (mesh.object_lods < 0) | (mesh.object_lods == self.lod_levels[mesh.object_groups])
+
+    def visible_instances(self, i, batch, frustum):
+        # Grupos de instâncias primeiro (instancing.INSTANCE_GROUP): o custo por quadro cresce com
+        # os grupos; só os cortados pelo frustum testam as suas instâncias uma a uma
+        seen, inside = frustum.classify_boxes(batch.group_bounds)
+        vis = batch.expand(inside)
+        partial = np.nonzero(batch.expand(seen & ~inside))[0]
+        if len(partial): vis[partial] = frustum.classify_boxes(batch.bounds[partial])[0]
+        if batch.small: vis &= ~self.hidden_instances(i, batch, frustum, vis, seen)
+        return vis
+
+    def hidden_instances(self, i, batch, frustum, vis, seen):
+        # Nível 1 = pequeno demais na tela para ser desenhado. Um grupo visível todo abaixo (ou
+        # acima) da margem do limiar decide de uma vez; só os grupos perto do limiar olham cada instância
+        levels = self.instance_levels[i]
+        small, large = projected_size_range(batch.group_bounds, batch.group_radii, frustum.eye,
+                                            frustum.tan_half_fov, frustum.view_height)
+        hide = seen & (large < LOD_HIDE_BELOW * (1.0 - LOD_HYSTERESIS))
+        show = seen & (small >= LOD_HIDE_BELOW * (1.0 + LOD_HYSTERESIS))
+        levels[batch.expand(hide)] = 1
+        levels[batch.expand(show)] = 0
+        near = np.nonzero(batch.expand(seen & ~hide & ~show))[0]
+        if len(near):
+            sizes = projected_sizes(batch.bounds[near], frustum.eye, frustum.tan_half_fov, frustum.view_height)
+            levels[near] = select_levels(levels[near], sizes, (LOD_HIDE_BELOW,))
+        hidden = levels == 1
+        RENDER_STATS.instances_hidden += int((vis & hidden).sum())
+        return hidden
+
+
+# Quads texturizados: dupla face, sem polygon offset
+TEXTURED_KEY = batch_key(GL_TRIANGLES, False, None, 0.0)
+
+
+def draw_ranges(key, firsts, counts, first=0, count=0, indexed=False):
+    # Uma faixa contínua -> glDrawArrays; várias -> um único glMultiDrawArrays.
+    # indexed: faixas do buffer de índices ligado (uint32) -> glDrawElements / glMultiDrawElements
+    if firsts is None:
+        if count == 0: return
+        apply_batch_state(key)
+        if indexed: glDrawElements(key[0], count, GL_UNSIGNED_INT, ctypes_offset(first * 4))
+        else: glDrawArrays(key[0], first, count)
+        RENDER_STATS.vertices += count
+    else:
+        if len(firsts) == 0: return
+        apply_batch_state(key)
+        if indexed:
+            offsets = (ctypes.c_void_p * len(firsts))(*(np.asarray(firsts, dtype=np.int64) * 4).tolist())
+            glMultiDrawElements(key[0], np.ascontiguousarray(counts, dtype=np.int32), GL_UNSIGNED_INT, offsets, len(firsts))
+        else:
+            glMultiDrawArrays(key[0], firsts, counts, len(firsts))
+        RENDER_STATS.vertices += int(counts.sum())
+    RENDER_STATS.draw_calls += 1
+
+
+def ctypes_offset(n):
+    return ctypes.c_void_p(n)
+
+
+def apply_batch_state(key):
+    prim, cull, offset, size = key
+    if cull: glEnable(GL_CULL_FACE)
+    else: glDisable(GL_CULL_FACE)
+    if offset is not None:
+        glEnable(GL_POLYGON_OFFSET_FILL); glPolygonOffset(*offset)
+    else:
+        glDisable(GL_POLYGON_OFFSET_FILL)
+    if prim == GL_LINES: glLineWidth(size)
+    elif prim == GL_POINTS: glPointSize(size)
+
+
+def reset_batch_state():
+    glEnable(GL_CULL_FACE); glDisable(GL_POLYGON_OFFSET_FILL)
+    glLineWidth(1.0); glPointSize(1.0)
+
+
+class SceneCache:
+    # Guarda uma malha compilada por (nome, argumentos): as variantes de uma cena (porta aberta
+    # ou fechada, parede com ou sem o vão) ficam todas na GPU e trocar entre elas não recompila.
+    # props: fábrica de tabelas de instâncias (ex.: instancing.PropInstances)
+    # objects: nomes das funções draw_* cujas chamadas viram objetos com caixa própria
+    # lod_objects: subconjunto de objects compilado em vários níveis de detalhe (lod.py)
+    # baked: cena pré-compilada em disco (bake.py); variantes ausentes são compiladas na hora
+    def __init__(self, namespace, props=None, objects=(), lod_objects=(), baked=None):
+        self.namespace = namespace
+        self.props = props
+        self.objects = objects
+        self.lod_objects = lod_objects
+        self.baked = baked
+        self.entries = {}
+
+    def compile(self, draw_fn, *args):
+        props = self.props(self.namespace) if self.props is not None else None
+        return compile_geometry(self.namespace, draw_fn, *args, props=props, objects=self.objects,
+                                lod_objects=self.lod_objects)
+
+    def get(self, name, draw_fn, *args):
+        buffer = self.entries.get((name, args))
+        if buffer is None:
+            mesh = self.baked.get(name, args) if self.baked is not None else None
+            if mesh is None: mesh = self.compile(draw_fn, *args)
+            buffer = self.entries[(name, args)] = MeshBuffer(mesh)
+        return buffer
+
+    def prepare(self, name, draw_fn, *args):
+        # Envia o VBO antes do primeiro desenho (na partida, em vez de no primeiro quadro)
+        buffer = self.get(name, draw_fn, *args)
+        if buffer.vbo is None: buffer.upload()
+
+    def draw(self, name, draw_fn, *args, frustum=None, pipeline=None):
+        self.get(name, draw_fn, *args).draw(frustum, pipeline)
+
+    def clear(self):
+        for buf in self.entries.values(): buf.delete()
+        self.entries = {}
@@ -0,0 +1,355 @@
+from startup import STARTUP
+import os
+import sys
+import json
+import time
+import ctypes
+import argparse
+import subprocess
+import numpy as np
+
+#  MODO HEADLESS / BENCHMARK
+# Renderiza a mesma cena de centro.py em um framebuffer offscreen (EGL ou
+# OSMesa, com renderização por software em máquinas sem GPU), seguindo um
+# caminho de câmera roteirizado, e grava percentis de tempo de CPU/GPU e
+# contagem de draw calls por quadro em JSON para acompanhar regressões.
+#
+#   python headless.py --out bench.json
+#   LIBGL_ALWAYS_SOFTWARE=1 python headless.py --backend osmesa
+
+# (tempo s, posição, yaw, pitch): fachada -> rampa -> porta -> estantes
+CAMERA_PATH = [
+    (0.0,  (0.0, 1.8, 15.0),  -90.0,  0.0),
+    (3.0,  (0.0, 1.8, 7.0),   -90.0,  5.0),
+    (5.0,  (0.0, 1.8, 2.0),   -90.0,  0.0),
+    (7.0,  (-7.6, 1.8, 0.2),  -90.0,  0.0),
+    (8.5,  (-7.6, 1.8, 0.2),   90.0,  0.0),
+    (11.0, (7.6, 1.8, 0.2),    90.0,  0.0),
+    (12.5, (7.6, 1.8, 0.2),   270.0,  0.0),
+    (15.0, (0.0, 1.8, 1.0),   180.0, -5.0),
+]
+# A porta abre quando a câmera chega na rampa
+DOOR_OPEN_AT = 3.5
+GPU_QUERY_RING = 4
+# Busca de caminho do relatório: do início do percurso até uma estante do fundo
+NAV_PATH = ((0.0, 1.8, 15.0), (-7.6, 1.8, -1.6))
+
+
+def camera_at(t):
+    t = min(max(t, CAMERA_PATH[0][0]), CAMERA_PATH[-1][0])
+    for (t0, p0, y0, pi0), (t1, p1, y1, pi1) in zip(CAMERA_PATH, CAMERA_PATH[1:]):
+        if t <= t1:
+            a = (t - t0) / (t1 - t0)
+            pos = np.array(p0) + (np.array(p1) - np.array(p0)) * a
+            return pos, y0 + (y1 - y0) * a, pi0 + (pi1 - pi0) * a
+    return np.array(CAMERA_PATH[-1][1], dtype=float), CAMERA_PATH[-1][2], CAMERA_PATH[-1][3]
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Renderização offscreen com caminho de câmera e relatório de desempenho")
+    parser.add_argument('--backend', choices=['egl', 'osmesa'], default='egl')
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--fps', type=float, default=30.0, help="quadros por segundo de caminho (define o número de quadros)")
+    parser.add_argument('--warmup', type=int, default=5, help="quadros descartados no início")
+    parser.add_argument('--immediate', action='store_true', help="usa o modo imediato em vez dos VBOs")
+    parser.add_argument('--no-render-queue', action='store_true', help="no modo imediato, chama o GL direto em vez da fila ordenada por estado")
+    parser.add_argument('--shaders', action='store_true', help="usa o pipeline de shaders GLSL 3.30 (shaders.py)")
+    parser.add_argument('--no-bake', action='store_true', help="compila a cena em Python em vez de ler scene.bake")
+    parser.add_argument('--out', metavar='ARQUIVO', help="grava o relatório JSON (padrão: stdout)")
+    parser.add_argument('--screenshot', metavar='ARQUIVO', help="salva o último quadro em PNG")
+    parser.add_argument('--visitors', type=int, default=0, metavar='N', help="visitantes simulados no interior (passo fixo de 60 Hz)")
+    parser.add_argument('--district', action='store_true', help="carrega os quarteirões vizinhos em segundo plano (streaming.py)")
+    parser.add_argument('--dynamic-resolution', action='store_true', help="resolução e MSAA ajustados ao tempo de quadro (resolution.py)")
+    parser.add_argument('--frame-budget', type=float, metavar='MS', help="orçamento da resolução dinâmica (padrão: 1000/60)")
+    parser.add_argument('--trace', metavar='ARQUIVO', help="exporta os escopos do profiler em formato Chrome trace")
+    parser.add_argument('--capture', metavar='PASTA', help="grava o caminho via PBOs, um quadro por quadro do caminho (capture.py)")
+    parser.add_argument('--capture-format', choices=['png', 'raw'], default='png', help="PNGs numerados ou vídeo BGRA cru")
+    args = parser.parse_args(argv)
+    if args.district and args.immediate: parser.error("--district precisa dos VBOs (sem --immediate)")
+    return args
+
+
+#  CONTEXTO OFFSCREEN
+def create_context(backend, width, height):
+    # PYOPENGL_PLATFORM precisa estar definido antes do primeiro import de OpenGL
+    os.environ.setdefault('PYOPENGL_PLATFORM', backend)
+    if backend == 'egl':
+        os.environ.setdefault('EGL_PLATFORM', 'surfaceless')
+        return create_egl_context()
+    return create_osmesa_context(width, height)
+
+
+def create_egl_context():
+    from OpenGL import EGL
+    dpy = EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+    if not EGL.eglInitialize(dpy, None, None):
+        raise RuntimeError("EGL: não foi possível inicializar o display")
+    attrs = [EGL.EGL_SURFACE_TYPE, EGL.EGL_PBUFFER_BIT, EGL.EGL_RED_SIZE, 8, EGL.EGL_GREEN_SIZE, 8,
+             EGL.EGL_BLUE_SIZE, 8, EGL.EGL_DEPTH_SIZE, 24, EGL.EGL_RENDERABLE_TYPE, EGL.EGL_OPENGL_BIT, EGL.EGL_NONE]
+    config, count = EGL.EGLConfig(), EGL.EGLint()
+    EGL.eglChooseConfig(dpy, (EGL.EGLint*len(attrs))(*attrs), ctypes.pointer(config), 1, ctypes.pointer(count))
+    if count.value == 0:
+        raise RuntimeError("EGL: nenhuma configuração com OpenGL disponível")
+    # A cena vai para um FBO; a superfície pbuffer só serve para tornar o contexto atual
+    surface = EGL.eglCreatePbufferSurface(dpy, config, (EGL.EGLint*5)(EGL.EGL_WIDTH, 16, EGL.EGL_HEIGHT, 16, EGL.EGL_NONE))
+    EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+    context = EGL.eglCreateContext(dpy, config, EGL.EGL_NO_CONTEXT, None)
+    if not EGL.eglMakeCurrent(dpy, surface, surface, context):
+        raise RuntimeError("EGL: eglMakeCurrent falhou")
+    return (dpy, surface, context)
+
+
+def create_osmesa_context(width, height):
+    from OpenGL import osmesa, arrays
+    from OpenGL.GL import GL_UNSIGNED_BYTE
+    context = osmesa.OSMesaCreateContextExt(osmesa.OSMESA_RGBA, 24, 0, 0, None)
+    if not context:
+        raise RuntimeError("OSMesa: não foi possível criar o contexto")
+    buf = arrays.GLubyteArray.zeros((height, width, 4))
+    if not osmesa.OSMesaMakeCurrent(context, buf, GL_UNSIGNED_BYTE, width, height):
+        raise RuntimeError("OSMesa: OSMesaMakeCurrent falhou")
+    return (context, buf)
+
+
+def create_framebuffer(width, height):
+    from OpenGL.GL import (glGenFramebuffers, glBindFramebuffer, glGenRenderbuffers, glBindRenderbuffer,
+                           glRenderbufferStorage, glFramebufferRenderbuffer, glCheckFramebufferStatus, glViewport,
+                           GL_FRAMEBUFFER, GL_RENDERBUFFER, GL_RGBA8, GL_DEPTH_COMPONENT24,
+                           GL_COLOR_ATTACHMENT0, GL_DEPTH_ATTACHMENT, GL_FRAMEBUFFER_COMPLETE)
+    fbo = glGenFramebuffers(1)
+    glBindFramebuffer(GL_FRAMEBUFFER, fbo)
+    color, depth = glGenRenderbuffers(2)
+    glBindRenderbuffer(GL_RENDERBUFFER, color)
+    glRenderbufferStorage(GL_RENDERBUFFER, GL_RGBA8, width, height)
+    glFramebufferRenderbuffer(GL_FRAMEBUFFER, GL_COLOR_ATTACHMENT0, GL_RENDERBUFFER, color)
+    glBindRenderbuffer(GL_RENDERBUFFER, depth)
+    glRenderbufferStorage(GL_RENDERBUFFER, GL_DEPTH_COMPONENT24, width, height)
+    glFramebufferRenderbuffer(GL_FRAMEBUFFER, GL_DEPTH_ATTACHMENT, GL_RENDERBUFFER, depth)
+    if glCheckFramebufferStatus(GL_FRAMEBUFFER) != GL_FRAMEBUFFER_COMPLETE:
+        raise RuntimeError("framebuffer offscreen incompleto")
+    glViewport(0, 0, width, height)
+    return fbo
+
+
+#  MEDIÇÃO
+class GpuTimer:
+    # Anel de consultas GL_TIME_ELAPSED lidas só quando prontas (sem travar o pipeline)
+    def __init__(self, size=GPU_QUERY_RING):
+        from OpenGL import GL
+        self.GL = GL
+        self.pending, self.results = [], []
+        try:
+            self.free = list(GL.glGenQueries(size))
+        except Exception:
+            self.free = None
+
+    @property
+    def available(self):
+        return self.free is not None
+
+    def begin(self):
+        if not self.available: return
+        if not self.free: self.collect(block=True)
+        self.query = self.free.pop()
+        self.GL.glBeginQuery(self.GL.GL_TIME_ELAPSED, self.query)
+
+    def end(self):
+        if not self.available: return
+        self.GL.glEndQuery(self.GL.GL_TIME_ELAPSED)
+        self.pending.append(self.query)
+        self.collect()
+
+    def collect(self, block=False):
+        GL = self.GL
+        while self.pending:
+            q = self.pending[0]
+            if not block and not GL.glGetQueryObjectiv(q, GL.GL_QUERY_RESULT_AVAILABLE): break
+            # Resultado em ns; 32 bits bastam para tempos de quadro
+            self.results.append(GL.glGetQueryObjectuiv(q, GL.GL_QUERY_RESULT) / 1e6)
+            self.free.append(self.pending.pop(0))
+            block = False
+
+
+def percentiles(values):
+    if not values: return None
+    v = np.asarray(values, dtype=float)
+    return {'mean': float(v.mean()), 'p50': float(np.percentile(v, 50)), 'p90': float(np.percentile(v, 90)),
+            'p95': float(np.percentile(v, 95)), 'p99': float(np.percentile(v, 99)), 'max': float(v.max())}
+
+
+def git_commit():
+    try:
+        out = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def save_screenshot(path, width, height):
+    import pygame
+    from OpenGL.GL import glReadPixels, GL_RGB, GL_UNSIGNED_BYTE
+    data = glReadPixels(0, 0, width, height, GL_RGB, GL_UNSIGNED_BYTE)
+    image = pygame.image.frombuffer(bytes(data), (width, height), 'RGB')
+    pygame.image.save(pygame.transform.flip(image, False, True), path)
+
+
+def run(args):
+    create_context(args.backend, args.width, args.height)
+    STARTUP.mark('contexto offscreen')
+    import centro
+    from OpenGL.GL import glFinish, glGetString, GL_RENDERER, GL_VERSION
+    from geometry import SceneCache, RENDER_STATS
+    from instancing import PropInstances
+    from profiler import PROFILER, count_immediate_calls
+    from simulation import SIM_HZ
+    from capture import FrameCapture
+    STARTUP.mark('imports')
+
+    create_framebuffer(args.width, args.height)
+    centro.USE_VBO = not args.immediate
+    centro.USE_RENDER_QUEUE = not args.no_render_queue
+    centro.USE_SHADERS = args.shaders
+    centro.setup_gl(args.width, args.height)
+    STARTUP.mark('contexto GL')
+    t0 = time.perf_counter()
+    if args.no_bake:
+        baked = None
+        scene = SceneCache(vars(centro), props=PropInstances, objects=centro.SCENE_OBJECTS, lod_objects=centro.LOD_OBJECTS)
+    else:
+        scene, baked = centro.load_scene()
+    startup_ms = (time.perf_counter() - t0) * 1000
+    STARTUP.mark('cena carregada')
+    if not args.no_bake:
+        centro.upload_scene(scene, baked)
+        STARTUP.mark('envio à GPU')
+    if args.immediate: count_immediate_calls(vars(centro))
+    # Escopos de todo o caminho (window=None), não só dos últimos quadros
+    PROFILER.enable(trace=bool(args.trace), window=None)
+    PROFILER.instrument(vars(centro), centro.PROFILED_FUNCTIONS)
+
+    camera = centro.Camera()
+    nav = (baked.ground, baked.navmesh) if baked is not None else (None, None)
+    visitors = centro.make_visitors(args.visitors, camera.world, ground=nav[0], navmesh=nav[1]) if args.visitors else None
+    district = centro.make_district() if args.district else None
+    interactions = centro.make_interactions(scene.get('interior', centro.draw_interior_scene).mesh, camera.world, lambda target: None)
+    door_open, targets = False, 0
+    capture = FrameCapture(args.width, args.height, args.capture, args.capture_format, fps=args.fps) if args.capture else None
+    resolution = centro.make_resolution(args.width, args.height, args) if args.dynamic_resolution else None
+    gpu = GpuTimer()
+    duration = CAMERA_PATH[-1][0]
+    total = int(duration * args.fps) + 1
+    cpu_ms, frame_ms, draw_calls, vertices = [], [], [], []
+    culled = {'objects_drawn': [], 'objects_culled': [], 'instances_drawn': [], 'instances_culled': [],
+              'instances_hidden': [], 'cells_drawn': [], 'chunks_drawn': []}
+    lod_counts = []
+    queue_stats = {'state_requested': [], 'state_issued': [], 'colors_requested': [], 'colors_issued': []}
+    for frame in range(-args.warmup, total):
+        t = max(frame, 0) / args.fps
+        pos, camera.yaw, camera.pitch = camera_at(t)
+        camera.update_vectors()
+        RENDER_STATS.reset()
+        if frame == 0:
+            PROFILER.reset()
+            if capture is not None: capture.start()
+        t0 = time.perf_counter()
+        gpu.begin()
+        if visitors is not None:
+            # Passos de 60 Hz correspondentes ao intervalo entre quadros do caminho
+            for _ in range(round(SIM_HZ / args.fps) if frame >= 0 else 0): visitors.step()
+        if door_open != (t >= DOOR_OPEN_AT):
+            door_open = t >= DOOR_OPEN_AT
+            centro.set_door_interactions(interactions, door_open)
+        with PROFILER.scope('interaction'):
+            target = interactions.pick(pos, camera.front)
+        if resolution is not None: resolution.begin_frame()
+        centro.render_frame(scene, camera, pos, door_open, visitors, district,
+                            resolution.size[1] if resolution is not None else None)
+        if resolution is not None:
+            with PROFILER.scope('upscale', gpu=True): resolution.end_frame()
+        if capture is not None:
+            with PROFILER.scope('capture'): capture.grab(t)
+        gpu.end()
+        t1 = time.perf_counter()
+        glFinish()
+        t2 = time.perf_counter()
+        PROFILER.end_frame()
+        if resolution is not None: resolution.record((t2 - t0) * 1000)
+        if frame == -args.warmup: STARTUP.mark('primeiro quadro')
+        if frame < 0: continue
+        cpu_ms.append((t1 - t0) * 1000)
+        targets += target is not None
+        frame_ms.append((t2 - t0) * 1000)
+        draw_calls.append(RENDER_STATS.draw_calls)
+        vertices.append(RENDER_STATS.vertices)
+        for name, values in culled.items(): values.append(getattr(RENDER_STATS, name))
+        for name, values in queue_stats.items(): values.append(getattr(RENDER_STATS, name))
+        lod_counts.append(RENDER_STATS.lod_counts.copy())
+    if gpu.available: gpu.collect(block=True)
+    if args.screenshot: save_screenshot(args.screenshot, args.width, args.height)
+    if args.trace: PROFILER.export_chrome_trace(args.trace)
+    if capture is not None:
+        capture.close()
+        capture_report = {'format': args.capture_format, 'session': capture.session, 'frames': capture.captured, 'dropped': capture.dropped}
+    if district is not None:
+        district_report = {'chunks': len(district.chunks), 'loaded': district.loaded, 'evicted': district.evicted,
+                           'resident': district.resident_count, 'resident_mb': district.resident_bytes / 2**20}
+        district.close()
+
+    queued = args.immediate and not args.no_render_queue
+    return {
+        'commit': git_commit(),
+        'mode': 'immediate' if args.immediate else 'shaders' if centro.PIPELINE is not None else 'vbo',
+        'backend': args.backend,
+        'gl_renderer': glGetString(GL_RENDERER).decode(),
+        'gl_version': glGetString(GL_VERSION).decode(),
+        'resolution': [args.width, args.height],
+        # Só a carga/criação da cena; com --no-bake a compilação acontece no primeiro quadro
+        'startup_ms': startup_ms,
+        # Fases da partida em ms desde o início do processo (startup.py)
+        'startup_timeline': STARTUP.summary(),
+        'frames': len(cpu_ms),
+        'cpu_ms': percentiles(cpu_ms),
+        'frame_ms': percentiles(frame_ms),
+        'gpu_ms': percentiles(gpu.results[args.warmup:]) if gpu.available else None,
+        'draw_calls': percentiles(draw_calls),
+        'vertices': percentiles(vertices) if not args.immediate else None,
+        'culling': {name: percentiles(values) for name, values in culled.items()} if not args.immediate else None,
+        'scopes': PROFILER.summary(),
+        'district': district_report if district is not None else None,
+        # Passo do optimize.py no bake, por cena (com --no-bake as malhas ficam sem índices)
+        'mesh_optimization': baked.optimization if baked is not None else None,
+        # Grade de alturas e navmesh do bake, com o tempo de uma busca de caminho de fora até o fundo da biblioteca
+        'navigation': navigation_report(*nav) if nav[1] is not None else None,
+        # Caixas no registro de interação e quadros com algo na mira
+        'interaction': {'interactables': len(interactions), 'frames_with_target': targets},
+        # Fila do modo imediato: mudanças de estado e de cor por quadro pedidas pelas draw_* e enviadas ao GL
+        'render_queue': {name: percentiles(values) for name, values in queue_stats.items()} if queued else None,
+        # Escada de resolução: nível final, decisões tomadas e histórico recente de tempo de quadro
+        'dynamic_resolution': resolution.summary() if resolution is not None else None,
+        'capture': capture_report if capture is not None else None,
+        # Objetos com LOD desenhados em cada nível (0 = detalhe total)
+        'lod': {f'level_{i}': percentiles(list(c)) for i, c in enumerate(np.array(lod_counts).T)} if not args.immediate else None,
+    }
+
+
+def navigation_report(ground, navmesh):
+    t0 = time.perf_counter()
+    path = navmesh.path(NAV_PATH[0], NAV_PATH[1])
+    return {'grid': list(ground.shape), 'cell': ground.cell, 'walkable_cells': int(ground.walkable.sum()),
+            'nodes': len(navmesh), 'edges': len(navmesh.neighbors),
+            'path_ms': (time.perf_counter() - t0) * 1000, 'path_points': len(path) if path is not None else None}
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    report = json.dumps(run(args), indent=2)
+    if args.out:
+        with open(args.out, 'w') as f: f.write(report + '\n')
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
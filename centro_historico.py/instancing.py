@@ -0,0 +1,135 @@
+from OpenGL.GL import *
+import numpy as np
+from geometry import (GeometryRecorder, capture, batch_key, translation_matrix,
+                      rotation_matrix, scale_matrix, VERTEX_FLOATS)
+
+#  INSTANCIAMENTO DE PROPS REPETIDOS
+# Livros, postes de sacada, montantes de janela e cadeiras viram uma malha
+# unitária por tipo + tabelas NumPy por instância (transformação, cor,
+# inclinação). Cada tipo de prop é desenhado com uma única chamada.
+
+# Props pequenos: cada instância some de longe (LOD_HIDE_BELOW em lod.py)
+SMALL_PROPS = ('book',)
+# Instâncias consecutivas (a mesma estante, a mesma sacada) formam um grupo com caixa
+# própria: o desenho testa os grupos e só desce às instâncias dos grupos indecisos
+INSTANCE_GROUP = 32
+
+def record_unit_mesh(namespace, draw_fn, *args):
+    # Grava a malha unitária com as próprias funções de desenho do módulo
+    recorder = GeometryRecorder()
+    with capture(namespace, recorder):
+        draw_fn(*args)
+    mesh = recorder.build()
+    return np.concatenate([mesh.vertices[b.first:b.first + b.count] for b in mesh.batches if b.key[0] == GL_TRIANGLES])
+
+
+class InstanceBatch:
+    def __init__(self, name, key, unit):
+        self.name, self.key, self.unit = name, key, unit
+        self.small = name in SMALL_PROPS
+        self.first, self.count = 0, 0
+        self.vertices = None
+        self._transforms, self._colors, self._lean = [], [], []
+
+    def add(self, matrix, color, lean=0.0):
+        self._transforms.append(matrix)
+        self._colors.append(color)
+        self._lean.append(lean)
+
+    def __len__(self):
+        return len(self.transforms) if self.vertices is not None else len(self._transforms)
+
+    @classmethod
+    def from_arrays(cls, name, key, first, transforms, colors, lean, vertices, bounds):
+        # Lote já finalizado, lido do arquivo pré-compilado (bake.py)
+        batch = cls(name, key, None)
+        batch.first, batch.count = first, len(vertices)
+        batch.transforms, batch.colors, batch.lean = transforms, colors, lean
+        batch.vertices, batch.bounds = vertices, bounds
+        batch.vertices_per_instance = len(vertices) // max(len(transforms), 1)
+        batch.build_groups()
+        return batch
+
+    def finalize(self):
+        # Tabelas por instância empacotadas em arrays NumPy
+        self.transforms = np.array(self._transforms, dtype=np.float32).reshape(-1, 4, 4)
+        self.colors = np.array(self._colors, dtype=np.float32).reshape(-1, 3)
+        self.lean = np.array(self._lean, dtype=np.float32)
+        self.vertices = expand_instances(self.unit, self.transforms, self.colors)
+        self.count = len(self.vertices)
+        self.vertices_per_instance = len(self.unit)
+        # Caixa de cada instância no mundo, para o culling por instância
+        pos = self.vertices[:, :3].reshape(len(self), self.vertices_per_instance, 3)
+        self.bounds = np.concatenate([pos.min(axis=1), pos.max(axis=1)], axis=1)
+        self.build_groups()
+
+    def build_groups(self):
+        # Caixa de cada grupo de INSTANCE_GROUP instâncias e o menor e o maior raio entre elas
+        starts = np.arange(0, len(self.bounds), INSTANCE_GROUP)
+        lo, hi = self.bounds[:, :3], self.bounds[:, 3:]
+        radius = np.linalg.norm(hi - lo, axis=1) / 2.0
+        if len(starts):
+            self.group_bounds = np.concatenate([np.minimum.reduceat(lo, starts), np.maximum.reduceat(hi, starts)], axis=1)
+            self.group_radii = np.stack([np.minimum.reduceat(radius, starts), np.maximum.reduceat(radius, starts)], axis=1)
+        else:
+            self.group_bounds, self.group_radii = np.zeros((0, 6)), np.zeros((0, 2))
+
+    def expand(self, groups):
+        # Máscara por grupo -> máscara por instância
+        return np.repeat(groups, INSTANCE_GROUP)[:len(self)]
+
+
+def expand_instances(unit, transforms, colors):
+    # Aplica todas as transformações de uma vez: (N, V, 3) vértices no mundo
+    pos = np.einsum('nij,vj->nvi', transforms[:, :3, :3], unit[:, :3]) + transforms[:, None, :3, 3]
+    col = unit[None, :, 3:] * colors[:, None, :]
+    out = np.empty((len(transforms), len(unit), VERTEX_FLOATS), dtype=np.float32)
+    out[..., :3], out[..., 3:] = pos, col
+    return out.reshape(-1, VERTEX_FLOATS)
+
+
+class PropInstances:
+    def __init__(self, namespace):
+        self.batches = {}
+        white = (1.0, 1.0, 1.0)
+        self.units = {
+            'cube': record_unit_mesh(namespace, namespace['draw_cube'], (0, 0, 0), (1, 1, 1), white),
+            'chair': record_unit_mesh(namespace, namespace['draw_chair'], (0, 0, 0), 0),
+        }
+
+    def add(self, name, unit, recorder, matrix, color, lean=0.0):
+        # Objetos com LOD são regravados a cada nível; as instâncias entram só uma vez
+        if recorder.lod_level > 0: return
+        key = batch_key(GL_TRIANGLES, recorder.cull, recorder.offset, 0.0)
+        batch = self.batches.get((name, key))
+        if batch is None:
+            batch = self.batches[(name, key)] = InstanceBatch(name, key, self.units[unit])
+        batch.add(recorder.matrix @ matrix, color, lean)
+
+    def overrides(self, recorder):
+        # Substitutos das funções de props: registram uma instância em vez de desenhar
+        def draw_book(bx, by, bz, w, h, d, color, lean_deg=0):
+            m = translation_matrix(bx, by + h/2.0, bz) @ rotation_matrix(lean_deg, 0, 0, 1) @ scale_matrix(w, h, d)
+            self.add('book', 'cube', recorder, m, color, lean_deg)
+
+        def draw_chair(center, rotation=0):
+            m = translation_matrix(*center) @ rotation_matrix(rotation, 0, 1, 0)
+            self.add('chair', 'chair', recorder, m, (1.0, 1.0, 1.0))
+
+        def cube_prop(name):
+            def draw(center, size, color):
+                self.add(name, 'cube', recorder, translation_matrix(*center) @ scale_matrix(*size), color)
+            return draw
+
+        return {'draw_book': draw_book, 'draw_chair': draw_chair,
+                'draw_balcony_post': cube_prop('balcony_post'),
+                'draw_window_mullion': cube_prop('window_mullion')}
+
+    def build(self, first):
+        out = []
+        for batch in self.batches.values():
+            batch.finalize()
+            batch.first = first
+            first += batch.count
+            out.append(batch)
+        return out
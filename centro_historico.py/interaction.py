@@ -0,0 +1,139 @@
+from OpenGL.GL import *
+import numpy as np
+from collision import CollisionWorld
+
+#  INTERAÇÃO
+# Tudo que responde à tecla E (porta, botão, livros, cadeiras, relógio) fica
+# num registro com as AABBs empacotadas no layout de CollisionWorld
+# (x_min, x_max, y_min, y_max, z_min, z_max). "O que estou olhando" é um único
+# teste de raio contra caixas (slab test) vetorizado ao longo de Camera.front:
+# a grade do CollisionWorld serve de pré-filtro, só as caixas das células ao
+# alcance do olho entram no teste. As paredes (o CollisionWorld da câmera)
+# bloqueiam o raio: nada se alcança através delas.
+
+INTERACTION_REACH = 2.5
+# Componentes da direção abaixo disso viram este valor (evita 0 * inf no slab test)
+RAY_EPS = 1e-12
+PROMPT_COLOR = (255, 255, 255)
+
+
+def ray_boxes(origin, direction, boxes):
+    # Distância de entrada do raio em cada caixa (0 com a origem dentro; inf se não acerta)
+    d = np.where(np.abs(direction) < RAY_EPS, RAY_EPS, direction)
+    inv = 1.0 / d
+    t1 = (boxes[:, [0, 2, 4]] - origin) * inv
+    t2 = (boxes[:, [1, 3, 5]] - origin) * inv
+    near = np.minimum(t1, t2).max(axis=1)
+    far = np.maximum(t1, t2).min(axis=1)
+    return np.where((near <= far) & (far >= 0), np.maximum(near, 0.0), np.inf)
+
+
+def box_from_bounds(bounds):
+    # (x_min, y_min, z_min, x_max, y_max, z_max) das malhas -> layout de CollisionWorld
+    b = np.asarray(bounds, dtype=float).reshape(-1, 6)
+    return b[:, [0, 3, 1, 4, 2, 5]]
+
+
+def box_from_matrix(matrix, center, size):
+    # AABB no mundo de uma caixa local (centro, tamanho) transformada por matrix 4x4
+    corners = np.array([[x, y, z] for x in (-0.5, 0.5) for y in (-0.5, 0.5) for z in (-0.5, 0.5)]) * size + center
+    world = corners @ np.asarray(matrix)[:3, :3].T + np.asarray(matrix)[:3, 3]
+    lo, hi = world.min(axis=0), world.max(axis=0)
+    return np.array([lo[0], hi[0], lo[1], hi[1], lo[2], hi[2]])
+
+
+class Interactable:
+    __slots__ = ('index', 'kind', 'item', 'label')
+
+    def __init__(self, index, kind, item, label):
+        # item: posição dentro do tipo (o n-ésimo livro, a n-ésima cadeira)
+        self.index, self.kind, self.item, self.label = index, kind, item, label
+
+
+class InteractionRegistry:
+    def __init__(self, blockers=None, reach=INTERACTION_REACH, cell_size=2.0):
+        self.world = CollisionWorld(cell_size=cell_size)
+        self.blockers = blockers
+        self.reach = reach
+        self.kinds, self.items, self.labels = [], [], []
+        self.actions = {}
+
+    def __len__(self):
+        return len(self.world)
+
+    def add(self, kind, boxes, labels, action=None):
+        # labels: um texto por caixa (o que aparece na tela ao olhar para ela)
+        indices = self.world.add(boxes)
+        labels = list(labels)
+        if len(labels) != len(indices): raise ValueError(f"{kind}: {len(indices)} caixas e {len(labels)} rótulos")
+        self.kinds += [kind] * len(indices)
+        self.items += range(len(indices))
+        self.labels += labels
+        if action is not None: self.actions[kind] = action
+        return indices
+
+    def indices(self, kind):
+        return np.nonzero(np.array(self.kinds) == kind)[0]
+
+    def move(self, indices, boxes, labels=None):
+        # Objetos que mudam de lugar ou de estado (folhas da porta); a ordem não muda
+        self.world.boxes[np.asarray(indices, dtype=int)] = np.asarray(boxes, dtype=float).reshape(-1, 6)
+        self.world.build()
+        if labels is not None:
+            for i, label in zip(indices, labels): self.labels[i] = label
+
+    def nearest(self, world, origin, direction):
+        # (índice, distância) da primeira caixa de world que o raio acerta dentro do alcance
+        if len(world) == 0: return -1, np.inf
+        _, candidates = world.candidates(origin[None], np.array([self.reach]))
+        if len(candidates) == 0: return -1, np.inf
+        candidates = np.unique(candidates)
+        t = ray_boxes(origin, direction, world.boxes[candidates])
+        best = int(np.argmin(t))
+        if t[best] > self.reach: return -1, np.inf
+        return int(candidates[best]), float(t[best])
+
+    def pick(self, eye, front):
+        # O interagível na mira, ou None
+        eye, front = np.asarray(eye, dtype=float), np.asarray(front, dtype=float)
+        index, t = self.nearest(self.world, eye, front)
+        if index < 0: return None
+        if self.blockers is not None and self.nearest(self.blockers, eye, front)[1] < t: return None
+        return Interactable(index, self.kinds[index], self.items[index], self.labels[index])
+
+    def interact(self, target):
+        # Ação registrada para o tipo; sem ação, o rótulo vai para o terminal
+        if target is None: return
+        action = self.actions.get(target.kind)
+        if action is not None: action(target)
+        else: print(target.label)
+
+
+class InteractionPrompt:
+    # Rótulo do interagível na mira, centralizado abaixo da mira; a imagem só muda com o texto
+    def __init__(self):
+        self.font, self.text, self.image, self.size = None, None, None, (0, 0)
+
+    def refresh(self, text):
+        import pygame
+        if self.font is None:
+            pygame.font.init()
+            self.font = pygame.font.SysFont('monospace', 16)
+        surface = self.font.render(text, True, PROMPT_COLOR)
+        panel = pygame.Surface((surface.get_width() + 12, surface.get_height() + 8), pygame.SRCALPHA)
+        panel.fill((0, 0, 0, 150))
+        panel.blit(surface, (6, 4))
+        self.text, self.size = text, panel.get_size()
+        self.image = pygame.image.tostring(panel, 'RGBA', True)
+
+    def draw(self, target, width, height):
+        if target is None: return
+        text = f"E: {target.label}"
+        if text != self.text: self.refresh(text)
+        w, h = self.size
+        glPushAttrib(GL_ENABLE_BIT | GL_COLOR_BUFFER_BIT)
+        glDisable(GL_DEPTH_TEST); glDisable(GL_CULL_FACE)
+        glEnable(GL_BLEND); glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+        glWindowPos2i((width - w) // 2, height // 2 - h - 24)
+        glDrawPixels(w, h, GL_RGBA, GL_UNSIGNED_BYTE, self.image)
+        glPopAttrib()
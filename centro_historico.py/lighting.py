@@ -0,0 +1,274 @@
+import os
+import copy
+import multiprocessing
+import numpy as np
+from OpenGL.GL import GL_TRIANGLES
+from geometry import Mesh, Batch
+
+#  ILUMINAÇÃO PRÉ-CALCULADA
+# Oclusão ambiente e sol por vértice, multiplicadas nas cores das malhas na
+# hora do bake (bake.py): o desenho continua com cores por vértice, sem custo
+# extra por quadro. Triângulos grandes são subdivididos antes, para a luz ter
+# onde variar. Os raios de cada célula de uma grade são testados em lote
+# (Möller–Trumbore em NumPy) só contra os triângulos próximos, e as células
+# são divididas entre os processos de um multiprocessing.Pool.
+
+# Aresta máxima depois da subdivisão e lado da célula da grade (m)
+LIGHT_MAX_EDGE = 2.0
+LIGHT_CELL = 0.5
+AO_RAYS = 12
+AO_DISTANCE = 0.35
+AO_STRENGTH = 0.6
+# Céu + sol nas cenas ao ar livre; dentro, só a oclusão sobre luz 1.0
+SKY_INTENSITY, SUN_INTENSITY = 0.7, 0.45
+SUN_DISTANCE = 25.0
+RAY_EPS = 2e-3
+# Pares raio x triângulo por teste vetorizado
+RAY_BLOCK = 1 << 20
+
+
+def hemisphere_directions(n):
+    # Direções fixas com distribuição de cosseno em torno de +Z (espiral de Fibonacci)
+    i = np.arange(n) + 0.5
+    r = np.sqrt(i / n)
+    a = i * np.pi * (3.0 - np.sqrt(5.0))
+    return np.column_stack([r * np.cos(a), r * np.sin(a), np.sqrt(1.0 - r*r)])
+
+
+def cross(a, b):
+    # np.cross para (N, 3), sem o custo fixo dele em arrays pequenos
+    return a[:, [1, 2, 0]] * b[:, [2, 0, 1]] - a[:, [2, 0, 1]] * b[:, [1, 2, 0]]
+
+
+def tangent_frames(normals):
+    # (N, 3, 3): linhas = tangente, bitangente, normal
+    helper = np.where(np.abs(normals[:, [0]]) < 0.9, [[1.0, 0.0, 0.0]], [[0.0, 1.0, 0.0]])
+    t = cross(np.broadcast_to(helper, normals.shape), normals)
+    t /= np.linalg.norm(t, axis=1, keepdims=True)
+    return np.stack([t, cross(normals, t), normals], axis=1)
+
+
+#  TRIÂNGULOS
+def triangle_ranges(mesh):
+    # Faixas (início, vértices) de triângulos: lotes de GL_TRIANGLES e props instanciados
+    ranges = [(b.first, b.count) for b in mesh.batches if b.key[0] == GL_TRIANGLES]
+    return ranges + [(b.first, b.count) for b in mesh.instances if b.key[0] == GL_TRIANGLES]
+
+
+def mesh_triangles(mesh):
+    parts = [mesh.vertices[first:first + count, :3] for first, count in triangle_ranges(mesh)]
+    if not parts: return np.zeros((0, 3, 3))
+    return np.concatenate(parts).astype(float).reshape(-1, 3, 3)
+
+
+def subdivide(tris, max_edge):
+    # (N, 3, 6) -> triângulos com todas as arestas <= max_edge, partindo a maior ao meio
+    done = []
+    while len(tris):
+        edges = np.linalg.norm(tris[:, [1, 2, 0], :3] - tris[:, :, :3], axis=2)
+        longest = edges.argmax(axis=1)
+        split = edges[np.arange(len(tris)), longest] > max_edge
+        done.append(tris[~split])
+        t, k = tris[split], longest[split]
+        if not len(t): break
+        # Vértices rotacionados para a maior aresta ficar entre 0 e 1
+        order = (np.arange(3)[None, :] + k[:, None]) % 3
+        t = np.take_along_axis(t, order[:, :, None], axis=1)
+        mid = (t[:, 0] + t[:, 1]) / 2
+        tris = np.concatenate([np.stack([t[:, 0], mid, t[:, 2]], axis=1), np.stack([mid, t[:, 1], t[:, 2]], axis=1)])
+    return np.concatenate(done) if done else tris
+
+
+def subdivided_mesh(mesh, max_edge):
+    # Subdivide os lotes de triângulos (não os instanciados) e refaz as faixas
+    parts, batches, first = [], [], 0
+    for b in mesh.batches:
+        nb = Batch(b.key, first, 0)
+        nb.object_ids, firsts, counts = b.object_ids, [], []
+        for f, c in zip(b.firsts, b.counts):
+            data = mesh.vertices[f:f + c]
+            if b.key[0] == GL_TRIANGLES: data = subdivide(data.astype(float).reshape(-1, 3, data.shape[1]), max_edge).reshape(-1, data.shape[1])
+            parts.append(data.astype(np.float32)); firsts.append(first); counts.append(len(data))
+            first += len(data)
+        nb.firsts, nb.counts = np.array(firsts, dtype=np.int32), np.array(counts, dtype=np.int32)
+        nb.count = first - nb.first
+        batches.append(nb)
+    instances = []
+    for b in mesh.instances:
+        parts.append(np.asarray(mesh.vertices[b.first:b.first + b.count]))
+        b = copy.copy(b)
+        b.first = first
+        instances.append(b)
+        first += b.count
+    vertices = np.ascontiguousarray(np.concatenate(parts), dtype=np.float32) if parts else mesh.vertices.copy()
+    return Mesh(vertices, batches, instances, mesh.object_names, mesh.object_bounds, mesh.object_lods,
+                mesh.object_groups, mesh.group_bounds, mesh.textured_vertices, mesh.textured,
+                solids=mesh.solids, solid_objects=mesh.solid_objects)
+
+
+#  RAIOS
+def triangle_terms(tris):
+    # Möller–Trumbore com o produto misto expandido: det, u, v e t (sem dividir) de cada par
+    # raio x triângulo saem de um só produto de matrizes (R, 10) @ (10, 4T)
+    a = tris[:, 0]; e1 = tris[:, 1] - a; e2 = tris[:, 2] - a
+    n = cross(e1, e2)
+    m = np.zeros((10, 4, len(tris)))
+    m[3:6, 0] = -n.T
+    m[0:3, 1], m[3:6, 1] = e2.T, -cross(e2, a).T
+    m[0:3, 2], m[3:6, 2] = -e1.T, -cross(a, e1).T
+    m[6:9, 3], m[9, 3] = n.T, -np.einsum('tk,tk->t', e2, cross(a, e1))
+    return m
+
+
+def any_hit(origins, dirs, tmax, terms):
+    # terms: triangle_terms dos triângulos; True para os raios que acertam algum entre RAY_EPS e tmax
+    count = terms.shape[2]
+    hit = np.zeros(len(origins), dtype=bool)
+    if not count or not len(origins): return hit
+    m = terms.reshape(10, -1)
+    step = max(1, RAY_BLOCK // count)
+    for s in range(0, len(origins), step):
+        o, d = origins[s:s + step], dirs[s:s + step]
+        rays = np.hstack([cross(o, d), d, o, np.ones((len(o), 1))])
+        det, u, v, t = (rays @ m).reshape(len(o), 4, count).transpose(1, 0, 2)
+        sign = np.sign(det)
+        det = np.abs(det)
+        u *= sign; v *= sign; t *= sign
+        hit[s:s + step] = ((det > 1e-12) & (u >= 0) & (v >= 0) & (u + v <= det)
+                           & (t > RAY_EPS * det) & (t < tmax * det)).any(axis=1)
+    return hit
+
+
+def nearby(lo, hi, tri_lo, tri_hi):
+    return np.nonzero((tri_lo <= hi).all(axis=1) & (tri_hi >= lo).all(axis=1))[0]
+
+
+def sun_box(lo, hi, sun):
+    # Caixa varrida pelos raios de sombra de tudo que está em lo..hi
+    return np.minimum(lo, lo + sun * SUN_DISTANCE), np.maximum(hi, hi + sun * SUN_DISTANCE)
+
+
+OCCLUDERS = None
+
+
+def init_worker(occluders):
+    # Triângulos de cada malha, enviados uma vez por processo
+    global OCCLUDERS
+    OCCLUDERS = [(triangle_terms(t), t.min(axis=1), t.max(axis=1)) for t in occluders]
+
+
+def candidates(index, lo, hi, margin, sun):
+    terms, tri_lo, tri_hi = OCCLUDERS[index]
+    if sun is not None: lo, hi = sun_box(lo, hi, sun)
+    near = nearby(lo - margin, hi + margin, tri_lo, tri_hi)
+    return terms[:, :, near], tri_lo[near], tri_hi[near]
+
+
+def shade(task):
+    # Luz (V,) dos vértices de um grupo de células; normal virada para o lado menos ocluído
+    index, sun, cells, positions, normals = task
+    dirs = hemisphere_directions(AO_RAYS)
+    light = np.ones(len(positions))
+    # Triângulos ao alcance do grupo inteiro; cada célula filtra só entre eles
+    lo, hi = positions.min(axis=0), positions.max(axis=0)
+    ao = candidates(index, lo, hi, AO_DISTANCE, None)
+    shadow_set = candidates(index, lo, hi, 0.0, sun) if sun is not None else None
+    for cell in cells:
+        p, n = positions[cell], normals[cell]
+        lo, hi = p.min(axis=0), p.max(axis=0)
+        near = ao[0][:, :, nearby(lo - AO_DISTANCE, hi + AO_DISTANCE, *ao[1:])]
+        occlusion = []
+        for side in (n, -n):
+            world = np.einsum('rk,vkj->vrj', dirs, tangent_frames(side)).reshape(-1, 3)
+            origins = np.repeat(p + side * RAY_EPS, AO_RAYS, axis=0)
+            occlusion.append(any_hit(origins, world, AO_DISTANCE, near).reshape(-1, AO_RAYS).mean(axis=1))
+        flip = occlusion[1] < occlusion[0]
+        occ = np.where(flip, occlusion[1], occlusion[0])
+        n = np.where(flip[:, None], -n, n)
+        if sun is None:
+            light[cell] = 1.0 - AO_STRENGTH * occ
+            continue
+        lambert = np.clip(n @ sun, 0.0, None)
+        lit = lambert > 0
+        far_lo, far_hi = sun_box(lo, hi, sun)
+        far = shadow_set[0][:, :, nearby(far_lo, far_hi, *shadow_set[1:])]
+        shadow = np.zeros(len(p), dtype=bool)
+        shadow[lit] = any_hit(p[lit] + n[lit] * RAY_EPS, np.broadcast_to(sun, (int(lit.sum()), 3)), SUN_DISTANCE, far)
+        light[cell] = SKY_INTENSITY * (1.0 - AO_STRENGTH * occ) + SUN_INTENSITY * lambert * ~shadow
+    return light
+
+
+def light_tasks(index, sun, positions, normals, size=4096):
+    # Grupos de células com cerca de size vértices cada
+    # Células ordenadas por blocos de 8x8x8, para cada grupo ficar compacto no espaço
+    keys = np.floor(positions / LIGHT_CELL).astype(np.int64)
+    _, inverse = np.unique(np.hstack([keys // 8, keys]), axis=0, return_inverse=True)
+    order = np.argsort(inverse.ravel(), kind='stable')
+    bounds = np.flatnonzero(np.diff(inverse.ravel()[order])) + 1
+    cells = np.split(order, bounds)
+    tasks, group, count = [], [], 0
+    for cell in cells:
+        group.append(cell); count += len(cell)
+        if count >= size:
+            tasks.append(group); group, count = [], 0
+    if group: tasks.append(group)
+    out = []
+    for group in tasks:
+        idx = np.concatenate(group)
+        local, start = [], 0
+        for cell in group:
+            local.append(np.arange(start, start + len(cell))); start += len(cell)
+        out.append((idx, (index, sun, local, positions[idx], normals[idx])))
+    return out
+
+
+class Lighting:
+    # sun_direction: vetor apontando para o sol; sunlit: nomes das cenas ao ar livre
+    def __init__(self, sun_direction, sunlit=(), processes=None):
+        d = np.asarray(sun_direction, dtype=float)
+        self.sun = d / np.linalg.norm(d)
+        self.sunlit = set(sunlit)
+        self.processes = processes or os.cpu_count() or 1
+
+    def apply(self, scenes, progress=None):
+        # scenes: [(nome, malha)]; cada malha recebe sombra das outras cenas (primeira variante de
+        # cada nome) e de si mesma. Devolve as malhas subdivididas e iluminadas, na mesma ordem
+        # progress(fração): opcional, chamado a cada grupo de células pronto
+        first = {}
+        for name, mesh in scenes:
+            first.setdefault(name, mesh_triangles(mesh))
+        occluders, meshes, tasks, groups = [], [], [], []
+        for i, (name, mesh) in enumerate(scenes):
+            others = [t for n, t in first.items() if n != name]
+            occluders.append(np.concatenate([mesh_triangles(mesh)] + others))
+            mesh = subdivided_mesh(mesh, LIGHT_MAX_EDGE)
+            meshes.append(mesh)
+            idx = np.concatenate([np.arange(f, f + c) for f, c in triangle_ranges(mesh)] or [np.zeros(0, dtype=int)])
+            tris = mesh.vertices[idx, :3].astype(float).reshape(-1, 3, 3)
+            normals = np.cross(tris[:, 1] - tris[:, 0], tris[:, 2] - tris[:, 0])
+            length = np.linalg.norm(normals, axis=1, keepdims=True)
+            normals = np.repeat(normals / np.maximum(length, 1e-12), 3, axis=0)
+            # Cantos com a mesma posição e normal (quads, malhas subdivididas) recebem a mesma luz
+            corners = np.hstack([tris.reshape(-1, 3), normals])
+            _, unique, inverse = np.unique(np.round(corners * 1e4).astype(np.int64), axis=0, return_index=True, return_inverse=True)
+            sun = self.sun if name in self.sunlit else None
+            groups.append((i, idx, len(unique), inverse.ravel()))
+            tasks += [(i, local, task) for local, task in light_tasks(i, sun, corners[unique, :3], corners[unique, 3:])]
+        results = []
+        if self.processes > 1:
+            with multiprocessing.get_context('spawn').Pool(self.processes, init_worker, (occluders,)) as pool:
+                for light in pool.imap(shade, [t for _, _, t in tasks]):
+                    results.append(light)
+                    if progress is not None: progress(len(results) / len(tasks))
+        else:
+            init_worker(occluders)
+            for _, _, task in tasks:
+                results.append(shade(task))
+                if progress is not None: progress(len(results) / len(tasks))
+        lights = [np.ones(count) for _, _, count, _ in groups]
+        for (i, local, _), light in zip(tasks, results):
+            lights[i][local] = light
+        for (i, idx, _, inverse), light in zip(groups, lights):
+            colors = meshes[i].vertices[idx, 3:]
+            meshes[i].vertices[idx, 3:] = np.clip(colors * light[inverse][:, None], 0.0, 1.0)
+        return meshes
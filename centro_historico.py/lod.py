@@ -0,0 +1,59 @@
+import numpy as np
+
+#  NÍVEL DE DETALHE (LOD)
+# Objetos tesselados (arcos, janelas, mesas redondas) são compilados uma vez
+# por nível, com cada vez menos fatias, e o desenho escolhe um nível por
+# objeto a partir do tamanho projetado na tela, em pixels da altura do
+# viewport: numa janela menor os níveis grossos entram mais cedo. A troca de
+# nível tem uma margem (histerese) para não piscar perto do limiar. Relógio e
+# quadro são texturas: os mipmaps fazem esse papel.
+
+# Fração das fatias originais em cada nível (0 = detalhe total)
+LOD_SCALES = (1.0, 0.5, 0.25)
+LOD_LEVELS = len(LOD_SCALES)
+LOD_MIN_SLICES = 6
+# Raio projetado (pixels) abaixo do qual cada nível passa ao seguinte
+LOD_THRESHOLDS = (54.0, 18.0)
+# Props pequenos (livros) deixam de ser desenhados abaixo desse raio projetado (pixels)
+LOD_HIDE_BELOW = 5.0
+# Altura do viewport quando o frustum não informa a sua
+LOD_REFERENCE_HEIGHT = 720
+# Margem relativa em torno de cada limiar
+LOD_HYSTERESIS = 0.2
+
+
+def lod_slices(slices, level):
+    if level <= 0: return slices
+    return max(LOD_MIN_SLICES, int(round(slices * LOD_SCALES[min(level, LOD_LEVELS - 1)])))
+
+
+def projected_sizes(bounds, eye, tan_half_fov, view_height=None):
+    # Raio em pixels da esfera envolvente de cada caixa (N, 6) vista de eye, num viewport de
+    # view_height pixels; câmera dentro da esfera = tamanho máximo (meia altura da tela)
+    bounds = np.asarray(bounds, dtype=float).reshape(-1, 6)
+    lo, hi = bounds[:, :3], bounds[:, 3:]
+    radius = np.linalg.norm(hi - lo, axis=1) / 2.0
+    dist = np.linalg.norm((lo + hi) / 2.0 - eye, axis=1)
+    half = 0.5 * (view_height or LOD_REFERENCE_HEIGHT)
+    return half * radius / (np.maximum(dist, np.maximum(radius, 1e-6)) * tan_half_fov)
+
+
+def projected_size_range(bounds, radii, eye, tan_half_fov, view_height=None):
+    # Menor e maior raio projetado possível de caixas com raios entre radii[:, 0] e radii[:, 1] cujo
+    # centro está dentro de bounds (N, 6): o mesmo cálculo de projected_sizes nas distâncias extremas
+    bounds = np.asarray(bounds, dtype=float).reshape(-1, 6)
+    lo, hi = bounds[:, :3] - eye, bounds[:, 3:] - eye
+    near = np.linalg.norm(np.maximum(np.maximum(lo, -hi), 0.0), axis=1)
+    far = np.linalg.norm(np.maximum(np.abs(lo), np.abs(hi)), axis=1)
+    half = 0.5 * (view_height or LOD_REFERENCE_HEIGHT)
+    r0, r1 = radii[:, 0], radii[:, 1]
+    return (half * r0 / (np.maximum(far, np.maximum(r0, 1e-6)) * tan_half_fov),
+            half * r1 / (np.maximum(near, np.maximum(r1, 1e-6)) * tan_half_fov))
+
+
+def select_levels(current, sizes, thresholds, hysteresis=LOD_HYSTERESIS):
+    # Só engrossa abaixo de limiar*(1-h) e só refina acima de limiar*(1+h)
+    t = np.asarray(thresholds, dtype=float)
+    coarsest = (sizes[:, None] < t * (1.0 + hysteresis)).sum(axis=1)
+    finest = (sizes[:, None] < t * (1.0 - hysteresis)).sum(axis=1)
+    return np.clip(current, finest, coarsest)
@@ -0,0 +1,298 @@
+import math
+import heapq
+import numpy as np
+from OpenGL.GL import GL_TRIANGLES
+from geometry import compile_geometry
+from simulation import PLAYER_HEIGHT
+
+#  CHÃO E NAVEGAÇÃO
+# No bake, as superfícies onde se anda (chão, rampa, piso de madeira: as
+# funções listadas em WALKABLE_SURFACES do centro.py) são gravadas pelo
+# GeometryRecorder e rasterizadas numa grade de alturas em XZ, com a altura
+# nos cantos das células (a maior superfície que cobre cada canto). Entre os
+# cantos a altura é interpolada: a rampa fica lisa e a consulta é O(1) para
+# qualquer número de posições. Uma célula é andável quando tem superfície nos
+# quatro cantos, desnível de no máximo MAX_STEP e nenhum colisor no corpo do
+# jogador acima dela. Blocos de NAV_NODE x NAV_NODE células andáveis viram os
+# nós de uma navmesh grossa, ligados aos vizinhos quando a reta entre eles só
+# passa por células andáveis. Uma grade só guarda um andar (o mais alto).
+
+NAV_CELL = 0.25
+NAV_NODE = 4
+# Triângulos mais inclinados que isso não são chão
+MAX_SLOPE = 40.0
+# Desnível que se vence andando, entre cantos de uma célula e entre amostras de uma ligação
+MAX_STEP = 0.35
+# Tolerância do teste de "canto dentro do triângulo" (bordas coladas entre superfícies)
+RASTER_EPS = 1e-6
+# Fora da grade ou sem superfície: o chão plano de antes
+DEFAULT_GROUND = 0.0
+
+
+def surface_triangles(mesh, names):
+    # (T, 3, 3) triângulos dos objetos names de uma malha compilada (lotes de cor e quads texturizados)
+    wanted = np.isin(np.array(mesh.object_names), names)
+    parts = []
+    # A chave dos lotes texturizados é a textura: todos são triângulos
+    batches = [(mesh.vertices, b) for b in mesh.batches if b.key[0] == GL_TRIANGLES]
+    for vertices, b in batches + [(mesh.textured_vertices, b) for b in mesh.textured]:
+        for oid, f, c in zip(b.object_ids, b.firsts, b.counts):
+            if wanted[oid]: parts.append(np.asarray(vertices[f:f + c, :3], dtype=float))
+    return np.concatenate(parts).reshape(-1, 3, 3) if parts else np.zeros((0, 3, 3))
+
+
+def rasterize(triangles, origin, shape, cell):
+    # Altura (nz + 1, nx + 1) nos cantos das células: a maior entre os triângulos que cobrem o canto, -inf sem nenhum
+    nz, nx = shape
+    heights = np.full((nz + 1, nx + 1), -np.inf)
+    for tri in triangles:
+        xz = tri[:, [0, 2]]
+        i0 = np.maximum(np.ceil((xz.min(axis=0) - origin) / cell - RASTER_EPS).astype(int), 0)
+        i1 = np.minimum(np.floor((xz.max(axis=0) - origin) / cell + RASTER_EPS).astype(int), (nx, nz))
+        if (i1 < i0).any(): continue
+        gx, gz = np.meshgrid(origin[0] + cell * np.arange(i0[0], i1[0] + 1), origin[1] + cell * np.arange(i0[1], i1[1] + 1))
+        # Coordenadas baricêntricas no plano XZ
+        (ax, az), (bx, bz), (cx, cz) = xz
+        det = (bz - cz) * (ax - cx) + (cx - bx) * (az - cz)
+        w0 = ((bz - cz) * (gx - cx) + (cx - bx) * (gz - cz)) / det
+        w1 = ((cz - az) * (gx - cx) + (ax - cx) * (gz - cz)) / det
+        w2 = 1.0 - w0 - w1
+        inside = (w0 >= -RASTER_EPS) & (w1 >= -RASTER_EPS) & (w2 >= -RASTER_EPS)
+        h = np.where(inside, w0 * tri[0, 1] + w1 * tri[1, 1] + w2 * tri[2, 1], -np.inf)
+        view = heights[i0[1]:i1[1] + 1, i0[0]:i1[0] + 1]
+        np.maximum(view, h, out=view)
+    return heights
+
+
+class HeightGrid:
+    def __init__(self, origin, cell, heights, walkable):
+        # origin: (x, z) do canto (0, 0); heights: (nz + 1, nx + 1) nos cantos; walkable: (nz, nx) por célula
+        self.origin = np.asarray(origin, dtype=float)
+        self.cell = float(cell)
+        self.heights = heights
+        self.walkable = walkable
+
+    @property
+    def shape(self):
+        return self.walkable.shape
+
+    @classmethod
+    def from_triangles(cls, triangles, colliders=(), radius=0.0, height=PLAYER_HEIGHT, cell=NAV_CELL):
+        # colliders: caixas no layout de CollisionWorld; radius/height: corpo de quem anda
+        tris = np.asarray(triangles, dtype=float).reshape(-1, 3, 3)
+        normals = np.cross(tris[:, 1] - tris[:, 0], tris[:, 2] - tris[:, 0])
+        length = np.linalg.norm(normals, axis=1)
+        tris = tris[np.abs(normals[:, 1]) >= np.cos(np.radians(MAX_SLOPE)) * np.maximum(length, 1e-12)]
+        if len(tris) == 0: raise ValueError("nenhuma superfície andável")
+        lo = np.floor(tris[:, :, [0, 2]].min(axis=(0, 1)) / cell) * cell
+        hi = np.ceil(tris[:, :, [0, 2]].max(axis=(0, 1)) / cell) * cell
+        nx, nz = np.round((hi - lo) / cell).astype(int)
+        corners = rasterize(tris, lo, (nz, nx), cell)
+        quad = np.stack([corners[:-1, :-1], corners[:-1, 1:], corners[1:, :-1], corners[1:, 1:]])
+        walkable = np.isfinite(quad).all(axis=0) & (quad.max(axis=0) - quad.min(axis=0) <= MAX_STEP)
+        heights = np.where(np.isfinite(corners), corners, DEFAULT_GROUND).astype(np.float32)
+        grid = cls(lo, cell, heights, walkable)
+        grid.block(colliders, radius, height)
+        return grid
+
+    def block(self, colliders, radius, height):
+        # Células com colisor entre MAX_STEP e height acima do chão, a menos de radius do centro
+        boxes = np.asarray(colliders, dtype=float).reshape(-1, 6)
+        nz, nx = self.shape
+        cx = self.origin[0] + self.cell * (np.arange(nx) + 0.5)
+        cz = self.origin[1] + self.cell * (np.arange(nz) + 0.5)
+        ground = self.height_at(*np.meshgrid(cx, cz))
+        for x0, x1, y0, y1, z0, z1 in boxes:
+            ix = np.nonzero((cx > x0 - radius) & (cx < x1 + radius))[0]
+            iz = np.nonzero((cz > z0 - radius) & (cz < z1 + radius))[0]
+            if len(ix) == 0 or len(iz) == 0: continue
+            g = ground[np.ix_(iz, ix)]
+            hit = (y1 > g + MAX_STEP) & (y0 < g + height)
+            self.walkable[np.ix_(iz, ix)] &= ~hit
+
+    def locate(self, x, z):
+        # Célula (iz, ix), frações dentro dela e se a posição cai na grade
+        u = (np.asarray(x, dtype=float) - self.origin[0]) / self.cell
+        v = (np.asarray(z, dtype=float) - self.origin[1]) / self.cell
+        nz, nx = self.shape
+        inside = (u >= 0) & (u < nx) & (v >= 0) & (v < nz)
+        ix = np.clip(np.floor(u).astype(np.int64), 0, nx - 1)
+        iz = np.clip(np.floor(v).astype(np.int64), 0, nz - 1)
+        return iz, ix, np.clip(u - ix, 0, 1), np.clip(v - iz, 0, 1), inside
+
+    def height_at(self, x, z):
+        # Altura do chão em (x, z): bilinear entre os cantos da célula
+        iz, ix, fu, fv, inside = self.locate(x, z)
+        h = self.heights
+        top = h[iz, ix] * (1 - fu) + h[iz, ix + 1] * fu
+        bottom = h[iz + 1, ix] * (1 - fu) + h[iz + 1, ix + 1] * fu
+        return np.where(inside, top * (1 - fv) + bottom * fv, DEFAULT_GROUND)
+
+    def height_at_point(self, x, z):
+        # height_at para um ponto só, sem arrays (a câmera, a cada passo)
+        u, v = (x - self.origin[0]) / self.cell, (z - self.origin[1]) / self.cell
+        nz, nx = self.shape
+        if not (0 <= u < nx and 0 <= v < nz): return DEFAULT_GROUND
+        ix, iz = int(u), int(v)
+        fu, fv, h = u - ix, v - iz, self.heights
+        top = h[iz, ix] * (1 - fu) + h[iz, ix + 1] * fu
+        bottom = h[iz + 1, ix] * (1 - fu) + h[iz + 1, ix + 1] * fu
+        return float(top * (1 - fv) + bottom * fv)
+
+    def walkable_at(self, x, z):
+        iz, ix, _, _, inside = self.locate(x, z)
+        return inside & self.walkable[iz, ix]
+
+    def segment_walkable(self, a, b):
+        # a, b: (N, 3) extremos; True se as amostras a cada meia célula caem em células andáveis.
+        # Degraus não precisam de teste à parte: a célula que contém um degrau já não é andável
+        a, b = np.atleast_2d(a)[:, [0, 2]], np.atleast_2d(b)[:, [0, 2]]
+        steps = max(int(np.ceil(np.linalg.norm(b - a, axis=1).max(initial=0) / (0.5 * self.cell))), 1)
+        t = np.linspace(0.0, 1.0, steps + 1)
+        points = a[:, None] + (b - a)[:, None] * t[None, :, None]
+        return self.walkable_at(points[..., 0], points[..., 1]).all(axis=1)
+
+    def to_arrays(self, prefix, arrays):
+        arrays[prefix + 'heights'] = self.heights
+        arrays[prefix + 'walkable'] = self.walkable
+        return {'origin': self.origin.tolist(), 'cell': self.cell}
+
+    @classmethod
+    def from_arrays(cls, prefix, meta, arrays):
+        return cls(meta['origin'], meta['cell'], arrays[prefix + 'heights'], np.asarray(arrays[prefix + 'walkable']))
+
+
+class NavGraph:
+    # Nós (N, 3) e ligações em CSR: neighbors[offsets[i]:offsets[i + 1]] com os custos (distância)
+    def __init__(self, grid, positions, offsets, neighbors, costs, cell_nodes):
+        self.grid = grid
+        self.positions, self.offsets, self.neighbors, self.costs = positions, offsets, neighbors, costs
+        # (nz, nx): nó de cada célula andável, -1 nas outras
+        self.cell_nodes = cell_nodes
+        self.fields = {}
+
+    def __len__(self):
+        return len(self.positions)
+
+    @classmethod
+    def from_grid(cls, grid, node=NAV_NODE):
+        nz, nx = grid.shape
+        iz, ix = np.nonzero(grid.walkable)
+        block = (iz // node) * (-(-nx // node)) + ix // node
+        blocks, cell_node = np.unique(block, return_inverse=True)
+        cell_node = cell_node.ravel()
+        x = grid.origin[0] + grid.cell * (ix + 0.5)
+        z = grid.origin[1] + grid.cell * (iz + 0.5)
+        # Representante de cada nó: a célula andável mais perto do centro das andáveis do bloco
+        count = np.bincount(cell_node)
+        mx, mz = np.bincount(cell_node, x) / count, np.bincount(cell_node, z) / count
+        order = np.lexsort(((x - mx[cell_node])**2 + (z - mz[cell_node])**2, cell_node))
+        first = order[np.searchsorted(cell_node[order], np.arange(len(blocks)))]
+        positions = np.column_stack([x[first], grid.height_at(x[first], z[first]), z[first]])
+        # Ligações candidatas: os 8 blocos vizinhos que também são nós
+        cols = -(-nx // node)
+        bz, bx = blocks // cols, blocks % cols
+        pairs = []
+        for dz in (-1, 0, 1):
+            for dx in (-1, 0, 1):
+                if dz == dx == 0: continue
+                other = (bz + dz) * cols + (bx + dx)
+                valid = (bx + dx >= 0) & (bx + dx < cols) & (bz + dz >= 0)
+                j = np.searchsorted(blocks, other)
+                found = valid & (j < len(blocks)) & (blocks[np.minimum(j, len(blocks) - 1)] == other)
+                pairs.append(np.column_stack([np.nonzero(found)[0], j[found]]))
+        pairs = np.concatenate(pairs)
+        pairs = pairs[grid.segment_walkable(positions[pairs[:, 0]], positions[pairs[:, 1]])]
+        pairs = pairs[np.lexsort((pairs[:, 1], pairs[:, 0]))]
+        offsets = np.searchsorted(pairs[:, 0], np.arange(len(blocks) + 1)).astype(np.int64)
+        costs = np.linalg.norm(positions[pairs[:, 1]] - positions[pairs[:, 0]], axis=1).astype(np.float32)
+        cell_nodes = np.full((nz, nx), -1, dtype=np.int32)
+        cell_nodes[iz, ix] = cell_node
+        return cls(grid, positions, offsets, pairs[:, 1].astype(np.int32), costs, cell_nodes)
+
+    def node_at(self, x, z):
+        # Nó da célula de cada posição (-1 fora do andável)
+        iz, ix, _, _, inside = self.grid.locate(x, z)
+        return np.where(inside, self.cell_nodes[iz, ix], -1)
+
+    def path(self, start, goal):
+        # A* entre os nós de start e goal; (K, 3) pontos no chão de start a goal, sem os nós que a reta
+        # dispensa, ou None se não há caminho
+        start, goal = np.asarray(start, dtype=float), np.asarray(goal, dtype=float)
+        s, g = int(self.node_at(start[0], start[2])), int(self.node_at(goal[0], goal[2]))
+        if s < 0 or g < 0: return None
+        # Listas do Python no laço: indexar arrays do NumPy item a item custa mais que a busca
+        pos, offsets = self.positions.tolist(), self.offsets.tolist()
+        neighbors, costs = self.neighbors.tolist(), self.costs.tolist()
+        target = pos[g]
+        best, came = {s: 0.0}, {s: -1}
+        heap = [(math.dist(pos[s], target), 0.0, s)]
+        while heap:
+            _, d, u = heapq.heappop(heap)
+            if u == g: break
+            if d > best[u]: continue
+            for k in range(offsets[u], offsets[u + 1]):
+                v, nd = neighbors[k], d + costs[k]
+                if nd < best.get(v, math.inf):
+                    best[v], came[v] = nd, u
+                    heapq.heappush(heap, (nd + math.dist(pos[v], target), nd, v))
+        if g not in came: return None
+        nodes = [g]
+        while came[nodes[-1]] >= 0: nodes.append(came[nodes[-1]])
+        points = np.vstack([start, self.positions[nodes[::-1]], goal])
+        points[:, 1] = self.grid.height_at(points[:, 0], points[:, 2])
+        return self.smooth(points)
+
+    def smooth(self, points):
+        # Pula pontos enquanto a reta do último ponto mantido até o seguinte é andável
+        kept, i = [0], 0
+        while i < len(points) - 1:
+            j = len(points) - 1
+            while j > i + 1 and not self.grid.segment_walkable(points[i], points[j])[0]: j -= 1
+            kept.append(j)
+            i = j
+        return points[kept]
+
+    def next_nodes(self, goal):
+        # Campo de fluxo até o nó goal (Dijkstra a partir dele): próximo nó de cada nó, -1 no alvo e sem caminho.
+        # Guardado por alvo: muitos andantes com o mesmo destino consultam só um array
+        if goal in self.fields: return self.fields[goal]
+        dist = [math.inf] * len(self)
+        dist[goal] = 0.0
+        heap = [(0.0, goal)]
+        offsets, neighbors, costs = self.offsets.tolist(), self.neighbors.tolist(), self.costs.tolist()
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]: continue
+            for k in range(offsets[u], offsets[u + 1]):
+                v, nd = neighbors[k], d + costs[k]
+                if nd < dist[v]:
+                    dist[v] = nd
+                    heapq.heappush(heap, (nd, v))
+        # Para cada nó, a ligação com menor custo + distância do vizinho ao alvo
+        neighbors, offsets = self.neighbors, self.offsets
+        through = self.costs + np.array(dist)[neighbors]
+        owner = np.repeat(np.arange(len(self)), np.diff(offsets))
+        order = np.lexsort((through, owner))
+        best = order[np.r_[True, owner[order][1:] != owner[order][:-1]]] if len(order) else order
+        best = best[np.isfinite(through[best])]
+        nxt = np.full(len(self), -1, dtype=np.int32)
+        nxt[owner[best]] = neighbors[best]
+        nxt[goal] = -1
+        self.fields[goal] = nxt
+        return nxt
+
+    def to_arrays(self, prefix, arrays):
+        for name in ('positions', 'offsets', 'neighbors', 'costs', 'cell_nodes'): arrays[prefix + name] = getattr(self, name)
+        return {}
+
+    @classmethod
+    def from_arrays(cls, grid, prefix, arrays):
+        return cls(grid, *(arrays[prefix + name] for name in ('positions', 'offsets', 'neighbors', 'costs', 'cell_nodes')))
+
+
+def build_navigation(namespace, draw_fn, surfaces, colliders, radius, cell=NAV_CELL):
+    # Passo do bake: grava draw_fn marcando as funções de surfaces, rasteriza o chão e monta a navmesh
+    mesh = compile_geometry(namespace, draw_fn, objects=surfaces)
+    grid = HeightGrid.from_triangles(surface_triangles(mesh, surfaces), colliders, radius, cell=cell)
+    return grid, NavGraph.from_grid(grid)
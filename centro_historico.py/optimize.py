@@ -0,0 +1,243 @@
+import copy
+import numpy as np
+from OpenGL.GL import GL_TRIANGLES
+from geometry import Mesh, Batch, VERTEX_FLOATS
+from collision import CollisionWorld
+
+#  OTIMIZAÇÃO DAS MALHAS
+# Passo final da compilação (no bake, depois da luz): a malha não indexada vira
+# vértices únicos + buffer de índices uint32.
+# 1. Faces escondidas: um triângulo sai quando os dois lados dele ficam dentro
+#    de caixas sólidas (os draw_cube alinhados aos eixos que o GeometryRecorder
+#    reconhece): faces coladas em outra caixa (um lado na própria, o outro na
+#    vizinha) ou enterradas numa caixa maior. Caixas de objetos com LOD só
+#    escondem faces do próprio objeto.
+# 2. Triângulos repetidos (mesmos cantos, mesma ordem) no mesmo lote saem.
+# 3. Vértices iguais (posição + cor, já com a luz) são soldados num só.
+# 4. Os triângulos de cada faixa (objeto dentro do lote) são reordenados para
+#    o cache de vértices da GPU (Tipsify, Sander et al. 2007) e os vértices
+#    ficam na ordem do primeiro uso.
+# As faixas por objeto e por instância continuam contíguas, agora no buffer
+# de índices: o culling e o LOD não mudam. Quads texturizados ficam como estão.
+
+# Deslocamento ao longo da normal para testar cada lado do triângulo, e folga das caixas
+HIDDEN_OFFSET = 1e-3
+HIDDEN_TOLERANCE = 1e-4
+# Cache FIFO simulado para medir a taxa de falhas (ACMR) e tamanho alvo do Tipsify
+VERTEX_CACHE = 16
+INDEX_DTYPE = np.uint32
+
+
+class OptimizeStats:
+    def __init__(self):
+        self.triangles_before = self.triangles_after = 0
+        self.hidden = self.duplicates = 0
+        self.vertices_before = self.vertices_after = 0
+        self.bytes_before = self.bytes_after = 0
+        self.acmr_before = self.acmr_after = 0.0
+
+    def as_dict(self):
+        return dict(vars(self))
+
+    def report(self):
+        saved = self.bytes_before - self.bytes_after
+        return (f"{self.triangles_before} -> {self.triangles_after} triângulos ({self.hidden} escondidos, "
+                f"{self.duplicates} repetidos), {self.vertices_before} -> {self.vertices_after} vértices, "
+                f"{saved / 2**20:.2f} MiB a menos ({self.bytes_before / 2**20:.2f} -> {self.bytes_after / 2**20:.2f}), "
+                f"ACMR {self.acmr_before:.2f} -> {self.acmr_after:.2f}")
+
+
+#  FACES ESCONDIDAS
+def hidden_triangles(tris, objects, mesh):
+    # tris: (T, 3, 3); objects: objeto de cada triângulo. True = os dois lados dentro de sólidos
+    hidden = np.zeros(len(tris), dtype=bool)
+    if len(tris) == 0 or len(mesh.solids) == 0: return hidden
+    normals = np.cross(tris[:, 1] - tris[:, 0], tris[:, 2] - tris[:, 0])
+    length = np.linalg.norm(normals, axis=1)
+    valid = length > 1e-12
+    normals = normals / np.maximum(length, 1e-12)[:, None]
+    solids = mesh.solids.astype(float)
+    world = CollisionWorld(solids[:, [0, 3, 1, 4, 2, 5]])
+    centers = tris.mean(axis=1)
+    radii = np.linalg.norm(tris - centers[:, None], axis=2).max(axis=1) + HIDDEN_OFFSET
+    ti, si = world.candidates(centers, radii)
+    solid_objects = mesh.solid_objects
+    eligible = valid[ti] & ((mesh.object_lods[solid_objects[si]] < 0) | (solid_objects[si] == objects[ti]))
+    ti, si = ti[eligible], si[eligible]
+    lo, hi = solids[si, None, :3] - HIDDEN_TOLERANCE, solids[si, None, 3:] + HIDDEN_TOLERANCE
+    sides = []
+    for sign in (1.0, -1.0):
+        corners = tris[ti] + sign * HIDDEN_OFFSET * normals[ti, None]
+        inside = ((corners >= lo) & (corners <= hi)).all(axis=(1, 2))
+        covered = np.zeros(len(tris), dtype=bool)
+        covered[ti[inside]] = True
+        sides.append(covered)
+    return sides[0] & sides[1]
+
+
+def duplicate_triangles(tris, groups):
+    # Repetições exatas dentro de cada grupo; fica a primeira. Cada triângulo começa no
+    # canto de menor posição, mantendo o sentido (o culling depende dele)
+    if len(tris) == 0: return np.zeros(0, dtype=bool)
+    ranks = np.unique(tris.astype(np.float32).reshape(-1, 3), axis=0, return_inverse=True)[1].reshape(-1, 3)
+    start = ranks.argmin(axis=1)
+    rolled = np.take_along_axis(ranks, (np.arange(3)[None, :] + start[:, None]) % 3, axis=1)
+    _, first = np.unique(np.column_stack([groups, rolled]), axis=0, return_index=True)
+    duplicate = np.ones(len(tris), dtype=bool)
+    duplicate[first] = False
+    return duplicate
+
+
+#  CACHE DE VÉRTICES
+def cache_misses(indices, size=VERTEX_CACHE):
+    # Falhas de um cache FIFO de size entradas, percorrendo os índices na ordem de desenho
+    cache, slots, misses = [-1] * size, set(), 0
+    head = 0
+    for v in indices.tolist():
+        if v in slots: continue
+        misses += 1
+        old = cache[head]
+        if old >= 0: slots.discard(old)
+        cache[head] = v
+        slots.add(v)
+        head = (head + 1) % size
+    return misses
+
+
+def tipsify(tris, size=VERTEX_CACHE):
+    # tris: (T, 3) índices locais 0..V-1 -> ordem dos triângulos. Linear no número de triângulos
+    n_tris = len(tris)
+    if n_tris < 3: return np.arange(n_tris)
+    n_verts = int(tris.max()) + 1
+    flat = tris.ravel()
+    order = np.argsort(flat, kind='stable')
+    starts = np.searchsorted(flat[order], np.arange(n_verts + 1))
+    adjacency = (order // 3).tolist()
+    starts = starts.tolist()
+    tri_list = tris.tolist()
+    live = np.bincount(flat, minlength=n_verts).tolist()
+    stamp = [-size - 1] * n_verts
+    emitted = [False] * n_tris
+    out, dead_end = [], []
+    time, cursor, fan = size + 1, 1, 0
+    while fan >= 0:
+        candidates = []
+        for t in adjacency[starts[fan]:starts[fan + 1]]:
+            if emitted[t]: continue
+            emitted[t] = True
+            out.append(t)
+            for v in tri_list[t]:
+                dead_end.append(v)
+                candidates.append(v)
+                live[v] -= 1
+                if time - stamp[v] > size:
+                    stamp[v] = time
+                    time += 1
+        # Próximo leque: o candidato ainda vivo que continua no cache por mais tempo
+        fan, best = -1, -1
+        for v in candidates:
+            if live[v] <= 0: continue
+            priority = time - stamp[v] + 2 * live[v]
+            if priority <= size and stamp[v] > best:
+                fan, best = v, stamp[v]
+            elif fan < 0 and best < 0:
+                fan = v
+        if fan >= 0 and live[fan] > 0: continue
+        fan = -1
+        while dead_end:
+            v = dead_end.pop()
+            if live[v] > 0:
+                fan = v
+                break
+        while fan < 0 and cursor < n_verts:
+            if live[cursor] > 0: fan = cursor
+            cursor += 1
+    return np.array(out, dtype=np.int64)
+
+
+def reorder(corners):
+    # corners: (T*3,) índices globais de uma faixa -> mesma faixa reordenada para o cache
+    if len(corners) < 9: return corners
+    local = np.unique(corners, return_inverse=True)[1].reshape(-1, 3)
+    ordered = corners.reshape(-1, 3)[tipsify(local)].ravel()
+    # Faixas pequenas ou já em ordem boa (os draw_cube saem face a face) podem piorar: fica a melhor
+    return ordered if cache_misses(ordered) < cache_misses(corners) else corners
+
+
+#  MALHA
+def optimize_mesh(mesh, stats=None, reorder_triangles=True):
+    # Devolve uma nova malha indexada; stats (OptimizeStats) recebe os números do passo
+    stats = stats if stats is not None else OptimizeStats()
+    if mesh.indices is not None: return mesh
+    vertices = np.asarray(mesh.vertices)
+    stats.vertices_before = len(vertices)
+    stats.bytes_before = vertices.nbytes
+    # Triângulos das faixas de objeto dos lotes de GL_TRIANGLES, com lote e objeto de cada um
+    ranges = [(bi, oid, f, c) for bi, b in enumerate(mesh.batches) if b.key[0] == GL_TRIANGLES
+              for oid, f, c in zip(b.object_ids, b.firsts, b.counts)]
+    corners = np.concatenate([np.arange(f, f + c) for _, _, f, c in ranges]) if ranges else np.zeros(0, dtype=np.int64)
+    tri_batch = np.concatenate([np.full(c // 3, bi) for bi, _, _, c in ranges]) if ranges else np.zeros(0, dtype=np.int64)
+    tri_object = np.concatenate([np.full(c // 3, oid) for _, oid, _, c in ranges]) if ranges else np.zeros(0, dtype=np.int64)
+    tris = vertices[corners, :3].astype(float).reshape(-1, 3, 3)
+    stats.triangles_before = len(tris) + sum(b.count // 3 for b in mesh.instances if b.key[0] == GL_TRIANGLES)
+    hidden = hidden_triangles(tris, tri_object, mesh)
+    # Repetições só entre objetos sem LOD, ou dentro do mesmo objeto com LOD
+    lod_tag = np.where(mesh.object_lods[tri_object] < 0, -1, tri_object) if len(tri_object) else tri_object
+    duplicate = duplicate_triangles(tris, tri_batch * (len(mesh.object_names) + 1) + lod_tag + 1) & ~hidden
+    stats.hidden, stats.duplicates = int(hidden.sum()), int(duplicate.sum())
+    keep_corner = np.ones(len(vertices), dtype=bool)
+    keep_corner[corners] = np.repeat(~(hidden | duplicate), 3)
+    # Solda: vértices com os mesmos bytes de posição e cor
+    rows = np.ascontiguousarray(vertices, dtype=np.float32).view(np.dtype((np.void, VERTEX_FLOATS * 4))).ravel()
+    _, unique, weld = np.unique(rows, return_index=True, return_inverse=True)
+    weld = weld.ravel()
+    # Ordem original já soldada: base do ACMR (sem índices, glDrawArrays não reaproveita nada)
+    before_order = []
+    parts, batches, first = [], [], 0
+    for b in mesh.batches:
+        nb = Batch(b.key, first, 0)
+        nb.object_ids, firsts, counts = b.object_ids, [], []
+        for f, c in zip(b.firsts, b.counts):
+            span = np.arange(f, f + c)
+            if b.key[0] == GL_TRIANGLES: before_order.append(weld[span])
+            idx = weld[span[keep_corner[span]]]
+            if reorder_triangles and b.key[0] == GL_TRIANGLES: idx = reorder(idx)
+            parts.append(idx); firsts.append(first); counts.append(len(idx))
+            first += len(idx)
+        nb.firsts, nb.counts = np.array(firsts, dtype=np.int32), np.array(counts, dtype=np.int32)
+        nb.count = first - nb.first
+        batches.append(nb)
+    instances = []
+    for b in mesh.instances:
+        # Mesma topologia em todas as instâncias: a ordem da primeira vale para as outras
+        idx = weld[b.first:b.first + b.count]
+        if b.key[0] == GL_TRIANGLES: before_order.append(idx)
+        n, vpi = len(b.transforms), b.vertices_per_instance
+        if reorder_triangles and b.key[0] == GL_TRIANGLES and n and vpi >= 9:
+            local = np.unique(idx[:vpi], return_inverse=True)[1].reshape(-1, 3)
+            order = tipsify(local)
+            if cache_misses(idx[:vpi].reshape(-1, 3)[order].ravel()) < cache_misses(idx[:vpi]):
+                idx = idx.reshape(n, -1, 3)[:, order].ravel()
+        parts.append(idx)
+        nb = copy.copy(b)
+        nb.first, nb.count = first, len(idx)
+        instances.append(nb)
+        first += len(idx)
+    indices = np.concatenate(parts) if parts else np.zeros(0, dtype=np.int64)
+    # Vértices na ordem do primeiro uso (leitura sequencial do VBO)
+    used, first_use = np.unique(indices, return_index=True)
+    fetch = used[np.argsort(first_use, kind='stable')]
+    remap = np.empty(len(unique), dtype=np.int64)
+    remap[fetch] = np.arange(len(fetch))
+    new_vertices = np.ascontiguousarray(vertices[unique[fetch]], dtype=np.float32)
+    indices = remap[indices].astype(INDEX_DTYPE)
+    stats.triangles_after = sum(int(b.count) // 3 for b in batches + instances if b.key[0] == GL_TRIANGLES)
+    stats.vertices_after = len(new_vertices)
+    stats.bytes_after = new_vertices.nbytes + indices.nbytes
+    if before_order:
+        before = np.concatenate(before_order)
+        stats.acmr_before = cache_misses(before) / max(len(before) // 3, 1)
+        after = np.concatenate([indices[b.first:b.first + b.count] for b in batches + instances if b.key[0] == GL_TRIANGLES])
+        stats.acmr_after = cache_misses(after) / max(len(after) // 3, 1)
+    return Mesh(new_vertices, batches, instances, mesh.object_names, mesh.object_bounds, mesh.object_lods,
+                mesh.object_groups, mesh.group_bounds, mesh.textured_vertices, mesh.textured, indices=indices)
@@ -0,0 +1,42 @@
+import numpy as np
+
+#  VISIBILIDADE POR PORTAIS
+# A cena é dividida em células (exterior, interior) ligadas por portais, as
+# aberturas por onde uma célula enxerga a outra. A célula da câmera é sempre
+# desenhada; uma vizinha só entra no quadro se o portal que leva a ela estiver
+# aberto e dentro do frustum. Da rampa com a porta fechada, o interior inteiro
+# deixa de ser enviado à GPU.
+
+
+class Portal:
+    def __init__(self, name, cells, bounds):
+        self.name = name
+        self.cells = tuple(cells)
+        # Caixa da abertura: (x_min, y_min, z_min, x_max, y_max, z_max), mesmo layout do culling
+        self.bounds = np.asarray(bounds, dtype=float)
+
+    def other(self, cell):
+        a, b = self.cells
+        return b if cell == a else a
+
+
+class CellGraph:
+    def __init__(self, portals):
+        self.portals = list(portals)
+        self.bounds = np.array([p.bounds for p in self.portals], dtype=float).reshape(-1, 6)
+
+    def visible_cells(self, start, frustum=None, open_portals=None):
+        # Busca em largura a partir da célula da câmera, atravessando só portais
+        # abertos e visíveis. open_portals: nome -> aberto (ausente = sempre aberto)
+        open_portals = open_portals or {}
+        in_view = frustum.test_boxes(self.bounds) if frustum is not None else np.ones(len(self.portals), dtype=bool)
+        visible, queue = [start], [start]
+        while queue:
+            cell = queue.pop(0)
+            for portal, seen in zip(self.portals, in_view):
+                if cell not in portal.cells or not seen or not open_portals.get(portal.name, True): continue
+                nxt = portal.other(cell)
+                if nxt not in visible:
+                    visible.append(nxt)
+                    queue.append(nxt)
+        return visible
@@ -0,0 +1,78 @@
+from OpenGL.GL import *
+import numpy as np
+from functools import lru_cache
+
+#  BIBLIOTECA DE PRIMITIVAS
+# Malhas unitárias (disco, anel, arco, cilindro) geradas uma vez por
+# (forma, fatias) como arrays NumPy, com descarte LRU. Quem desenha só aplica
+# uma transformação (glTranslatef/glScalef) e chama draw_primitive: nenhum
+# seno/cosseno nem quádrica GLU por quadro. Na compilação (geometry.py) o
+# gravador substitui draw_primitive e recebe o array inteiro de uma vez.
+
+PRIMITIVE_CACHE_SIZE = 64
+
+
+def frozen(a):
+    a = np.ascontiguousarray(a, dtype=np.float32)
+    a.flags.writeable = False
+    return a
+
+
+@lru_cache(maxsize=PRIMITIVE_CACHE_SIZE)
+def circle_table(slices):
+    # (slices+1, 2) = (cos, sin) de 0 a 2π, com o primeiro ponto repetido no fim
+    a = np.linspace(0.0, 2.0*np.pi, slices + 1)
+    a[-1] = 0.0
+    return frozen(np.stack([np.cos(a), np.sin(a)], axis=1))
+
+
+@lru_cache(maxsize=PRIMITIVE_CACHE_SIZE)
+def disk_fan(slices, plane='xy'):
+    # GL_TRIANGLE_FAN de raio 1 centrado na origem, no plano XY (z=0) ou YZ (x=0)
+    rim = circle_table(slices)
+    pos = np.zeros((slices + 2, 3))
+    if plane == 'xy': pos[1:, :2] = rim
+    else: pos[1:, 1:] = rim
+    return frozen(pos)
+
+
+@lru_cache(maxsize=PRIMITIVE_CACHE_SIZE)
+def annulus_strip(inner_ratio, slices):
+    # GL_TRIANGLE_STRIP entre o raio 1 e inner_ratio, alternando externo/interno
+    rim = circle_table(slices)
+    pos = np.zeros((2*(slices + 1), 3))
+    pos[0::2, :2] = rim
+    pos[1::2, :2] = rim * inner_ratio
+    return frozen(pos)
+
+
+@lru_cache(maxsize=PRIMITIVE_CACHE_SIZE)
+def arch_fan(segments):
+    # GL_TRIANGLE_FAN do semicírculo superior de raio 1 (0 a π)
+    a = np.linspace(0.0, np.pi, segments + 1)
+    pos = np.zeros((segments + 2, 3))
+    pos[1:, 0], pos[1:, 1] = np.cos(a), np.sin(a)
+    return frozen(pos)
+
+
+@lru_cache(maxsize=PRIMITIVE_CACHE_SIZE)
+def cylinder_mesh(slices):
+    # GL_TRIANGLES: lateral e tampas de um cilindro de raio 1 e altura 1 ao longo de +Z,
+    # mesma orientação de gluCylinder + gluDisk
+    rim = circle_table(slices)
+    p0, p1 = rim[:-1], rim[1:]
+    n = slices
+    base0 = np.column_stack([p0, np.zeros(n)]); base1 = np.column_stack([p1, np.zeros(n)])
+    top0 = np.column_stack([p0, np.ones(n)]); top1 = np.column_stack([p1, np.ones(n)])
+    center0, center1 = np.zeros((n, 3)), np.tile([0.0, 0.0, 1.0], (n, 1))
+    side = np.stack([base0, base1, top1, base0, top1, top0], axis=1)
+    caps = np.concatenate([np.stack([center0, base0, base1], axis=1), np.stack([center1, top0, top1], axis=1)])
+    return frozen(np.concatenate([side.reshape(-1, 3), caps.reshape(-1, 3)]))
+
+
+def draw_primitive(mode, positions):
+    # Um único glDrawArrays a partir do array do cache, com a cor e a matriz atuais
+    glEnableClientState(GL_VERTEX_ARRAY)
+    glVertexPointer(3, GL_FLOAT, 0, positions)
+    glDrawArrays(mode, 0, len(positions))
+    glDisableClientState(GL_VERTEX_ARRAY)
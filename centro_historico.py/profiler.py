@@ -0,0 +1,232 @@
+import json
+import time
+from collections import deque
+import ctypes
+from OpenGL.GL import *
+from OpenGL.raw.GL.VERSION.GL_3_3 import glGetQueryObjectui64v as raw_query_ui64v
+from geometry import RENDER_STATS
+
+#  PERFIL POR SUBSISTEMA
+# Escopos nomeados medem tempo de CPU, draw calls (RENDER_STATS) e, quando
+# pedido, tempo de GPU com um par de consultas GL_TIMESTAMP (ao contrário de
+# GL_TIME_ELAPSED, elas podem se aninhar). As consultas só são lidas quando o
+# resultado já está pronto, alguns quadros depois, sem travar o pipeline.
+# Os totais alimentam o HUD (F3 no centro.py) e podem ser exportados no
+# formato Chrome trace (chrome://tracing ou ui.perfetto.dev).
+
+# Quadros na média mostrada pelo HUD
+PROFILE_WINDOW = 60
+GPU_QUERY_POOL = 256
+TRACE_MAX_EVENTS = 200000
+HUD_REFRESH_FRAMES = 15
+HUD_LINES = 14
+
+
+class NullScope:
+    # Escopo do profiler desligado: custo de um with vazio
+    def __enter__(self): return self
+    def __exit__(self, *exc): return False
+
+
+NULL_SCOPE = NullScope()
+
+
+class Scope:
+    __slots__ = ('profiler', 'name', 'gpu', 't0', 'calls0', 'queries')
+
+    def __init__(self, profiler, name, gpu):
+        self.profiler, self.name, self.gpu = profiler, name, gpu
+
+    def __enter__(self):
+        p = self.profiler
+        self.calls0 = RENDER_STATS.draw_calls
+        self.queries = p.gpu.begin() if self.gpu and p.gpu is not None else None
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        t1 = time.perf_counter()
+        p = self.profiler
+        if self.queries is not None: p.gpu.end(self.queries, self.name, self.t0, p.frames)
+        p.record(self.name, self.t0, t1, RENDER_STATS.draw_calls - self.calls0)
+        return False
+
+
+def query_result_ns(query):
+    # O wrapper do PyOpenGL não converte a saída de 64 bits; chamada direta com ctypes
+    out = ctypes.c_uint64()
+    raw_query_ui64v(query, GL_QUERY_RESULT, ctypes.byref(out))
+    return out.value
+
+
+class GpuQueries:
+    # Pares de GL_TIMESTAMP; sem consultas livres o escopo fica só com o tempo de CPU
+    def __init__(self, size=GPU_QUERY_POOL):
+        self.pending = deque()
+        try:
+            self.free = list(glGenQueries(size))
+        except Exception:
+            self.free = []
+
+    def begin(self):
+        if len(self.free) < 2: return None
+        queries = (self.free.pop(), self.free.pop())
+        glQueryCounter(queries[0], GL_TIMESTAMP)
+        return queries
+
+    def end(self, queries, name, t0, frame):
+        glQueryCounter(queries[1], GL_TIMESTAMP)
+        self.pending.append((queries, name, t0, frame))
+
+    def poll(self):
+        # Lê, em ordem, só as consultas já prontas: (nome, início na CPU, quadro, ms)
+        done = []
+        while self.pending:
+            (q0, q1), name, t0, frame = self.pending[0]
+            if not glGetQueryObjectiv(q1, GL_QUERY_RESULT_AVAILABLE): break
+            ns = query_result_ns(q1) - query_result_ns(q0)
+            done.append((name, t0, frame, ns / 1e6))
+            self.free += [q0, q1]
+            self.pending.popleft()
+        return done
+
+
+class Profiler:
+    def __init__(self):
+        self.enabled = False
+        self.gpu, self.trace = None, None
+        self.origin = time.perf_counter()
+        self.window = PROFILE_WINDOW
+        self.reset()
+
+    def reset(self):
+        # Por quadro: nome -> [ms de CPU, draw calls, chamadas]; GPU: nome -> {quadro: ms}
+        self.frame, self.frames = {}, 0
+        self.history = deque(maxlen=self.window)
+        self.gpu_frames = {}
+        if self.trace is not None: self.trace = []
+
+    def enable(self, gpu=True, trace=False, window=PROFILE_WINDOW):
+        # gpu precisa de um contexto GL atual; window=None guarda todos os quadros
+        self.enabled = True
+        if window != self.window:
+            self.window = window
+            self.history = deque(self.history, maxlen=window)
+        if gpu and self.gpu is None: self.gpu = GpuQueries()
+        if trace and self.trace is None: self.trace = []
+
+    def disable(self):
+        self.enabled = False
+
+    def scope(self, name, gpu=False):
+        return Scope(self, name, gpu) if self.enabled else NULL_SCOPE
+
+    def instrument(self, namespace, names):
+        # Envolve funções do módulo (ex.: draw_*) num escopo com o próprio nome
+        for name in names:
+            fn = namespace[name]
+            if getattr(fn, 'profiled', False): continue
+            def wrapped(*args, _fn=fn, _name=name, **kwargs):
+                with self.scope(_name):
+                    return _fn(*args, **kwargs)
+            wrapped.profiled = True
+            namespace[name] = wrapped
+
+    def record(self, name, t0, t1, calls):
+        s = self.frame.get(name)
+        if s is None: s = self.frame[name] = [0.0, 0, 0]
+        s[0] += (t1 - t0) * 1000; s[1] += calls; s[2] += 1
+        if self.trace is not None and len(self.trace) < TRACE_MAX_EVENTS:
+            self.trace.append({'name': name, 'ph': 'X', 'pid': 1, 'tid': 1, 'ts': (t0 - self.origin) * 1e6,
+                               'dur': (t1 - t0) * 1e6, 'args': {'draw_calls': calls}})
+
+    def end_frame(self):
+        if not self.enabled: return
+        self.history.append(self.frame)
+        self.frame = {}
+        self.frames += 1
+        if self.gpu is None: return
+        for name, t0, frame, ms in self.gpu.poll():
+            frames = self.gpu_frames.setdefault(name, {})
+            frames[frame] = frames.get(frame, 0.0) + ms
+            if self.window is not None:
+                for old in [f for f in frames if f < self.frames - self.window]: del frames[old]
+            # Na trilha da GPU o evento começa junto do escopo na CPU (aproximado)
+            if self.trace is not None and len(self.trace) < TRACE_MAX_EVENTS:
+                self.trace.append({'name': name, 'ph': 'X', 'pid': 1, 'tid': 2, 'ts': (t0 - self.origin) * 1e6,
+                                   'dur': ms * 1000})
+
+    def summary(self):
+        # Médias por quadro: nome -> {cpu_ms, gpu_ms, draw_calls, calls}
+        n = max(len(self.history), 1)
+        out = {}
+        for frame in self.history:
+            for name, (cpu, calls, count) in frame.items():
+                s = out.setdefault(name, {'cpu_ms': 0.0, 'gpu_ms': None, 'draw_calls': 0.0, 'calls': 0.0})
+                s['cpu_ms'] += cpu / n; s['draw_calls'] += calls / n; s['calls'] += count / n
+        for name, frames in self.gpu_frames.items():
+            if frames and name in out: out[name]['gpu_ms'] = sum(frames.values()) / len(frames)
+        return out
+
+    def export_chrome_trace(self, path):
+        names = [{'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': tid, 'args': {'name': label}}
+                 for tid, label in ((1, 'CPU'), (2, 'GPU'))]
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': names + (self.trace or []), 'displayTimeUnit': 'ms'}, f)
+
+
+PROFILER = Profiler()
+
+
+def count_immediate_calls(namespace, names=('glBegin', 'draw_primitive', 'draw_textured_quad')):
+    # No modo imediato cada glBegin/draw_primitive/draw_textured_quad conta como um draw call em RENDER_STATS
+    for name in names:
+        fn = namespace[name]
+        def wrapped(*args, _fn=fn):
+            RENDER_STATS.draw_calls += 1
+            return _fn(*args)
+        namespace[name] = wrapped
+
+
+#  HUD
+class Hud:
+    # Tabela dos escopos mais caros, desenhada por cima da cena com glDrawPixels
+    def __init__(self, profiler=PROFILER):
+        self.profiler = profiler
+        self.font, self.image, self.size = None, None, (0, 0)
+        self.visible = False
+
+    def toggle(self):
+        self.visible = not self.visible
+        if self.visible: self.profiler.enable()
+
+    def refresh(self):
+        import pygame
+        if self.font is None:
+            pygame.font.init()
+            self.font = pygame.font.SysFont('monospace', 14)
+        rows = sorted(self.profiler.summary().items(), key=lambda kv: -kv[1]['cpu_ms'])[:HUD_LINES]
+        lines = [f"{'escopo':<28}{'cpu ms':>8}{'gpu ms':>8}{'draws':>7}"]
+        for name, s in rows:
+            gpu = f"{s['gpu_ms']:8.2f}" if s['gpu_ms'] is not None else f"{'-':>8}"
+            lines.append(f"{name[:27]:<28}{s['cpu_ms']:8.2f}{gpu}{s['draw_calls']:7.0f}")
+        surfaces = [self.font.render(line, True, (255, 255, 255)) for line in lines]
+        w = max(s.get_width() for s in surfaces) + 12
+        h = sum(s.get_height() for s in surfaces) + 12
+        panel = pygame.Surface((w, h), pygame.SRCALPHA)
+        panel.fill((0, 0, 0, 170))
+        y = 6
+        for s in surfaces:
+            panel.blit(s, (6, y)); y += s.get_height()
+        self.image, self.size = pygame.image.tostring(panel, 'RGBA', True), (w, h)
+
+    def draw(self, width, height):
+        if not self.visible: return
+        if self.image is None or self.profiler.frames % HUD_REFRESH_FRAMES == 0: self.refresh()
+        w, h = self.size
+        glPushAttrib(GL_ENABLE_BIT | GL_COLOR_BUFFER_BIT)
+        glDisable(GL_DEPTH_TEST); glDisable(GL_CULL_FACE)
+        glEnable(GL_BLEND); glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+        glWindowPos2i(10, height - h - 10)
+        glDrawPixels(w, h, GL_RGBA, GL_UNSIGNED_BYTE, self.image)
+        glPopAttrib()
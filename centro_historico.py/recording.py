@@ -0,0 +1,123 @@
+from collections import Counter
+from contextlib import contextmanager
+
+#  BACKEND GL DE GRAVAÇÃO
+# As funções draw_* chamam o GL pelos nomes globais do módulo delas
+# (from OpenGL.GL import *). Dentro de recording(namespace, recorder) esses
+# nomes apontam para o CommandRecorder, que não desenha nada: só conta as
+# chamadas, os vértices, os draw calls e as mudanças de estado (e quantas
+# delas repetem o valor que já estava valendo). Serve para medir as funções
+# de desenho sem janela nem contexto GL (bench.py). Como no GeometryRecorder,
+# draw_primitive e draw_textured_quad contam como um comando só.
+
+# Chamadas que desenham; os vértices vêm de glVertex*, dos argumentos ou da estimativa das quádricas
+DRAW_CALLS = {
+    'glBegin', 'glDrawArrays', 'glDrawElements', 'glMultiDrawArrays', 'glMultiDrawElements',
+    'glDrawArraysInstanced', 'gluCylinder', 'gluDisk', 'gluPartialDisk', 'gluSphere',
+    'draw_primitive', 'draw_textured_quad',
+}
+MATRIX_CALLS = {
+    'glPushMatrix', 'glPopMatrix', 'glTranslatef', 'glRotatef', 'glScalef', 'glLoadIdentity',
+    'glMultMatrixf', 'glLoadMatrixf', 'glMatrixMode', 'gluLookAt', 'gluPerspective',
+}
+# Mudanças de estado: chamada -> (chave, valor); o valor repetido na mesma chave é redundante
+STATE_CALLS = {
+    'glEnable': lambda cap: (('enable', cap), True),
+    'glDisable': lambda cap: (('enable', cap), False),
+    'glEnableClientState': lambda cap: (('client', cap), True),
+    'glDisableClientState': lambda cap: (('client', cap), False),
+    'glBindTexture': lambda target, texture: (('texture', target), texture),
+    'glBindBuffer': lambda target, buffer: (('buffer', target), buffer),
+    'glPolygonOffset': lambda *args: (('polygon_offset',), args),
+    'glLineWidth': lambda width: (('line_width',), width),
+    'glPointSize': lambda size: (('point_size',), size),
+    'glUseProgram': lambda program: (('program',), program),
+    'glBindVertexArray': lambda vao: (('vertex_array',), vao),
+    'glBlendFunc': lambda *args: (('blend_func',), args),
+    'glDepthMask': lambda flag: (('depth_mask',), flag),
+    'glCullFace': lambda face: (('cull_face',), face),
+}
+# Cor atual: conta à parte (dentro de glBegin é atributo de vértice, não estado do pipeline)
+COLOR_CALLS = {'glColor3f', 'glColor3fv', 'glColor4f', 'glColor4fv'}
+VERTEX_CALLS = {'glVertex2f', 'glVertex3f', 'glVertex3fv', 'glVertex2fv'}
+# Os poucos retornos que as funções de desenho usam
+RETURN_VALUES = {'gluNewQuadric': 1, 'glGenLists': 1, 'glGenBuffers': 1, 'glGenTextures': 1}
+# Chamadas de fora do GL tratadas como comandos do backend
+COMMANDS = ('draw_primitive', 'draw_textured_quad')
+
+
+def quadric_vertices(name, args):
+    # Vértices que a GLU gera: faixas de quads (slices + 1) * 2 por anel
+    if name == 'gluCylinder': slices, rings = args[4], args[5]
+    elif name in ('gluDisk', 'gluPartialDisk'): slices, rings = args[3], args[4]
+    else: slices, rings = args[2], args[3]
+    return (int(slices) + 1) * 2 * int(rings)
+
+
+class CommandRecorder:
+    # keep=True guarda também a lista de comandos (nome, argumentos), na ordem
+    def __init__(self, keep=False):
+        self.keep = keep
+        self.reset()
+
+    def reset(self):
+        self.counts = Counter()
+        self.commands = []
+        self.vertices = self.draw_calls = self.state_changes = self.redundant = 0
+        self.matrix_ops = self.color_changes = 0
+        self.state, self.attrib_stack = {}, []
+        self.color = None
+
+    def record(self, name, args):
+        self.counts[name] += 1
+        if self.keep: self.commands.append((name, args))
+        if name in VERTEX_CALLS:
+            self.vertices += 1
+        elif name in COLOR_CALLS:
+            color = tuple(args[0]) if len(args) == 1 else args
+            if color != self.color: self.color_changes += 1
+            self.color = color
+        elif name in STATE_CALLS:
+            key, value = STATE_CALLS[name](*args)
+            self.state_changes += 1
+            if self.state.get(key, None) == value: self.redundant += 1
+            self.state[key] = value
+        elif name in MATRIX_CALLS:
+            self.matrix_ops += 1
+        elif name in DRAW_CALLS:
+            self.draw_calls += 1
+            if name == 'glDrawArrays': self.vertices += int(args[2])
+            elif name == 'glDrawElements': self.vertices += int(args[1])
+            elif name == 'draw_primitive': self.vertices += len(args[1])
+            elif name == 'draw_textured_quad': self.vertices += 4
+            elif name.startswith('glu'): self.vertices += quadric_vertices(name, args)
+        elif name == 'glPushAttrib':
+            self.attrib_stack.append(dict(self.state))
+            self.state_changes += 1
+        elif name == 'glPopAttrib':
+            if self.attrib_stack: self.state = self.attrib_stack.pop()
+            self.state_changes += 1
+        return RETURN_VALUES.get(name)
+
+    def function(self, name):
+        def call(*args):
+            return self.record(name, args)
+        return call
+
+    def summary(self):
+        # Totais do que foi gravado desde o último reset
+        return {'calls': sum(self.counts.values()), 'draw_calls': self.draw_calls, 'vertices': self.vertices,
+                'state_changes': self.state_changes, 'redundant_state': self.redundant,
+                'matrix_ops': self.matrix_ops, 'color_changes': self.color_changes}
+
+
+@contextmanager
+def recording(namespace, recorder):
+    # Troca todas as funções gl*/glu* (e os COMMANDS) do módulo pelas do gravador
+    saved = {name: fn for name, fn in namespace.items()
+             if (name.startswith('gl') or name in COMMANDS) and callable(fn)}
+    namespace.update({name: recorder.function(name) for name in saved})
+    try:
+        yield recorder
+    finally:
+        namespace.update(saved)
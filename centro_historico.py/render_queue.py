@@ -0,0 +1,264 @@
+from OpenGL.GL import *
+import numpy as np
+from contextlib import contextmanager
+from geometry import RENDER_STATS, rotation_matrix, scale_matrix
+from textures import TEXTURES, QUAD_UVS, ALPHA_CUTOFF
+
+#  FILA DE RENDERIZAÇÃO
+# No modo imediato (sem VBOs) as funções draw_* mudam estado o tempo todo:
+# cilindros e discos desligam e religam o GL_CULL_FACE, a estante empilha
+# atributos, as janelas ligam o polygon offset e toda primitiva chama
+# glColor3fv. Dentro de queued(namespace, queue) essas chamadas não vão para
+# o GL: cada desenho vira um item com o estado, a cor e a matriz em que foi
+# pedido (a matriz relativa à da câmera, como no GeometryRecorder). O flush()
+# ordena os itens por estado, textura, cor e matriz, junta os vizinhos iguais
+# num único glDrawArrays e passa o estado pelo StateCache, que descarta as
+# chamadas que repetem o valor já valendo. RENDER_STATS conta as mudanças de
+# estado e de cor pedidas pelas draw_* e as que chegaram ao GL.
+
+# Chamadas GL (e comandos) que a fila recebe no lugar do GL
+QUEUED_CALLS = (
+    'glBegin', 'glEnd', 'glVertex3f', 'glVertex3fv', 'glColor3f', 'glColor3fv',
+    'glPushMatrix', 'glPopMatrix', 'glTranslatef', 'glRotatef', 'glScalef',
+    'glEnable', 'glDisable', 'glPushAttrib', 'glPopAttrib', 'glPolygonOffset', 'glLineWidth',
+    'draw_primitive', 'draw_textured_quad',
+)
+# Estado deixado pelo flush(), o mesmo de geometry.reset_batch_state (só as chaves que o flush tocou)
+DEFAULT_STATE = {
+    ('enable', GL_CULL_FACE): True, ('enable', GL_POLYGON_OFFSET_FILL): False,
+    ('enable', GL_TEXTURE_2D): False, ('enable', GL_ALPHA_TEST): False,
+    ('client', GL_VERTEX_ARRAY): False, ('client', GL_COLOR_ARRAY): False, ('client', GL_TEXTURE_COORD_ARRAY): False,
+    ('texture',): 0, ('line_width',): 1.0,
+}
+# Itens com até tantos vértices saem já transformados (matriz 0, a da câmera) e podem ser juntados;
+# malhas maiores do cache de primitivas ficam com a matriz e a trocam no GL
+PRETRANSFORM_VERTICES = 64
+# Primitivas independentes: itens vizinhos com a mesma chave viram um só glDrawArrays
+MERGEABLE = (GL_TRIANGLES, GL_QUADS, GL_LINES, GL_POINTS)
+# Estado que draw_primitive (arrays do cliente) e draw_textured_quad (textures.begin_textured/end_textured)
+# mudariam no modo imediato direto: entra na conta do que as draw_* pediram
+PRIMITIVE_STATE_CALLS = 2
+TEXTURED_STATE_CALLS, TEXTURED_COLOR_CALLS = 8, 1
+QUAD_TEXCOORDS = np.array(QUAD_UVS, dtype=np.float32)
+# Cor dos quads texturizados (GL_MODULATE), como em textures.begin_textured
+TEXTURED_COLOR = (1.0, 1.0, 1.0)
+
+
+def apply_state(key, value):
+    kind = key[0]
+    if kind == 'enable': (glEnable if value else glDisable)(key[1])
+    elif kind == 'client': (glEnableClientState if value else glDisableClientState)(key[1])
+    elif kind == 'color': glColor3fv(value)
+    elif kind == 'texture': glBindTexture(GL_TEXTURE_2D, value)
+    elif kind == 'line_width': glLineWidth(value)
+    elif kind == 'polygon_offset': glPolygonOffset(*value)
+    elif kind == 'alpha_func': glAlphaFunc(*value)
+
+
+class StateCache:
+    # Último valor enviado ao GL por chave; chave ausente = valor desconhecido (sempre envia)
+    def __init__(self):
+        self.values = {}
+
+    def reset(self):
+        self.values.clear()
+
+    def set(self, key, value):
+        if key in self.values and self.values[key] == value: return
+        self.values[key] = value
+        apply_state(key, value)
+        if key[0] == 'color': RENDER_STATS.colors_issued += 1
+        else: RENDER_STATS.state_issued += 1
+
+    def forget(self, key):
+        # O GL mudou o valor por conta própria (ex.: a cor depois de um GL_COLOR_ARRAY)
+        self.values.pop(key, None)
+
+    def restore(self):
+        for key, value in DEFAULT_STATE.items():
+            if key in self.values: self.set(key, value)
+
+
+class RenderQueue:
+    # Itens: (chave de ordenação, posições (N, 3), cores (N, 3) ou None, matriz 4x4)
+    def __init__(self, textures=TEXTURES):
+        self.textures = textures
+        self.cache = StateCache()
+        # Vértices do glBegin atual; glVertex3fv é o próprio append da lista (a chamada mais frequente)
+        self.current = []
+        self.glVertex3fv = self.current.append
+        self.clear()
+
+    def clear(self):
+        # Estado das draw_* no início do quadro: o de setup_gl / reset_batch_state
+        self.items = []
+        self.matrix, self.matrix_id, self.matrix_count = np.identity(4), 0, 0
+        self.matrix_stack, self.attrib_stack = [], []
+        self.cull, self.offset, self.polygon_offset, self.line_width = True, None, (0.0, 0.0), 1.0
+        self.color = TEXTURED_COLOR
+        self.mode, self.vertex_colors = None, None
+        self.current.clear()
+
+    def __len__(self):
+        return len(self.items)
+
+    #  MATRIZES
+    # Cada matriz nova ganha um número: itens com o mesmo número compartilham a transformação
+    def set_matrix(self, m):
+        self.matrix_count += 1
+        self.matrix, self.matrix_id = m, self.matrix_count
+
+    def glPushMatrix(self): self.matrix_stack.append((self.matrix, self.matrix_id))
+    def glPopMatrix(self): self.matrix, self.matrix_id = self.matrix_stack.pop()
+    def glTranslatef(self, x, y, z):
+        m = self.matrix.copy()
+        m[:3, 3] += m[:3, :3] @ (x, y, z)
+        self.set_matrix(m)
+
+    def glRotatef(self, angle, x, y, z): self.set_matrix(self.matrix @ rotation_matrix(angle, x, y, z))
+    def glScalef(self, x, y, z): self.set_matrix(self.matrix @ scale_matrix(x, y, z))
+
+    #  ESTADO
+    def glEnable(self, cap): self.set_enabled(cap, True)
+    def glDisable(self, cap): self.set_enabled(cap, False)
+
+    def set_enabled(self, cap, on):
+        RENDER_STATS.state_requested += 1
+        if cap == GL_CULL_FACE: self.cull = on
+        elif cap == GL_POLYGON_OFFSET_FILL: self.offset = self.polygon_offset if on else None
+
+    def glPolygonOffset(self, factor, units):
+        RENDER_STATS.state_requested += 1
+        self.polygon_offset = (float(factor), float(units))
+        if self.offset is not None: self.offset = self.polygon_offset
+
+    def glPushAttrib(self, mask):
+        RENDER_STATS.state_requested += 1
+        self.attrib_stack.append((self.cull, self.offset, self.line_width))
+
+    def glPopAttrib(self):
+        RENDER_STATS.state_requested += 1
+        self.cull, self.offset, self.line_width = self.attrib_stack.pop()
+
+    def glLineWidth(self, w):
+        RENDER_STATS.state_requested += 1
+        self.line_width = float(w)
+
+    #  VÉRTICES
+    def glColor3f(self, r, g, b): self.set_color((float(r), float(g), float(b)))
+    def glColor3fv(self, c): self.set_color(tuple(float(v) for v in c[:3]))
+
+    def set_color(self, color):
+        RENDER_STATS.colors_requested += 1
+        # Dentro de glBegin, depois do primeiro vértice, a cor vira atributo por vértice: (primeiro vértice, cor)
+        if self.mode is not None and self.current:
+            if self.vertex_colors is None: self.vertex_colors = [(0, self.color)]
+            self.vertex_colors.append((len(self.current), color))
+        self.color = color
+
+    def glBegin(self, mode):
+        self.mode, self.vertex_colors = mode, None
+        self.current.clear()
+
+    def glVertex3f(self, x, y, z): self.current.append((x, y, z))
+
+    def glEnd(self):
+        verts, mode, changes = self.current, self.mode, self.vertex_colors
+        self.mode, self.vertex_colors = None, None
+        if not verts: return
+        positions = np.array(verts, dtype=np.float32)[:, :3]
+        verts.clear()
+        if changes is None: return self.submit(mode, positions, self.color)
+        # Cor de cada vértice: a que valia quando ele foi enviado
+        starts, colors = zip(*changes)
+        counts = np.diff(list(starts) + [len(positions)])
+        self.submit(mode, positions, (), np.repeat(np.array(colors, dtype=np.float32), counts, axis=0))
+
+    def draw_primitive(self, mode, positions):
+        RENDER_STATS.state_requested += PRIMITIVE_STATE_CALLS
+        self.submit(mode, positions, self.color)
+
+    def draw_textured_quad(self, key, corners):
+        RENDER_STATS.state_requested += TEXTURED_STATE_CALLS
+        RENDER_STATS.colors_requested += TEXTURED_COLOR_CALLS
+        self.submit(GL_QUADS, np.asarray(corners, dtype=np.float32), TEXTURED_COLOR, texture=key)
+
+    def submit(self, mode, positions, color, colors=None, texture=()):
+        # color: cor única do item, ou () com cores por vértice em colors
+        if texture: cull, offset = False, ()
+        else: cull, offset = self.cull, self.offset or ()
+        width = self.line_width if mode == GL_LINES else 1.0
+        matrix, matrix_id = self.matrix, self.matrix_id
+        if matrix_id and len(positions) <= PRETRANSFORM_VERTICES and mode in MERGEABLE:
+            positions = (positions @ matrix[:3, :3].T + matrix[:3, 3]).astype(np.float32)
+            matrix, matrix_id = None, 0
+        # Estado mais caro primeiro (textura, cull, offset, largura), depois cor e matriz
+        key = (texture, cull, offset, width, color, matrix_id, mode)
+        self.items.append((key, positions, colors, matrix))
+
+    #  ENVIO
+    def flush(self):
+        # Ordena (estável: itens iguais mantêm a ordem de envio), junta e desenha; limpa a fila
+        items = sorted(self.items, key=lambda item: item[0])
+        cache = self.cache
+        cache.reset()
+        glPushMatrix()
+        self.drawn_matrix = 0
+        i, n = 0, len(items)
+        while i < n:
+            key, j = items[i][0], i + 1
+            if key[-1] in MERGEABLE:
+                while j < n and items[j][0] == key: j += 1
+            self.draw_run(items[i:j])
+            i = j
+        glPopMatrix()
+        cache.restore()
+        self.clear()
+
+    def draw_run(self, run):
+        key, positions, colors, matrix = run[0]
+        texture, cull, offset, width, color, matrix_id, mode = key
+        cache = self.cache
+        cache.set(('enable', GL_CULL_FACE), cull)
+        cache.set(('enable', GL_POLYGON_OFFSET_FILL), bool(offset))
+        if offset: cache.set(('polygon_offset',), offset)
+        if mode == GL_LINES: cache.set(('line_width',), width)
+        cache.set(('enable', GL_TEXTURE_2D), bool(texture))
+        cache.set(('enable', GL_ALPHA_TEST), bool(texture))
+        if texture:
+            cache.set(('alpha_func',), (GL_GREATER, ALPHA_CUTOFF))
+            cache.set(('texture',), self.textures.get(texture))
+        cache.set(('client', GL_VERTEX_ARRAY), True)
+        cache.set(('client', GL_TEXTURE_COORD_ARRAY), bool(texture))
+        cache.set(('client', GL_COLOR_ARRAY), colors is not None)
+        if color: cache.set(('color',), color)
+        if matrix_id != self.drawn_matrix:
+            # Volta à matriz da câmera e aplica a do item
+            glPopMatrix(); glPushMatrix()
+            if matrix_id: glMultMatrixf(np.ascontiguousarray(matrix.T, dtype=np.float32))
+            self.drawn_matrix = matrix_id
+        if len(run) > 1:
+            positions = np.concatenate([item[1] for item in run])
+            if colors is not None: colors = np.concatenate([item[2] for item in run])
+        positions = np.ascontiguousarray(positions, dtype=np.float32)
+        glVertexPointer(3, GL_FLOAT, 0, positions)
+        if colors is not None:
+            glColorPointer(3, GL_FLOAT, 0, colors)
+            cache.forget(('color',))
+        if texture:
+            texcoords = np.tile(QUAD_TEXCOORDS, (len(positions) // 4, 1))
+            glTexCoordPointer(2, GL_FLOAT, 0, texcoords)
+        glDrawArrays(mode, 0, len(positions))
+        RENDER_STATS.draw_calls += 1
+        RENDER_STATS.vertices += len(positions)
+
+
+@contextmanager
+def queued(namespace, queue):
+    # Troca as QUEUED_CALLS do módulo pelas da fila; o desenho só acontece no queue.flush()
+    saved = {name: namespace[name] for name in QUEUED_CALLS if name in namespace}
+    namespace.update({name: getattr(queue, name) for name in saved})
+    try:
+        yield queue
+    finally:
+        namespace.update(saved)
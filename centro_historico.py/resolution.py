@@ -0,0 +1,157 @@
+from collections import deque
+from OpenGL.GL import *
+import numpy as np
+from profiler import GpuQueries
+
+#  RESOLUÇÃO DINÂMICA E RITMO DE QUADROS
+# A cena é desenhada num framebuffer próprio em vez da janela. O tamanho
+# interno e o MSAA desse framebuffer descem uma escada de níveis quando o p90
+# do tempo de quadro de uma janela de RESOLUTION_WINDOW quadros passa do
+# orçamento, e sobem de novo quando sobra folga. No fim do quadro a imagem é
+# resolvida (MSAA) e ampliada para a janela com glBlitFramebuffer; HUD,
+# rótulos e captura vão por cima, na resolução da janela. O ritmo (o limite
+# do clock.tick) cai para o próximo divisor da taxa alvo quando nem o nível
+# mais baixo cabe no orçamento: quadros constantes em vez de alternados.
+# O custo de um quadro é o maior entre o tempo de CPU (sem a espera do flip)
+# e o de GPU, medido com as consultas de timestamp do profiler.
+
+# (escala da resolução interna, amostras de MSAA), do melhor para o mais barato
+RESOLUTION_LEVELS = ((1.0, 4), (1.0, 2), (0.85, 2), (0.85, 0), (0.7, 0), (0.6, 0), (0.5, 0))
+RESOLUTION_WINDOW = 30
+# Desce de nível com p90 acima de budget * DOWNSCALE_ABOVE; sobe com p90 abaixo de budget * UPSCALE_BELOW
+DOWNSCALE_ABOVE = 1.0
+UPSCALE_BELOW = 0.7
+# Tempos de quadro guardados para consulta (summary, HUD, relatório do headless.py)
+FRAME_HISTORY = 600
+TARGET_FPS = 60
+PACING_RATES = (60, 30, 20)
+GPU_QUERY_PAIRS = 8
+
+
+class RenderTarget:
+    # Framebuffer com cor e profundidade (multisample se samples > 0) e, com MSAA, um segundo para a resolução
+    def __init__(self, width, height, samples=0):
+        self.width, self.height = width, height
+        self.samples = min(samples, int(glGetIntegerv(GL_MAX_SAMPLES))) if samples else 0
+        self.fbo, self.buffers = self.create(self.samples, depth=True)
+        self.resolve, resolve_buffers = self.create(0, depth=False) if self.samples else (None, [])
+        self.buffers += resolve_buffers
+
+    def create(self, samples, depth):
+        fbo = glGenFramebuffers(1)
+        glBindFramebuffer(GL_FRAMEBUFFER, fbo)
+        attachments = [(GL_RGBA8, GL_COLOR_ATTACHMENT0)] + ([(GL_DEPTH_COMPONENT24, GL_DEPTH_ATTACHMENT)] if depth else [])
+        buffers = [int(b) for b in np.atleast_1d(glGenRenderbuffers(len(attachments)))]
+        for rb, (fmt, attachment) in zip(buffers, attachments):
+            glBindRenderbuffer(GL_RENDERBUFFER, rb)
+            if samples: glRenderbufferStorageMultisample(GL_RENDERBUFFER, samples, fmt, self.width, self.height)
+            else: glRenderbufferStorage(GL_RENDERBUFFER, fmt, self.width, self.height)
+            glFramebufferRenderbuffer(GL_FRAMEBUFFER, attachment, GL_RENDERBUFFER, rb)
+        glBindRenderbuffer(GL_RENDERBUFFER, 0)
+        if glCheckFramebufferStatus(GL_FRAMEBUFFER) != GL_FRAMEBUFFER_COMPLETE:
+            raise RuntimeError(f"framebuffer {self.width}x{self.height} ({samples}x MSAA) incompleto")
+        return fbo, buffers
+
+    def bind(self):
+        glBindFramebuffer(GL_FRAMEBUFFER, self.fbo)
+        glViewport(0, 0, self.width, self.height)
+
+    def present(self, output, width, height):
+        # Resolve o MSAA no mesmo tamanho e amplia para o framebuffer de saída (0 = janela)
+        source = self.fbo
+        if self.resolve is not None:
+            glBindFramebuffer(GL_READ_FRAMEBUFFER, self.fbo)
+            glBindFramebuffer(GL_DRAW_FRAMEBUFFER, self.resolve)
+            glBlitFramebuffer(0, 0, self.width, self.height, 0, 0, self.width, self.height, GL_COLOR_BUFFER_BIT, GL_NEAREST)
+            source = self.resolve
+        glBindFramebuffer(GL_READ_FRAMEBUFFER, source)
+        glBindFramebuffer(GL_DRAW_FRAMEBUFFER, output)
+        scaled = (self.width, self.height) != (width, height)
+        glBlitFramebuffer(0, 0, self.width, self.height, 0, 0, width, height, GL_COLOR_BUFFER_BIT,
+                          GL_LINEAR if scaled else GL_NEAREST)
+        glBindFramebuffer(GL_FRAMEBUFFER, output)
+        glViewport(0, 0, width, height)
+
+    def delete(self):
+        glDeleteFramebuffers(2 if self.resolve is not None else 1, [f for f in (self.fbo, self.resolve) if f is not None])
+        glDeleteRenderbuffers(len(self.buffers), self.buffers)
+
+
+class DynamicResolution:
+    # Precisa do contexto GL atual; a janela não deve ter MSAA próprio (glBlitFramebuffer não escreve nela)
+    def __init__(self, width, height, budget_ms=1000.0 / TARGET_FPS, levels=RESOLUTION_LEVELS, level=0,
+                 window=RESOLUTION_WINDOW, target_fps=TARGET_FPS, pacing_rates=PACING_RATES):
+        self.width, self.height = width, height
+        self.budget_ms, self.levels, self.window = budget_ms, levels, window
+        self.target_fps = target_fps
+        self.pacing_rates = [r for r in pacing_rates if r <= target_fps] or [target_fps]
+        self.fps = self.pacing_rates[0]
+        # Framebuffer de saída: o que estava ligado na criação (0 = janela; o offscreen do headless.py)
+        self.output = int(glGetIntegerv(GL_FRAMEBUFFER_BINDING))
+        self.history = deque(maxlen=FRAME_HISTORY)
+        self.recent = []
+        self.decisions = []
+        self.frames = 0
+        self.level, self.target = level, None
+        self.gpu, self.queries, self.gpu_ms = GpuQueries(2 * GPU_QUERY_PAIRS), None, 0.0
+        self.set_level(level)
+
+    def set_level(self, level):
+        if self.target is not None: self.target.delete()
+        scale, samples = self.levels[level]
+        w, h = max(1, int(round(self.width * scale))), max(1, int(round(self.height * scale)))
+        self.level, self.target = level, RenderTarget(w, h, samples)
+        glBindFramebuffer(GL_FRAMEBUFFER, self.output)
+
+    @property
+    def size(self):
+        return self.target.width, self.target.height
+
+    def begin_frame(self):
+        self.queries = self.gpu.begin()
+        self.target.bind()
+
+    def end_frame(self):
+        self.target.present(self.output, self.width, self.height)
+        if self.queries is not None: self.gpu.end(self.queries, 'frame', 0.0, self.frames)
+        # Último tempo de GPU pronto (alguns quadros atrás)
+        for _, _, _, ms in self.gpu.poll(): self.gpu_ms = ms
+
+    def record(self, cpu_ms):
+        # cpu_ms: trabalho do quadro na CPU, sem o flip nem a espera do clock.tick; decide a cada janela completa
+        frame_ms = max(cpu_ms, self.gpu_ms)
+        self.frames += 1
+        self.history.append(frame_ms)
+        self.recent.append(frame_ms)
+        if len(self.recent) < self.window: return
+        p90 = float(np.percentile(self.recent, 90))
+        self.recent = []
+        level = self.level
+        if p90 > self.budget_ms * DOWNSCALE_ABOVE and level < len(self.levels) - 1: level += 1
+        elif p90 < self.budget_ms * UPSCALE_BELOW and level > 0: level -= 1
+        # Ritmo: a maior taxa cujo período comporta o p90, só depois de uma janela inteira no último nível
+        bottom = len(self.levels) - 1
+        fits = [r for r in self.pacing_rates if 1000.0 / r >= p90] or self.pacing_rates[-1:]
+        fps = fits[0] if level == bottom and self.level == bottom else self.pacing_rates[0]
+        if level == self.level and fps == self.fps: return
+        self.decisions.append({'frame': self.frames, 'p90_ms': p90, 'from': self.describe(self.level),
+                               'to': self.describe(level), 'fps': fps})
+        if level != self.level: self.set_level(level)
+        self.fps = fps
+        return self.decisions[-1]
+
+    def describe(self, level):
+        scale, samples = self.levels[level]
+        return f"{scale:.0%} {f'{samples}x MSAA' if samples else 'sem MSAA'}"
+
+    def summary(self):
+        history = np.array(self.history) if self.history else np.zeros(1)
+        return {'budget_ms': self.budget_ms, 'level': self.level, 'current': self.describe(self.level),
+                'internal_size': list(self.size), 'fps': self.fps, 'decisions': self.decisions,
+                'frame_ms_p50': float(np.percentile(history, 50)), 'frame_ms_p90': float(np.percentile(history, 90))}
+
+    def delete(self):
+        self.target.delete()
+        self.target = None
+        queries = self.gpu.free + [q for pair, *_ in self.gpu.pending for q in pair]
+        if queries: glDeleteQueries(len(queries), queries)
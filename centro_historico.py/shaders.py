@@ -0,0 +1,212 @@
+from OpenGL.GL import *
+from OpenGL.GL.shaders import compileProgram, compileShader
+import math
+import numpy as np
+from geometry import VERTEX_FLOATS, VERTEX_STRIDE, RENDER_STATS, ctypes_offset
+from textures import TEXTURE_STRIDE, ALPHA_CUTOFF
+
+#  PIPELINE COM SHADERS (GLSL 3.30 core)
+# Alternativa opcional ao pipeline fixo (--shaders): as matrizes de câmera e
+# projeção são calculadas em NumPy e vão para um uniform buffer por quadro; os
+# VBOs da cena compilada são lidos por um VAO por malha, sem glVertexPointer,
+# glColorPointer nem pilha de matrizes. Objetos dinâmicos (visitantes) usam
+# uma malha unitária e as transformações de cada um num uniform buffer, com
+# glDrawArraysInstanced. Os quads texturizados (textures.py) têm um programa
+# próprio. O pipeline fixo continua sendo o padrão e o fallback.
+
+# Pontos de ligação dos uniform buffers
+FRAME_BINDING, INSTANCE_BINDING = 0, 1
+# mat4 + vec4 por instância cabem nos 16 KiB mínimos de um uniform block
+MAX_INSTANCES_PER_DRAW = 192
+
+VERTEX_SHADER = """
+#version 330 core
+layout(location = 0) in vec3 position;
+layout(location = 1) in vec3 color;
+layout(std140) uniform Frame { mat4 view_projection; };
+out vec3 v_color;
+void main() {
+    v_color = color;
+    gl_Position = view_projection * vec4(position, 1.0);
+}
+"""
+
+INSTANCED_VERTEX_SHADER = """
+#version 330 core
+layout(location = 0) in vec3 position;
+layout(location = 1) in vec3 color;
+layout(std140) uniform Frame { mat4 view_projection; };
+layout(std140) uniform Instances { mat4 model[%d]; vec4 tint[%d]; };
+out vec3 v_color;
+void main() {
+    v_color = color * tint[gl_InstanceID].rgb;
+    gl_Position = view_projection * model[gl_InstanceID] * vec4(position, 1.0);
+}
+""" % (MAX_INSTANCES_PER_DRAW, MAX_INSTANCES_PER_DRAW)
+
+TEXTURED_VERTEX_SHADER = """
+#version 330 core
+layout(location = 0) in vec3 position;
+layout(location = 2) in vec2 uv;
+layout(std140) uniform Frame { mat4 view_projection; };
+out vec2 v_uv;
+void main() {
+    v_uv = uv;
+    gl_Position = view_projection * vec4(position, 1.0);
+}
+"""
+
+TEXTURED_FRAGMENT_SHADER = """
+#version 330 core
+uniform sampler2D surface;
+in vec2 v_uv;
+out vec4 frag_color;
+void main() {
+    vec4 texel = texture(surface, v_uv);
+    if (texel.a <= %f) discard;
+    frag_color = vec4(texel.rgb, 1.0);
+}
+""" % ALPHA_CUTOFF
+
+FRAGMENT_SHADER = """
+#version 330 core
+in vec3 v_color;
+out vec4 frag_color;
+void main() {
+    frag_color = vec4(v_color, 1.0);
+}
+"""
+
+
+#  MATRIZES (mesmas convenções de gluLookAt e gluPerspective)
+def look_at(eye, center, up):
+    eye = np.asarray(eye, dtype=float)
+    f = np.asarray(center, dtype=float) - eye
+    f /= np.linalg.norm(f)
+    s = np.cross(f, up)
+    s /= np.linalg.norm(s)
+    u = np.cross(s, f)
+    m = np.identity(4)
+    m[0, :3], m[1, :3], m[2, :3] = s, u, -f
+    m[:3, 3] = -m[:3, :3] @ eye
+    return m
+
+
+def perspective(fov_y, aspect, near, far):
+    f = 1.0 / math.tan(math.radians(fov_y) / 2.0)
+    m = np.zeros((4, 4))
+    m[0, 0], m[1, 1] = f / aspect, f
+    m[2, 2], m[2, 3] = (far + near) / (near - far), 2.0 * far * near / (near - far)
+    m[3, 2] = -1.0
+    return m
+
+
+def std140_matrices(m):
+    # std140 guarda mat4 por colunas: transpõe cada matriz (N, 4, 4)
+    return np.ascontiguousarray(np.swapaxes(np.asarray(m, dtype=np.float32), -1, -2))
+
+
+class ShaderPipeline:
+    # Precisa de um contexto GL atual com suporte a GLSL 3.30
+    def __init__(self):
+        fragment = compileShader(FRAGMENT_SHADER, GL_FRAGMENT_SHADER)
+        self.program = compileProgram(compileShader(VERTEX_SHADER, GL_VERTEX_SHADER), fragment, validate=False)
+        self.instanced = compileProgram(compileShader(INSTANCED_VERTEX_SHADER, GL_VERTEX_SHADER), fragment, validate=False)
+        self.textured = compileProgram(compileShader(TEXTURED_VERTEX_SHADER, GL_VERTEX_SHADER),
+                                       compileShader(TEXTURED_FRAGMENT_SHADER, GL_FRAGMENT_SHADER), validate=False)
+        glUseProgram(self.textured)
+        glUniform1i(glGetUniformLocation(self.textured, 'surface'), 0)
+        glUseProgram(0)
+        for program in (self.program, self.instanced, self.textured):
+            glUniformBlockBinding(program, glGetUniformBlockIndex(program, 'Frame'), FRAME_BINDING)
+        glUniformBlockBinding(self.instanced, glGetUniformBlockIndex(self.instanced, 'Instances'), INSTANCE_BINDING)
+        self.frame_ubo, self.instance_ubo = glGenBuffers(2)
+        glBindBuffer(GL_UNIFORM_BUFFER, self.frame_ubo)
+        glBufferData(GL_UNIFORM_BUFFER, 64, None, GL_DYNAMIC_DRAW)
+        glBindBuffer(GL_UNIFORM_BUFFER, self.instance_ubo)
+        glBufferData(GL_UNIFORM_BUFFER, MAX_INSTANCES_PER_DRAW * 80, None, GL_DYNAMIC_DRAW)
+        glBindBuffer(GL_UNIFORM_BUFFER, 0)
+        glBindBufferBase(GL_UNIFORM_BUFFER, FRAME_BINDING, self.frame_ubo)
+        glBindBufferBase(GL_UNIFORM_BUFFER, INSTANCE_BINDING, self.instance_ubo)
+        self.instance_data = np.zeros(MAX_INSTANCES_PER_DRAW * 20, dtype=np.float32)
+
+    def begin_frame(self, view_projection):
+        glBindBuffer(GL_UNIFORM_BUFFER, self.frame_ubo)
+        glBufferSubData(GL_UNIFORM_BUFFER, 0, 64, std140_matrices(view_projection))
+        glBindBuffer(GL_UNIFORM_BUFFER, 0)
+        glUseProgram(self.program)
+
+    def end_frame(self):
+        # Devolve o estado ao pipeline fixo (HUD, capturas)
+        glBindVertexArray(0)
+        glUseProgram(0)
+
+    #  MALHAS
+    def vertex_array(self, vbo, ibo=None):
+        # ibo: buffer de índices da malha (optimize.py), guardado no próprio VAO
+        vao = glGenVertexArrays(1)
+        glBindVertexArray(vao)
+        if ibo is not None: glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, ibo)
+        glBindBuffer(GL_ARRAY_BUFFER, vbo)
+        glEnableVertexAttribArray(0)
+        glVertexAttribPointer(0, 3, GL_FLOAT, GL_FALSE, VERTEX_STRIDE, ctypes_offset(0))
+        glEnableVertexAttribArray(1)
+        glVertexAttribPointer(1, 3, GL_FLOAT, GL_FALSE, VERTEX_STRIDE, ctypes_offset(12))
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        return vao
+
+    def bind_mesh(self, buffer):
+        # geometry.MeshBuffer: o VAO é criado no primeiro uso e apagado junto com o VBO
+        if buffer.vao is None: buffer.vao = self.vertex_array(buffer.vbo, buffer.ibo)
+        glBindVertexArray(buffer.vao)
+
+    def unbind_mesh(self):
+        glBindVertexArray(0)
+
+    def bind_textured(self, buffer):
+        # Segundo VBO do MeshBuffer: (x, y, z, u, v)
+        if buffer.textured_vao is None:
+            buffer.textured_vao = glGenVertexArrays(1)
+            glBindVertexArray(buffer.textured_vao)
+            glBindBuffer(GL_ARRAY_BUFFER, buffer.textured_vbo)
+            glEnableVertexAttribArray(0)
+            glVertexAttribPointer(0, 3, GL_FLOAT, GL_FALSE, TEXTURE_STRIDE, ctypes_offset(0))
+            glEnableVertexAttribArray(2)
+            glVertexAttribPointer(2, 2, GL_FLOAT, GL_FALSE, TEXTURE_STRIDE, ctypes_offset(12))
+            glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glBindVertexArray(buffer.textured_vao)
+        glUseProgram(self.textured)
+
+    def unbind_textured(self):
+        glBindTexture(GL_TEXTURE_2D, 0)
+        glUseProgram(self.program)
+
+    def upload_mesh(self, vertices):
+        # Malha estática (N, VERTEX_FLOATS) para draw_instances: (vao, vbo, vértices)
+        vertices = np.ascontiguousarray(vertices, dtype=np.float32).reshape(-1, VERTEX_FLOATS)
+        vbo = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, vbo)
+        glBufferData(GL_ARRAY_BUFFER, vertices.nbytes, vertices, GL_STATIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        return self.vertex_array(vbo), vbo, len(vertices)
+
+    def draw_instances(self, mesh, transforms, tints):
+        # Uma glDrawArraysInstanced por bloco de MAX_INSTANCES_PER_DRAW instâncias
+        vao, _, count = mesh
+        n = MAX_INSTANCES_PER_DRAW
+        glUseProgram(self.instanced)
+        glBindVertexArray(vao)
+        glBindBuffer(GL_UNIFORM_BUFFER, self.instance_ubo)
+        data = self.instance_data
+        for start in range(0, len(transforms), n):
+            chunk = len(transforms[start:start + n])
+            data[:chunk * 16] = std140_matrices(transforms[start:start + n]).ravel()
+            tint = data[n * 16:].reshape(n, 4)
+            tint[:chunk, :3] = tints[start:start + n]
+            glBufferSubData(GL_UNIFORM_BUFFER, 0, data.nbytes, data)
+            glDrawArraysInstanced(GL_TRIANGLES, 0, count, chunk)
+            RENDER_STATS.draw_calls += 1
+            RENDER_STATS.vertices += count * chunk
+        glBindBuffer(GL_UNIFORM_BUFFER, 0)
+        glBindVertexArray(0)
+        glUseProgram(self.program)
@@ -0,0 +1,208 @@
+import sys
+import json
+import time
+import numpy as np
+import pygame
+from profiler import PROFILER
+
+#  SIMULAÇÃO COM PASSO FIXO
+# A física da câmera (speed, gravity, jump_speed) é ajustada por passo de
+# 1/60 s. O laço de passo fixo roda quantos passos couberem no tempo real do
+# quadro e a renderização interpola entre os dois últimos estados. Nada aqui
+# usa janela ou contexto GL, então traces de entrada podem ser reproduzidos
+# sem tela, a milhares de passos por segundo.
+
+SIM_HZ = 60
+SIM_DT = 1.0 / SIM_HZ
+# Evita a "espiral da morte" quando um quadro demora demais
+MAX_STEPS_PER_FRAME = 8
+
+# Física do jogador, por passo de SIM_DT; a câmera e os visitantes (visitors.py) usam as mesmas
+PLAYER_SPEED = 0.15
+PLAYER_GRAVITY = -0.015
+PLAYER_JUMP_SPEED = 0.25
+PLAYER_HEIGHT = 1.8
+# Com a grade de alturas (navigation.py): quem estava no chão desce junto com ele (rampa) até este desnível por passo
+GROUND_SNAP = 0.1
+
+TRACE_KEYS = {'w': pygame.K_w, 'a': pygame.K_a, 's': pygame.K_s, 'd': pygame.K_d, 'space': pygame.K_SPACE}
+
+
+class KeyState:
+    # Substitui pygame.key.get_pressed() fora da janela
+    def __init__(self, pressed=()):
+        self.pressed = set(pressed)
+
+    def __getitem__(self, key):
+        return key in self.pressed
+
+    @classmethod
+    def from_names(cls, names):
+        return cls(TRACE_KEYS[n] for n in names)
+
+
+def pressed_names(keys):
+    return [name for name, code in TRACE_KEYS.items() if keys[code]]
+
+
+def step_bodies(world, positions, y_velocity, on_ground, moves, jumps, radius,
+                speed=PLAYER_SPEED, gravity=PLAYER_GRAVITY, jump_speed=PLAYER_JUMP_SPEED, height=PLAYER_HEIGHT,
+                ground=None):
+    # Um passo para N corpos (os visitantes): positions (N, 3) é alterado no lugar; moves (N, 3) são
+    # direções unitárias no plano XZ. Como em step_body, X e depois Z, cada eixo com uma consulta
+    # em lote ao mundo de colisão. ground: navigation.HeightGrid (None = chão plano em y = 0).
+    # Devolve (y_velocity, on_ground) novos.
+    speed = np.broadcast_to(np.asarray(speed, dtype=float), (len(positions),))
+    moving = np.nonzero((moves[:, 0] != 0) | (moves[:, 2] != 0))[0]
+    for axis in (0, 2):
+        if len(moving) == 0: break
+        trial = positions[moving]
+        trial[:, axis] += moves[moving, axis] * speed[moving]
+        free = ~world.query_spheres(trial, radius)
+        positions[moving[free], axis] = trial[free, axis]
+    y_velocity = y_velocity + gravity
+    positions[:, 1] += y_velocity
+    jump = jumps & on_ground
+    y_velocity = np.where(jump, jump_speed, y_velocity)
+    on_ground = on_ground & ~jump
+    floor = np.full(len(positions), float(height))
+    if ground is not None: floor += ground.height_at(positions[:, 0], positions[:, 2])
+    landed = positions[:, 1] < floor
+    if ground is not None: landed |= on_ground & (y_velocity <= 0) & (positions[:, 1] < floor + GROUND_SNAP)
+    positions[landed, 1] = floor[landed]
+    return np.where(landed, 0.0, y_velocity), on_ground | landed
+
+
+def step_body(world, position, y_velocity, on_ground, move, jump, radius,
+              speed=PLAYER_SPEED, gravity=PLAYER_GRAVITY, jump_speed=PLAYER_JUMP_SPEED, height=PLAYER_HEIGHT,
+              ground=None):
+    # step_bodies para um corpo só (a câmera), com floats do Python: os arrays em lote custam mais
+    # que a física quando N = 1. position (3,) é alterado no lugar; devolve (y_velocity, on_ground)
+    for axis in (0, 2):
+        if move[axis] == 0: continue
+        trial = position.copy()
+        trial[axis] += move[axis] * speed
+        if not world.query_sphere(trial, radius): position[axis] = trial[axis]
+    y_velocity += gravity
+    position[1] += y_velocity
+    if jump and on_ground: y_velocity, on_ground = jump_speed, False
+    floor = height + (ground.height_at_point(position[0], position[2]) if ground is not None else 0.0)
+    landed = position[1] < floor
+    if ground is not None: landed = landed or (on_ground and y_velocity <= 0 and position[1] < floor + GROUND_SNAP)
+    if not landed: return y_velocity, on_ground
+    position[1] = floor
+    return 0.0, True
+
+
+class FixedStepSimulation:
+    def __init__(self, camera, dt=SIM_DT, recorder=None, visitors=None):
+        self.camera, self.dt = camera, dt
+        self.accumulator = 0.0
+        self.previous = camera.position.copy()
+        self.steps = 0
+        self.recorder = recorder
+        # Visitantes (visitors.py) avançam no mesmo passo fixo
+        self.visitors = visitors
+
+    def step(self, keys):
+        self.previous = self.camera.position.copy()
+        if self.recorder is not None: self.recorder.record(self.camera, keys)
+        with PROFILER.scope('simulation.step'):
+            self.camera.update(keys)
+        if self.visitors is not None:
+            with PROFILER.scope('simulation.visitors'):
+                self.visitors.step()
+        self.steps += 1
+
+    def advance(self, frame_time, keys):
+        self.accumulator = min(self.accumulator + frame_time, self.dt * MAX_STEPS_PER_FRAME)
+        steps = 0
+        while self.accumulator >= self.dt:
+            self.step(keys)
+            self.accumulator -= self.dt
+            steps += 1
+        if self.visitors is not None: self.visitors.alpha = self.alpha
+        return steps
+
+    @property
+    def alpha(self):
+        return self.accumulator / self.dt
+
+    def render_position(self):
+        return self.previous + (self.camera.position - self.previous) * self.alpha
+
+
+#  GRAVAÇÃO E REPRODUÇÃO DE ENTRADA
+class InputRecorder:
+    def __init__(self, camera, dt=SIM_DT):
+        # ground: se a câmera andava sobre a grade de alturas do bake (navigation.HeightGrid)
+        self.trace = {'dt': dt, 'start': camera_state(camera), 'ground': camera.ground is not None, 'steps': []}
+
+    def record(self, camera, keys):
+        # yaw/pitch absolutos por passo: o trace independe da sensibilidade do mouse
+        self.trace['steps'].append([pressed_names(keys), camera.yaw, camera.pitch])
+
+    def save(self, path):
+        with open(path, 'w') as f: json.dump(self.trace, f)
+
+
+def camera_state(camera):
+    return {'position': camera.position.tolist(), 'yaw': camera.yaw, 'pitch': camera.pitch}
+
+
+def load_trace(path):
+    with open(path) as f: return json.load(f)
+
+
+def replay(trace, camera):
+    # Reaplica o trace passo a passo; devolve as posições (N, 3) para comparação
+    start = trace['start']
+    camera.position = np.array(start['position'], dtype=float)
+    camera.yaw, camera.pitch = start['yaw'], start['pitch']
+    camera.y_velocity, camera.on_ground = 0, True
+    camera.update_vectors()
+    positions = np.empty((len(trace['steps']), 3))
+    states = {}
+    for i, (names, yaw, pitch) in enumerate(trace['steps']):
+        if (yaw, pitch) != (camera.yaw, camera.pitch):
+            camera.yaw, camera.pitch = yaw, pitch
+            camera.update_vectors()
+        key = tuple(names)
+        if key not in states: states[key] = KeyState.from_names(names)
+        camera.update(states[key])
+        positions[i] = camera.position
+    return positions
+
+
+def synthetic_trace(steps, seed=0):
+    # Passeio aleatório: anda, vira e pula, para testes de carga sem gravação
+    rng = np.random.default_rng(seed)
+    yaw, out = -90.0, []
+    choices = [['w'], ['w', 'a'], ['w', 'd'], ['s'], ['w', 'space'], []]
+    for i in range(steps):
+        if i % 30 == 0: names = choices[rng.integers(len(choices))]
+        yaw += rng.normal(0, 2.0)
+        out.append([names, yaw, 0.0])
+    return {'dt': SIM_DT, 'start': {'position': [0, 1.8, 15], 'yaw': -90.0, 'pitch': 0.0}, 'steps': out}
+
+
+def main(argv):
+    # Mesmo mundo da partida (centro.main): colisores e grade de alturas do scene.bake
+    from centro import Camera
+    from collision import CollisionWorld
+    from bake import load_or_bake_in_process
+    if argv and argv[0] != '--synthetic': trace = load_trace(argv[0])
+    else: trace = synthetic_trace(int(argv[1]) if len(argv) > 1 else 20000)
+    baked = load_or_bake_in_process('centro')
+    # Traces sem a chave 'ground' usam o chão da partida atual
+    camera = Camera(world=CollisionWorld(baked.colliders), ground=baked.ground if trace.get('ground', True) else None)
+    t0 = time.perf_counter()
+    positions = replay(trace, camera)
+    elapsed = time.perf_counter() - t0
+    n = len(positions)
+    print(f"{n} passos em {elapsed:.3f} s ({n/elapsed:.0f} passos/s, {n*trace['dt']:.1f} s simulados)")
+    if n: print("posição final:", np.round(positions[-1], 4).tolist())
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
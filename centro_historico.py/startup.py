@@ -0,0 +1,102 @@
+import time
+import threading
+
+#  PARTIDA
+# Linha do tempo da partida: cada fase marcada com o tempo desde o import deste
+# módulo, que o centro.py faz antes de pygame, OpenGL e NumPy. O trabalho que
+# não precisa do contexto GL (ler ou refazer o scene.bake, gerar as texturas
+# procedurais) roda numa thread enquanto a janela sobe, e a tela de carga
+# mostra o progresso dela. Os imports de pygame e OpenGL ficam dentro das
+# funções para este módulo poder ser o primeiro a carregar.
+
+LOADING_FPS = 30
+LOADING_SIZE = (420, 64)
+
+
+class StartupTimeline:
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.phases = []
+
+    def mark(self, name):
+        self.phases.append((name, (time.perf_counter() - self.t0) * 1000))
+
+    def summary(self):
+        # {fase: ms desde o início}, na ordem das marcas
+        return {name: ms for name, ms in self.phases}
+
+    def report(self):
+        lines, last = ["--- PARTIDA ---"], 0.0
+        for name, ms in self.phases:
+            lines.append(f"{name:<18}{ms - last:8.1f} ms{ms:10.1f} ms")
+            last = ms
+        return "\n".join(lines)
+
+
+STARTUP = StartupTimeline()
+
+
+class BackgroundTask:
+    # fn(progress, *args) numa thread; progress(fração, fase) alimenta a tela de carga
+    def __init__(self, fn, *args):
+        self.fraction, self.phase = 0.0, ''
+        self.result, self.error = None, None
+        self.thread = threading.Thread(target=self.run, args=(fn, args), name='startup', daemon=True)
+        self.thread.start()
+
+    def progress(self, fraction, phase):
+        self.fraction, self.phase = fraction, phase
+
+    def run(self, fn, args):
+        try:
+            self.result = fn(self.progress, *args)
+        except BaseException as e:
+            self.error = e
+
+    @property
+    def done(self):
+        return not self.thread.is_alive()
+
+    def wait(self):
+        self.thread.join()
+        if self.error is not None: raise self.error
+        return self.result
+
+
+class LoadingScreen:
+    # Barra e fase atual no centro da tela, compostas numa Surface e desenhadas com glDrawPixels
+    def __init__(self, width, height):
+        self.width, self.height = width, height
+        self.font = None
+
+    def draw(self, fraction, phase, background=(0.5, 0.8, 1.0)):
+        import pygame
+        from OpenGL.GL import (glClearColor, glClear, glWindowPos2i, glDrawPixels, GL_COLOR_BUFFER_BIT,
+                               GL_DEPTH_BUFFER_BIT, GL_RGBA, GL_UNSIGNED_BYTE)
+        if self.font is None:
+            pygame.font.init()
+            self.font = pygame.font.SysFont('monospace', 16)
+        w, h = LOADING_SIZE
+        panel = pygame.Surface((w, h), pygame.SRCALPHA)
+        panel.fill((0, 0, 0, 170))
+        panel.blit(self.font.render(phase or 'carregando', True, (255, 255, 255)), (10, 8))
+        pygame.draw.rect(panel, (255, 255, 255), (10, h - 26, w - 20, 16), 1)
+        pygame.draw.rect(panel, (255, 255, 255), (12, h - 24, int((w - 24) * min(max(fraction, 0.0), 1.0)), 12))
+        glClearColor(*background, 1.0)
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        glWindowPos2i((self.width - w) // 2, (self.height - h) // 2)
+        glDrawPixels(w, h, GL_RGBA, GL_UNSIGNED_BYTE, pygame.image.tostring(panel, 'RGBA', True))
+
+
+def wait_with_loading_screen(task, width, height):
+    # Mantém a janela viva (eventos + tela de carga) até a tarefa acabar; None se a janela fechar
+    import pygame
+    screen, clock = LoadingScreen(width, height), pygame.time.Clock()
+    while not task.done:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
+                return None
+        screen.draw(task.fraction, task.phase)
+        pygame.display.flip()
+        clock.tick(LOADING_FPS)
+    return task.wait()
@@ -0,0 +1,213 @@
+import os
+import queue
+import itertools
+import importlib
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from geometry import MeshBuffer, RENDER_STATS, compile_geometry
+from bake import HERE, source_hash, bake_mesh, load_mesh
+from optimize import optimize_mesh
+
+#  DISTRITO EM CHUNKS (STREAMING)
+# O distrito é uma grade de chunks de CHUNK_SIZE x CHUNK_SIZE metros, cada um
+# com a sua malha compilada (um quarteirão com os seus prédios). Uma thread em
+# segundo plano prepara, em ordem de distância, os chunks que entram no raio de
+# carga: abre com memmap o arquivo do chunk em DEFAULT_CHUNK_DIR (formato do
+# bake.py) ou manda compilá-lo num processo à parte, que grava o arquivo. A
+# compilação troca as funções GL do módulo da cena (geometry.capture) e não
+# pode rodar ao lado do desenho no mesmo processo. A thread principal só envia
+# à GPU, no máximo STREAM_UPLOADS_PER_FRAME por quadro. Chunks que saem do
+# raio continuam em cache até o orçamento de memória acabar; aí saem os usados
+# há mais tempo.
+
+# Mesmo tamanho do chão de draw_ground: o chunk (0, 0) é a biblioteca
+CHUNK_SIZE = 80.0
+STREAM_LOAD_RADIUS = 100.0
+# Vértices residentes (RAM + VBO) somados de todos os chunks
+STREAM_MEMORY_BUDGET = 64 * 2**20
+# Tamanho suposto de um chunk ainda sem arquivo em cache, antes de algum carregar
+STREAM_CHUNK_ESTIMATE = 2**20
+STREAM_UPLOADS_PER_FRAME = 1
+DEFAULT_CHUNK_DIR = os.path.join(HERE, 'district.cache')
+
+
+class Chunk:
+    __slots__ = ('key', 'state', 'mesh', 'buffer', 'bounds', 'nbytes', 'last_used')
+
+    def __init__(self, key):
+        self.key = key
+        # 'unloaded' -> 'queued' (na thread) -> 'resident' (VBO na GPU)
+        self.state = 'unloaded'
+        self.mesh, self.buffer, self.bounds = None, None, None
+        self.nbytes, self.last_used = 0, -1
+
+
+def mesh_bytes(mesh):
+    indices = mesh.indices.nbytes if mesh.indices is not None else 0
+    return mesh.vertices.nbytes + indices + mesh.textured_vertices.nbytes
+
+
+def build_chunk(module, draw_chunk, key, compile_args, path, source):
+    # Roda no processo de compilação: importa o módulo da cena e grava o chunk em path
+    namespace = vars(importlib.import_module(module))
+    props = compile_args.get('props')
+    mesh = compile_geometry(namespace, namespace[draw_chunk], *key, props=props(namespace) if props is not None else None,
+                            objects=compile_args.get('objects', ()), lod_objects=compile_args.get('lod_objects', ()))
+    bake_mesh(path, optimize_mesh(mesh), source)
+    return path
+
+
+class ChunkStreamer:
+    # module/draw_chunk: nome do módulo da cena e da função draw_chunk(i, j), que desenha o
+    # chunk em coordenadas do mundo; keys: chunks do distrito
+    # compile_args: props/objects/lod_objects, como no SceneCache
+    def __init__(self, module, draw_chunk, keys, compile_args, budget=STREAM_MEMORY_BUDGET,
+                 load_radius=STREAM_LOAD_RADIUS, cache_dir=DEFAULT_CHUNK_DIR):
+        self.module, self.draw_chunk, self.compile_args = module, draw_chunk, compile_args
+        self.keys = [tuple(k) for k in keys]
+        self.chunks = {k: Chunk(k) for k in self.keys}
+        centers = np.array(self.keys, dtype=float).reshape(-1, 2) * CHUNK_SIZE
+        # Retângulo (x0, z0, x1, z1) de cada chunk no chão
+        self.rects = np.concatenate([centers - CHUNK_SIZE/2, centers + CHUNK_SIZE/2], axis=1)
+        self.budget, self.load_radius = budget, load_radius
+        self.cache_dir = cache_dir
+        self.source = source_hash()
+        self.frame = 0
+        self.resident_bytes, self.pending_bytes = 0, 0
+        # Tamanho real de cada chunk já carregado uma vez (estimativa para os próximos)
+        self.sizes = {}
+        self.loaded, self.evicted = 0, 0
+        self.requests = queue.PriorityQueue()
+        self.ready = deque()
+        self.order = itertools.count()
+        # spawn: o processo filho não herda o contexto GL nem as threads deste
+        self.pool = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn'))
+        self.thread = threading.Thread(target=self.worker, name='chunk-streamer', daemon=True)
+        self.thread.start()
+
+    def distances(self, eye):
+        # Distância no plano XZ da câmera até o retângulo de cada chunk
+        x0, z0, x1, z1 = self.rects.T
+        dx = np.maximum(np.maximum(x0 - eye[0], eye[0] - x1), 0.0)
+        dz = np.maximum(np.maximum(z0 - eye[2], eye[2] - z1), 0.0)
+        return np.hypot(dx, dz)
+
+    #  THREAD PRINCIPAL
+    def update(self, eye):
+        self.frame += 1
+        dist = self.distances(eye)
+        order = np.argsort(dist)
+        wanted = [self.keys[i] for i in order if dist[i] < self.load_radius]
+        keep = set(wanted)
+        for key in wanted: self.chunks[key].last_used = self.frame
+        # Pedidos que saíram do raio antes de ficar prontos são cancelados
+        for chunk in self.chunks.values():
+            if chunk.state == 'queued' and chunk.key not in keep:
+                chunk.state = 'unloaded'
+                self.pending_bytes -= chunk.nbytes
+        self.upload_ready(keep)
+        for i in order:
+            key = self.keys[i]
+            if dist[i] >= self.load_radius: break
+            chunk = self.chunks[key]
+            if chunk.state != 'unloaded': continue
+            estimate = self.estimate(key)
+            if not self.make_room(estimate, keep): break
+            chunk.state, chunk.nbytes = 'queued', estimate
+            self.pending_bytes += estimate
+            self.requests.put((float(dist[i]), next(self.order), key))
+
+    def estimate(self, key):
+        # Tamanho real se o chunk já carregou; senão a média dos carregados, o arquivo em cache
+        # ou STREAM_CHUNK_ESTIMATE. Nunca 0: o orçamento vale desde o primeiro update
+        if key in self.sizes: return self.sizes[key]
+        if self.sizes: return int(np.mean(list(self.sizes.values())))
+        path = self.chunk_path(key)
+        return os.path.getsize(path) if os.path.exists(path) else STREAM_CHUNK_ESTIMATE
+
+    def make_room(self, size, keep):
+        # Libera chunks fora do raio, do menos recente para o mais recente; False se não couber
+        while self.resident_bytes + self.pending_bytes + size > self.budget:
+            idle = [c for c in self.chunks.values() if c.state == 'resident' and c.key not in keep]
+            if not idle: return False
+            self.evict(min(idle, key=lambda c: c.last_used))
+        return True
+
+    def evict(self, chunk):
+        chunk.buffer.delete()
+        chunk.mesh = chunk.buffer = chunk.bounds = None
+        chunk.state = 'unloaded'
+        self.resident_bytes -= chunk.nbytes
+        self.evicted += 1
+
+    def upload_ready(self, keep):
+        uploads = 0
+        while self.ready and uploads < STREAM_UPLOADS_PER_FRAME:
+            key, mesh = self.ready.popleft()
+            chunk = self.chunks[key]
+            if chunk.state != 'queued': continue
+            self.pending_bytes -= chunk.nbytes
+            if mesh is None:
+                chunk.state = 'failed'
+                continue
+            self.sizes[key] = mesh_bytes(mesh)
+            # A estimativa pode ter ficado curta: sem espaço, o chunk volta a ser pedido com o tamanho real
+            if not self.make_room(self.sizes[key], keep):
+                chunk.state, chunk.nbytes = 'unloaded', 0
+                continue
+            chunk.mesh, chunk.nbytes = mesh, self.sizes[key]
+            chunk.buffer = MeshBuffer(mesh)
+            chunk.buffer.upload()
+            b = mesh.object_bounds
+            chunk.bounds = np.concatenate([b[:, :3].min(axis=0), b[:, 3:].max(axis=0)])
+            chunk.state = 'resident'
+            self.resident_bytes += chunk.nbytes
+            self.loaded += 1
+            uploads += 1
+
+    def draw(self, frustum=None, pipeline=None):
+        resident = [c for c in self.chunks.values() if c.state == 'resident']
+        if not resident: return
+        vis = frustum.test_boxes(np.array([c.bounds for c in resident])) if frustum is not None else [True] * len(resident)
+        for chunk, v in zip(resident, vis):
+            if v: chunk.buffer.draw(frustum, pipeline)
+        RENDER_STATS.chunks_drawn += int(np.count_nonzero(vis))
+
+    @property
+    def resident_count(self):
+        return sum(c.state == 'resident' for c in self.chunks.values())
+
+    def close(self):
+        self.requests.put((float('-inf'), next(self.order), None))
+        self.thread.join()
+        self.pool.shutdown(cancel_futures=True)
+        for chunk in self.chunks.values():
+            if chunk.state == 'resident': self.evict(chunk)
+
+    #  THREAD DE CARGA
+    def worker(self):
+        while True:
+            _, _, key = self.requests.get()
+            if key is None: return
+            # Só lê o estado; quem muda é a thread principal
+            if self.chunks[key].state != 'queued': continue
+            try:
+                mesh = self.build(key)
+            except Exception as e:
+                print(f"Chunk {key} falhou: {e}")
+                mesh = None
+            self.ready.append((key, mesh))
+
+    def chunk_path(self, key):
+        return os.path.join(self.cache_dir, 'chunk_%d_%d.bake' % key)
+
+    def build(self, key):
+        path = self.chunk_path(key)
+        mesh = load_mesh(path, self.source)
+        if mesh is not None: return mesh
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.pool.submit(build_chunk, self.module, self.draw_chunk, key, self.compile_args, path, self.source).result()
+        return load_mesh(path, self.source)
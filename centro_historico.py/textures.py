@@ -0,0 +1,145 @@
+from OpenGL.GL import *
+import numpy as np
+from functools import lru_cache
+
+#  TEXTURAS PROCEDURAIS
+# Superfícies cheias de detalhe (assoalho, quadro, mostrador do relógio) são
+# rasterizadas uma vez em arrays NumPy e enviadas como texturas com mipmaps;
+# a cena desenha cada uma como um único quad texturizado. As funções geradoras
+# ficam em centro.py, registradas com @procedural_texture; a chave de uma
+# textura é (nome da função, parâmetros...), o que permite gravá-la no
+# compilador de geometria e no scene.bake sem guardar a imagem.
+
+TEXTURE_FLOATS = 5
+TEXTURE_STRIDE = TEXTURE_FLOATS * 4
+TEXTURE_CACHE_SIZE = 16
+# Filtro anisotrópico para o assoalho visto de lado (ignorado sem a extensão)
+TEXTURE_ANISOTROPY = 8.0
+# Pixels com alfa abaixo disso são descartados (contorno do relógio)
+ALPHA_CUTOFF = 0.5
+# Vértices do quad em GL_QUADS: (u, v) de cada canto, no sentido anti-horário
+QUAD_UVS = ((0.0, 0.0), (1.0, 0.0), (1.0, 1.0), (0.0, 1.0))
+
+TEXTURE_GENERATORS = {}
+
+
+def procedural_texture(fn):
+    # fn(*params) -> (altura, largura, 4) uint8, linha 0 = v 0
+    TEXTURE_GENERATORS[fn.__name__] = fn
+    return fn
+
+
+def texture_key(name, *params):
+    return (name,) + tuple(float(p) if isinstance(p, (float, np.floating)) else p for p in params)
+
+
+@lru_cache(maxsize=TEXTURE_CACHE_SIZE)
+def texture_image(key):
+    image = np.ascontiguousarray(TEXTURE_GENERATORS[key[0]](*key[1:]), dtype=np.uint8)
+    image.flags.writeable = False
+    return image
+
+
+#  RASTERIZAÇÃO EM NUMPY
+def canvas(width, height, size_x, size_y, color=(0, 0, 0), alpha=1.0):
+    # Imagem RGBA em ponto flutuante + coordenadas (x, y) dos centros dos pixels em
+    # unidades da superfície (0..size_x, 0..size_y) e o tamanho de um pixel
+    x = (np.arange(width) + 0.5) * (size_x / width)
+    y = (np.arange(height) + 0.5) * (size_y / height)
+    image = np.empty((height, width, 4))
+    image[..., :3], image[..., 3] = color, alpha
+    return image, x[None, :], y[:, None], max(size_x / width, size_y / height)
+
+
+def coverage(distance, pixel):
+    # Cobertura suavizada de uma forma dada pela distância com sinal (negativa por dentro)
+    return np.clip(0.5 - distance / pixel, 0.0, 1.0)
+
+
+def segment_distance(x, y, a, b):
+    ax, ay = a
+    dx, dy = b[0] - ax, b[1] - ay
+    t = np.clip(((x - ax) * dx + (y - ay) * dy) / (dx*dx + dy*dy), 0.0, 1.0)
+    return np.hypot(x - ax - t * dx, y - ay - t * dy)
+
+
+def paint(image, color, amount):
+    # Mistura a cor onde amount > 0; o alfa acumula a cobertura
+    amount = np.broadcast_to(amount, image.shape[:2])[..., None]
+    image[..., :3] = image[..., :3] * (1.0 - amount) + np.asarray(color) * amount
+    image[..., 3:] = np.maximum(image[..., 3:], amount)
+
+
+def vertical_gradient(image, y, y0, y1, color0, color1):
+    # Faixa y0..y1 com a cor interpolada como num quad de cores por vértice
+    t = np.clip((y - y0) / (y1 - y0), 0.0, 1.0)
+    band = ((y >= min(y0, y1)) & (y < max(y0, y1))).astype(float)
+    color = np.asarray(color0) + (np.asarray(color1) - np.asarray(color0)) * t[..., None]
+    image[..., :3] = np.where(band[..., None] > 0, color, image[..., :3])
+
+
+def to_bytes(image):
+    return (np.clip(image, 0.0, 1.0) * 255 + 0.5).astype(np.uint8)
+
+
+#  GPU
+class TextureLibrary:
+    # Uma textura GL por chave, criada no primeiro uso (precisa de contexto atual)
+    def __init__(self):
+        self.textures = {}
+
+    def get(self, key):
+        tex = self.textures.get(key)
+        if tex is None: tex = self.textures[key] = self.upload(texture_image(key))
+        return tex
+
+    def upload(self, image):
+        tex = glGenTextures(1)
+        glBindTexture(GL_TEXTURE_2D, tex)
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+        glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA8, image.shape[1], image.shape[0], 0, GL_RGBA, GL_UNSIGNED_BYTE, image)
+        glGenerateMipmap(GL_TEXTURE_2D)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR_MIPMAP_LINEAR)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_EDGE)
+        try:
+            from OpenGL.GL.EXT.texture_filter_anisotropic import glInitTextureFilterAnisotropicEXT, GL_TEXTURE_MAX_ANISOTROPY_EXT
+            if glInitTextureFilterAnisotropicEXT():
+                glTexParameterf(GL_TEXTURE_2D, GL_TEXTURE_MAX_ANISOTROPY_EXT, TEXTURE_ANISOTROPY)
+        except Exception:
+            pass
+        glBindTexture(GL_TEXTURE_2D, 0)
+        return tex
+
+    def clear(self):
+        if self.textures: glDeleteTextures(list(self.textures.values()))
+        self.textures = {}
+
+
+TEXTURES = TextureLibrary()
+
+
+def begin_textured():
+    # Estado comum dos quads texturizados no pipeline fixo: cor branca (GL_MODULATE),
+    # dupla face e descarte do fundo transparente
+    glPushAttrib(GL_ENABLE_BIT | GL_CURRENT_BIT | GL_COLOR_BUFFER_BIT)
+    glEnable(GL_TEXTURE_2D); glDisable(GL_CULL_FACE)
+    glEnable(GL_ALPHA_TEST); glAlphaFunc(GL_GREATER, ALPHA_CUTOFF)
+    glColor3f(1.0, 1.0, 1.0)
+
+
+def end_textured():
+    glBindTexture(GL_TEXTURE_2D, 0)
+    glPopAttrib()
+
+
+def draw_textured_quad(key, corners):
+    # corners: 4 cantos no espaço local, na ordem de QUAD_UVS; o compilador grava este quad
+    begin_textured()
+    glBindTexture(GL_TEXTURE_2D, TEXTURES.get(key))
+    glBegin(GL_QUADS)
+    for (u, v), corner in zip(QUAD_UVS, corners):
+        glTexCoord2f(u, v); glVertex3f(*corner)
+    glEnd()
+    end_textured()
@@ -0,0 +1,153 @@
+from OpenGL.GL import *
+import numpy as np
+from geometry import RENDER_STATS, VERTEX_STRIDE, apply_batch_state, reset_batch_state, batch_key, ctypes_offset
+from instancing import record_unit_mesh, expand_instances
+from simulation import step_bodies, PLAYER_SPEED, PLAYER_HEIGHT
+
+#  VISITANTES
+# N visitantes em estrutura de arrays (posição, velocidade vertical, yaw,
+# alvo), andando entre pontos de interesse da biblioteca. Cada passo fixo move
+# todos com a mesma física da câmera (simulation.step_bodies): uma consulta em
+# lote ao CollisionWorld por eixo para o grupo inteiro. O desenho expande a
+# malha unitária só para os visitantes dentro do frustum e envia tudo num
+# único glDrawArrays; com o pipeline de shaders a malha fica num VBO e as
+# transformações vão num uniform buffer (instâncias desenhadas na GPU).
+# Com a navmesh (navigation.py), cada visitante segue o campo de fluxo do
+# ponto de interesse que escolheu: mira o centro do próximo nó até chegar ao
+# nó do ponto, e dali vai reto. Os campos (um por ponto) saem na criação.
+
+# Visitantes andam a uma fração da velocidade do jogador, com variação individual
+VISITOR_SPEED = (0.2 * PLAYER_SPEED, 0.35 * PLAYER_SPEED)
+VISITOR_RADIUS = 0.3
+ARRIVE_RADIUS = 0.6
+# Espalhamento em torno de cada ponto de interesse, para não formarem fila
+WAYPOINT_JITTER = 0.8
+VISITOR_TINTS = [(0.85, 0.30, 0.25), (0.25, 0.45, 0.80), (0.30, 0.65, 0.35), (0.90, 0.75, 0.30),
+                 (0.55, 0.35, 0.65), (0.35, 0.35, 0.35)]
+
+
+class Visitors:
+    def __init__(self, count, waypoints, world, namespace, seed=0, foot_offset=0.0, ground=None, navmesh=None):
+        # waypoints: (M, 2) pontos (x, z); foot_offset: altura do piso em relação ao chão da física
+        # ground/navmesh: navigation.HeightGrid e NavGraph (opcionais)
+        self.rng = np.random.default_rng(seed)
+        self.world = world
+        self.waypoints = np.asarray(waypoints, dtype=float).reshape(-1, 2)
+        self.foot_offset = foot_offset
+        self.ground, self.navmesh = ground, navmesh
+        if navmesh is not None:
+            self.waypoint_nodes = navmesh.node_at(self.waypoints[:, 0], self.waypoints[:, 1])
+            for node in self.waypoint_nodes[self.waypoint_nodes >= 0]: navmesh.next_nodes(int(node))
+        n = self.count = count
+        self.targets = self.rng.integers(len(self.waypoints), size=n)
+        self.goals = self.pick_goals(self.targets)
+        start = self.pick_goals(self.rng.integers(len(self.waypoints), size=n))
+        floor = ground.height_at(start[:, 0], start[:, 1]) if ground is not None else 0.0
+        self.positions = np.column_stack([start[:, 0], PLAYER_HEIGHT + np.broadcast_to(floor, n), start[:, 1]])
+        self.previous = self.positions.copy()
+        self.y_velocity = np.zeros(n)
+        self.on_ground = np.ones(n, dtype=bool)
+        self.yaw = np.zeros(n)
+        self.speed = self.rng.uniform(*VISITOR_SPEED, size=n)
+        self.colors = np.array(VISITOR_TINTS, dtype=np.float32)[self.rng.integers(len(VISITOR_TINTS), size=n)]
+        self.jumps = np.zeros(n, dtype=bool)
+        self.alpha = 1.0
+        self.unit = record_unit_mesh(namespace, namespace['draw_visitor'], (0, 0, 0))
+        self.unit_buffer = None
+        lo, hi = self.unit[:, :3].min(axis=0), self.unit[:, :3].max(axis=0)
+        # Caixa da malha em torno dos pés, girando livremente no eixo Y
+        reach = max(np.abs(lo[[0, 2]]).max(), np.abs(hi[[0, 2]]).max())
+        self.local_bounds = np.array([-reach, lo[1], -reach, reach, hi[1], reach])
+
+    def __len__(self):
+        return self.count
+
+    def pick_goals(self, targets):
+        return self.waypoints[targets] + self.rng.uniform(-WAYPOINT_JITTER, WAYPOINT_JITTER, (len(targets), 2))
+
+    def step(self):
+        if self.count == 0: return
+        self.previous = self.positions.copy()
+        delta = self.goals - self.positions[:, [0, 2]]
+        dist = np.linalg.norm(delta, axis=1)
+        # Quem chegou escolhe outro ponto de interesse
+        arrived = np.nonzero(dist < ARRIVE_RADIUS)[0]
+        if len(arrived):
+            self.targets[arrived] = (self.targets[arrived] + self.rng.integers(1, len(self.waypoints), size=len(arrived))) % len(self.waypoints)
+            self.goals[arrived] = self.pick_goals(self.targets[arrived])
+            delta[arrived] = self.goals[arrived] - self.positions[arrived][:, [0, 2]]
+            dist[arrived] = np.linalg.norm(delta[arrived], axis=1)
+        if self.navmesh is not None:
+            delta = self.steer() - self.positions[:, [0, 2]]
+            dist = np.linalg.norm(delta, axis=1)
+        moves = np.zeros((self.count, 3))
+        moves[:, [0, 2]] = delta / np.maximum(dist, 1e-9)[:, None]
+        self.yaw = np.degrees(np.arctan2(moves[:, 2], moves[:, 0]))
+        before = self.positions[:, [0, 2]].copy()
+        self.y_velocity, self.on_ground = step_bodies(self.world, self.positions, self.y_velocity, self.on_ground,
+                                                      moves, self.jumps, VISITOR_RADIUS, self.speed, ground=self.ground)
+        # Bloqueados pela parede nos dois eixos desistem do alvo atual
+        stuck = np.nonzero((self.positions[:, [0, 2]] == before).all(axis=1))[0]
+        if len(stuck):
+            self.targets[stuck] = self.rng.integers(len(self.waypoints), size=len(stuck))
+            self.goals[stuck] = self.pick_goals(self.targets[stuck])
+
+    def steer(self):
+        # Ponto (x, z) para onde cada visitante anda: o alvo, se a reta até ele é andável; senão o próximo nó
+        nav, aim = self.navmesh, self.goals.copy()
+        here = nav.node_at(self.positions[:, 0], self.positions[:, 2])
+        goal = self.waypoint_nodes[self.targets]
+        detour = (goal >= 0) & (here >= 0) & (goal != here)
+        far = np.nonzero(detour)[0]
+        goals = np.column_stack([self.goals[far, 0], self.positions[far, 1], self.goals[far, 1]])
+        detour[far] = ~nav.grid.segment_walkable(self.positions[far], goals)
+        for g in np.unique(goal[detour]):
+            idx = np.nonzero(detour & (goal == g))[0]
+            step = nav.next_nodes(int(g))[here[idx]]
+            ok = step >= 0
+            aim[idx[ok]] = nav.positions[step[ok]][:, [0, 2]]
+        return aim
+
+    def render_positions(self):
+        return self.previous + (self.positions - self.previous) * self.alpha
+
+    def transforms(self, positions, yaw):
+        # Translação até os pés + giro em Y; o modelo olha para +Z, a câmera usa yaw 90 = +Z
+        n = len(positions)
+        m = np.zeros((n, 4, 4))
+        a = np.radians(90.0 - yaw)
+        c, s = np.cos(a), np.sin(a)
+        m[:, 0, 0], m[:, 0, 2], m[:, 2, 0], m[:, 2, 2] = c, s, -s, c
+        m[:, 1, 1] = m[:, 3, 3] = 1.0
+        m[:, 0, 3] = positions[:, 0]
+        m[:, 1, 3] = positions[:, 1] - PLAYER_HEIGHT + self.foot_offset
+        m[:, 2, 3] = positions[:, 2]
+        return m
+
+    def draw(self, frustum=None, pipeline=None):
+        if self.count == 0: return
+        pos = self.render_positions()
+        feet = pos[:, 1] - PLAYER_HEIGHT + self.foot_offset
+        bounds = np.column_stack([pos[:, 0], feet, pos[:, 2], pos[:, 0], feet, pos[:, 2]]) + self.local_bounds
+        idx = np.nonzero(frustum.test_boxes(bounds))[0] if frustum is not None else np.arange(self.count)
+        RENDER_STATS.instances_drawn += len(idx)
+        RENDER_STATS.instances_culled += self.count - len(idx)
+        if len(idx) == 0: return
+        if pipeline is not None:
+            if self.unit_buffer is None: self.unit_buffer = pipeline.upload_mesh(self.unit)
+            apply_batch_state(batch_key(GL_TRIANGLES, False, None, 0.0))
+            pipeline.draw_instances(self.unit_buffer, self.transforms(pos[idx], self.yaw[idx]), self.colors[idx])
+            reset_batch_state()
+            return
+        vertices = expand_instances(self.unit, self.transforms(pos[idx], self.yaw[idx]).astype(np.float32), self.colors[idx])
+        # Arrays do lado do cliente: os dados mudam a cada quadro. Sem culling de faces,
+        # porque as faces de draw_cube não têm todas a mesma orientação
+        apply_batch_state(batch_key(GL_TRIANGLES, False, None, 0.0))
+        glEnableClientState(GL_VERTEX_ARRAY); glEnableClientState(GL_COLOR_ARRAY)
+        glVertexPointer(3, GL_FLOAT, VERTEX_STRIDE, ctypes_offset(vertices.ctypes.data))
+        glColorPointer(3, GL_FLOAT, VERTEX_STRIDE, ctypes_offset(vertices.ctypes.data + 12))
+        glDrawArrays(GL_TRIANGLES, 0, len(vertices))
+        glDisableClientState(GL_COLOR_ARRAY); glDisableClientState(GL_VERTEX_ARRAY)
+        reset_batch_state()
+        RENDER_STATS.draw_calls += 1
+        RENDER_STATS.vertices += len(vertices)